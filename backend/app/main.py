@@ -4,10 +4,12 @@ MNSK College of Engineering
 Created by: Neelakandan M
 """
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+from typing import Optional
+import hmac
 import os
 
 load_dotenv()
@@ -24,6 +26,13 @@ app = FastAPI(
 origins = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
 origins = [o.strip().rstrip("/") for o in origins]  # Clean up trailing slashes
 
+# Innermost: replays stored responses for retried mutating requests
+from app.middleware.idempotency import IdempotencyMiddleware
+from app.middleware.stale import StaleMarkerMiddleware
+
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(StaleMarkerMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins to fix Vercel CORS issues
@@ -42,22 +51,33 @@ async def options_handler(request: Request, path: str):
         headers={
             "Access-Control-Allow-Origin": request.headers.get("origin", "*"),
             "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, PATCH, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Requested-With, Idempotency-Key",
             "Access-Control-Allow-Credentials": "true",
             "Access-Control-Max-Age": "86400",
         }
     )
 
 
-from app.routers import admin, teachers, students, auth
+from app.routers import admin, teachers, students, auth, question_bank, changes
 from app.services.supabase import get_supabase_admin
+from app.services.exam_sessions import draft_flush_loop, flush_drafts
+from app.services.transport import upstream_transport
+from app.services.repository import repository
+from app.services.notifications import notification_dispatch_loop
+from app.services.change_feed import cache_invalidation_loop, prune_change_log
+from app.services.bulk_users import fail_stale_jobs
+from app.services.archive import ARCHIVE_ENABLED, archive_loop
+from app.services.prewarm import PREWARM_ENABLED, prewarm_loop, prewarmer
+from app.services.exam_scheduler import SCHEDULER_ENABLED, exam_scheduler_loop, stop_exam_scheduler
 import asyncio
 from datetime import datetime, timedelta, timezone
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 app.include_router(teachers.router, prefix="/api/teacher", tags=["Teachers"])
+app.include_router(question_bank.router, prefix="/api/teacher/question-bank", tags=["Question Bank"])
 app.include_router(students.router, prefix="/api/student", tags=["Students"])
+app.include_router(changes.router, prefix="/api", tags=["Sync"])
 
 async def delete_old_submissions():
     """Background task to delete PDF submissions older than 24 hours."""
@@ -85,6 +105,14 @@ async def delete_old_submissions():
                     sb.table("submissions").update({"file_url": None, "answers": {"info": "File auto-deleted after 24h"}}).eq("id", sub["id"]).execute()
                     
             print(f"[{datetime.now().isoformat()}] Cleaned up {len(old_subs.data or [])} old submissions.")
+
+            # Feed cursors older than the retention window get a 410 and resync
+            prune_change_log()
+
+            # Bulk user jobs whose instance went away would otherwise show "running" forever
+            stale_jobs = fail_stale_jobs()
+            if stale_jobs:
+                print(f"Marked {stale_jobs} interrupted bulk user job(s) as failed.")
         except Exception as e:
             print(f"Error in delete_old_submissions task: {e}")
             
@@ -93,8 +121,27 @@ async def delete_old_submissions():
 
 @app.on_event("startup")
 async def startup_event():
-    # Start the background task
+    # Start the background tasks
     asyncio.create_task(delete_old_submissions())
+    asyncio.create_task(draft_flush_loop())
+    asyncio.create_task(cache_invalidation_loop())
+    if SCHEDULER_ENABLED:
+        asyncio.create_task(exam_scheduler_loop())
+    if os.getenv("NOTIFY_ENABLED", "true").lower() == "true":
+        asyncio.create_task(notification_dispatch_loop())
+    if ARCHIVE_ENABLED:
+        asyncio.create_task(archive_loop())
+    if PREWARM_ENABLED:
+        asyncio.create_task(prewarm_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Don't lose drafts that are still waiting for the next flush
+    flush_drafts()
+    if SCHEDULER_ENABLED:
+        stop_exam_scheduler()
+    await repository.close()
 
 
 @app.get("/")
@@ -110,3 +157,45 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+# Load balancers, deploy hooks and monitoring send this for per-exam detail, warming and /metrics
+READINESS_TOKEN = os.getenv("READINESS_TOKEN", "")
+
+
+def _trusted(token: Optional[str]) -> bool:
+    return bool(READINESS_TOKEN) and hmac.compare_digest((token or "").encode(), READINESS_TOKEN.encode())
+
+
+@app.get("/ready")
+async def readiness(warm: bool = False, x_readiness_token: Optional[str] = Header(None)):
+    """
+    503 while any exam starting soon is cold. Per-exam detail, and `warm=true`
+    (warm first), need the X-Readiness-Token header.
+    """
+    trusted = _trusted(x_readiness_token)
+    if warm:
+        if not trusted:
+            raise HTTPException(status_code=403, detail="warm=true needs a valid X-Readiness-Token")
+        await prewarmer.warm_once()
+    report = await prewarmer.readiness()
+    if not trusted:
+        exams = report.pop("exams")
+        report["cold_exams"] = sum(1 for e in exams if e["status"] == "cold")
+    return JSONResponse(content=report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics")
+async def metrics(x_readiness_token: Optional[str] = Header(None)):
+    """Pool, coalescing, breaker and stale-read counters; needs the X-Readiness-Token header."""
+    if not _trusted(x_readiness_token):
+        raise HTTPException(status_code=403, detail="/metrics needs a valid X-Readiness-Token")
+    return {
+        "upstream": upstream_transport.stats(),
+        "coalescing": repository.flights.stats(),
+        "breakers": {
+            "supabase": upstream_transport.breaker.stats(),
+            "postgres": repository.postgres_breaker.stats(),
+        },
+        "stale_reads": repository.stale_stats(),
+    }
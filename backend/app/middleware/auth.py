@@ -5,11 +5,31 @@ JWT verification and role-based access control via Supabase
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import JWTError
 from app.services.supabase import get_supabase, get_supabase_admin
+from app.services.auth_keys import signing_keys
+from app.services.cache import TTLCache
 import json
+import os
 
 security = HTTPBearer()
 
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))
+
+# Profiles by user id; pre-warmed before exams, dropped when an admin edits a user here
+# and, for edits on other instances, by change_feed.cache_invalidation_loop()
+profile_cache = TTLCache(maxsize=20000, ttl=PROFILE_CACHE_TTL)
+
+
+def cache_profiles(profiles: list):
+    for profile in profiles:
+        profile_cache.set(profile["id"], profile)
+
+
+def forget_profiles(user_ids):
+    for user_id in user_ids:
+        profile_cache.delete(user_id)
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
@@ -21,31 +41,50 @@ async def get_current_user(
     token = credentials.credentials
 
     try:
-        sb = get_supabase()
-        # Verify token with Supabase Auth
-        user_response = sb.auth.get_user(token)
-        if not user_response or not user_response.user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token"
-            )
+        # Verify locally when we have the key material, otherwise ask Supabase Auth
+        claims = signing_keys.verify(token)
+        if claims is not None:
+            user_id = claims["sub"]
+        else:
+            sb = get_supabase()
+            user_response = sb.auth.get_user(token)
+            if not user_response or not user_response.user:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid or expired token"
+                )
+            user_id = user_response.user.id
 
-        user_id = user_response.user.id
+        profile = profile_cache.get(user_id)
+        if profile is None:
+            # Fetch profile from profiles table
+            sb_admin = get_supabase_admin()
+            result = sb_admin.table("profiles").select("*").eq("id", user_id).execute()
 
-        # Fetch profile from profiles table
-        sb_admin = get_supabase_admin()
-        profile = sb_admin.table("profiles").select("*").eq("id", user_id).single().execute()
+            if not result.data:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User profile not found"
+                )
+            profile = result.data[0]
+            profile_cache.set(user_id, profile)
 
-        if not profile.data:
+        # A still-valid token doesn't outlive the account being deactivated
+        if profile.get("deactivated_at"):
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User profile not found"
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="This account has been deactivated"
             )
 
-        return profile.data
+        return profile
 
     except HTTPException:
         raise
+    except JWTError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid or expired token: {str(e)}"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
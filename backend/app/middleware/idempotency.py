@@ -0,0 +1,157 @@
+"""
+Idempotency Middleware
+Replays the stored response when a mutating request is retried with the same Idempotency-Key
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+
+from app.services.cache import TTLCache
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+MAX_STORED_BODY_BYTES = 64 * 1024
+# Larger requests (e.g. file uploads) are passed through without idempotency handling
+MAX_REQUEST_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_REQUEST_BODY", str(1024 * 1024)))
+WAIT_FOR_IN_FLIGHT_SECONDS = 30
+
+# Routers report some upstream failures as 400, so only outcomes that a retry
+# would certainly repeat are replayed: successes and conflict/validation errors
+REPLAYABLE_CLIENT_ERRORS = {409, 422}
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+PROTECTED_PREFIXES = ("/api/student/", "/api/teacher/", "/api/admin/")
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def _prepending(buffered: bytes, more: bool, receive):
+    """A receive() that yields the already-read part of the body first, then the rest as it arrives."""
+    pending = [{"type": "http.request", "body": buffered, "more_body": more}]
+
+    async def prepended_receive():
+        return pending.pop() if pending else await receive()
+    return prepended_receive
+
+
+async def _send_json(send, status: int, payload: dict):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """
+    Responses are keyed by (caller's token, method, path, Idempotency-Key) and
+    kept in a bounded TTL store. A retry with the same key and body gets the
+    original response back without reaching the router (or the database).
+    A concurrent duplicate waits for the first request to finish. Only 2xx
+    and deterministic 4xx (409/422) responses are stored; anything else
+    (5xx, or a 400 that may hide a transient upstream error) runs again.
+    Bodies over MAX_REQUEST_BODY_BYTES are never buffered: those requests
+    run as if they had no key.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.store = TTLCache(maxsize=IDEMPOTENCY_MAX_ENTRIES, ttl=IDEMPOTENCY_TTL_SECONDS)
+        self._in_flight = {}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in MUTATING_METHODS
+            or not scope["path"].startswith(PROTECTED_PREFIXES)
+        ):
+            return await self.app(scope, receive, send)
+
+        idem_key = _header(scope, b"idempotency-key")
+        if not idem_key:
+            return await self.app(scope, receive, send)
+        if len(idem_key) > 255:
+            return await _send_json(send, 400, {"detail": "Idempotency-Key is too long"})
+
+        declared = _header(scope, b"content-length")
+        if declared.isdigit() and int(declared) > MAX_REQUEST_BODY_BYTES:
+            return await self.app(scope, receive, send)
+
+        # Buffer the request body so it can be fingerprinted and then replayed to the app
+        chunks, size, more = [], 0, True
+        while more:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            more = message.get("more_body", False)
+            if size > MAX_REQUEST_BODY_BYTES:
+                return await self.app(scope, _prepending(b"".join(chunks), more, receive), send)
+        body = b"".join(chunks)
+
+        caller = hashlib.sha256(_header(scope, b"authorization").encode()).hexdigest()
+        store_key = (caller, scope["method"], scope["path"], idem_key)
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        # Several waiters can wake after an attempt that stored nothing; each
+        # re-checks, and only the first to find the key free runs the handler
+        deadline = asyncio.get_running_loop().time() + WAIT_FOR_IN_FLIGHT_SECONDS
+        while True:
+            stored = self.store.get(store_key)
+            if stored is not None:
+                if stored["fingerprint"] != fingerprint:
+                    return await _send_json(send, 422, {"detail": "Idempotency-Key was already used with a different request"})
+                await send({
+                    "type": "http.response.start",
+                    "status": stored["status"],
+                    "headers": stored["headers"] + [(b"idempotent-replayed", b"true")],
+                })
+                await send({"type": "http.response.body", "body": stored["body"]})
+                return
+
+            in_flight = self._in_flight.get(store_key)
+            if in_flight is None:
+                break
+            try:
+                await asyncio.wait_for(in_flight.wait(), max(0.0, deadline - asyncio.get_running_loop().time()))
+            except asyncio.TimeoutError:
+                return await _send_json(send, 409, {"detail": "A request with this Idempotency-Key is still in progress"})
+
+        event = asyncio.Event()
+        self._in_flight[store_key] = event
+        response = {"status": 500, "headers": [], "body": []}
+
+        async def replay_receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+            response_body = b"".join(response["body"])
+            replayable = 200 <= response["status"] < 300 or response["status"] in REPLAYABLE_CLIENT_ERRORS
+            if replayable and len(response_body) <= MAX_STORED_BODY_BYTES:
+                self.store.set(store_key, {
+                    "fingerprint": fingerprint,
+                    "status": response["status"],
+                    "headers": response["headers"],
+                    "body": response_body,
+                })
+        finally:
+            if self._in_flight.get(store_key) is event:
+                del self._in_flight[store_key]
+            event.set()
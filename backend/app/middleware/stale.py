@@ -0,0 +1,38 @@
+"""
+Stale Response Marker
+Adds `X-Served-Stale: true` when any read in the request fell back to a cached value
+"""
+
+from contextvars import ContextVar
+
+_request_flags = ContextVar("request_flags", default=None)
+
+
+def mark_stale():
+    """Called by the data-access layer when it serves a last-known-good value."""
+    flags = _request_flags.get()
+    if flags is not None:
+        flags["stale"] = True
+
+
+class StaleMarkerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        # A mutable holder, so tasks spawned with a copy of this context still report back
+        flags = {"stale": False}
+        token = _request_flags.set(flags)
+
+        async def marking_send(message):
+            if message["type"] == "http.response.start" and flags["stale"]:
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-served-stale", b"true")])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, marking_send)
+        finally:
+            _request_flags.reset(token)
@@ -35,6 +35,12 @@ class QuestionType(str, Enum):
     file_upload = "file_upload"
 
 
+class Difficulty(str, Enum):
+    easy = "easy"
+    medium = "medium"
+    hard = "hard"
+
+
 # ──── Auth ────
 
 class UserRegister(BaseModel):
@@ -71,6 +77,37 @@ class UserUpdate(BaseModel):
     reg_number: Optional[str] = None
 
 
+class BulkUserAction(str, Enum):
+    update = "update"
+    deactivate = "deactivate"
+    delete = "delete"
+
+
+class UserSelector(BaseModel):
+    ids: Optional[List[str]] = None
+    role: Optional[UserRole] = None
+    department: Optional[str] = None
+    reg_number_prefix: Optional[str] = None
+
+
+class BulkUserOperation(BaseModel):
+    action: BulkUserAction
+    selector: UserSelector
+    changes: Optional[UserUpdate] = None
+    dry_run: bool = False
+
+
+# ──── Grading ────
+
+class GradeBand(BaseModel):
+    min_percentage: float = Field(ge=0, le=100)
+    grade: str = Field(min_length=1)
+
+
+class GradingPolicy(BaseModel):
+    bands: List[GradeBand] = Field(min_length=1)
+
+
 # ──── Exams ────
 
 class ExamCreate(BaseModel):
@@ -80,6 +117,9 @@ class ExamCreate(BaseModel):
     scheduled_at: str  # ISO datetime string
     duration_minutes: int = Field(ge=5, le=480)
     total_marks: int = Field(ge=1)
+    shuffle: bool = True  # per-student question/option order
+    course_id: Optional[str] = None  # None: open to the teacher's whole department
+    grade_bands: Optional[List[GradeBand]] = None  # None: department policy
 
 
 class ExamUpdate(BaseModel):
@@ -87,9 +127,12 @@ class ExamUpdate(BaseModel):
     subject: Optional[str] = None
     description: Optional[str] = None
     scheduled_at: Optional[str] = None
-    duration_minutes: Optional[int] = None
-    total_marks: Optional[int] = None
+    duration_minutes: Optional[int] = Field(default=None, ge=5, le=480)
+    total_marks: Optional[int] = Field(default=None, ge=1)
     status: Optional[ExamStatus] = None
+    shuffle: Optional[bool] = None
+    course_id: Optional[str] = None
+    grade_bands: Optional[List[GradeBand]] = None  # null: back to the department policy
 
 
 class ExamResponse(BaseModel):
@@ -102,9 +145,57 @@ class ExamResponse(BaseModel):
     duration_minutes: int
     total_marks: int
     status: str
+    shuffle: bool = True
+    course_id: Optional[str] = None
+    department: Optional[str] = None
+    grade_bands: Optional[List[Any]] = None
     created_at: Optional[str] = None
 
 
+# ──── Courses & Enrollment ────
+
+class CourseCreate(BaseModel):
+    code: str = Field(min_length=2)
+    name: str
+    department: str
+    semester: Optional[str] = None
+
+
+class EnrollmentChange(BaseModel):
+    student_ids: Optional[List[str]] = None
+    department: Optional[str] = None  # every student of this department
+
+
+# ──── Timetable ────
+
+class TimetableEntry(BaseModel):
+    id: Optional[str] = None  # an existing exam to move; None adds a new one
+    title: Optional[str] = None
+    scheduled_at: str
+    duration_minutes: int = Field(ge=5, le=480)
+    course_id: Optional[str] = None
+    department: Optional[str] = None
+
+
+class TimetableCheck(BaseModel):
+    proposed: List[TimetableEntry] = []
+
+
+# ──── Seating ────
+
+class HallCreate(BaseModel):
+    name: str
+    building: Optional[str] = None
+    rows: int = Field(ge=1, le=200)
+    cols: int = Field(ge=1, le=200)
+    blocked_seats: List[List[int]] = []  # [[row, col], ...], 1-based
+
+
+class SeatingPlanRequest(BaseModel):
+    slot_start: datetime  # any time in the slot: exams running then, and all overlapping them
+    hall_ids: Optional[List[str]] = None  # in fill order; all halls by name when omitted
+
+
 # ──── Questions ────
 
 class QuestionCreate(BaseModel):
@@ -127,6 +218,35 @@ class QuestionResponse(BaseModel):
     order_num: int
 
 
+# ──── Question Bank ────
+
+class BankQuestionCreate(BaseModel):
+    subject: str
+    difficulty: Difficulty = Difficulty.medium
+    tags: List[str] = []
+    question_text: str
+    question_type: QuestionType = QuestionType.text
+    options: Optional[List[str]] = None  # For MCQ
+    correct_answer: Optional[str] = None
+    marks: int = Field(ge=1)
+
+
+class BankQuestionUpdate(BaseModel):
+    subject: Optional[str] = None
+    difficulty: Optional[Difficulty] = None
+    tags: Optional[List[str]] = None
+    question_text: Optional[str] = None
+    question_type: Optional[QuestionType] = None
+    options: Optional[List[str]] = None
+    correct_answer: Optional[str] = None
+    marks: Optional[int] = Field(default=None, ge=1)
+
+
+class AttachBankQuestions(BaseModel):
+    question_ids: List[str] = Field(min_length=1)
+    start_order: Optional[int] = Field(default=None, ge=1)  # defaults to after the last question
+
+
 # ──── Submissions ────
 
 class SubmissionCreate(BaseModel):
@@ -144,6 +264,29 @@ class SubmissionResponse(BaseModel):
     status: str
 
 
+# ──── Exam Sessions ────
+
+class AutosaveRequest(BaseModel):
+    answers: dict  # { question_id: answer_value }, merged into the draft
+
+
+class ExamSessionResponse(BaseModel):
+    exam_id: str
+    student_id: str
+    answers: Any = {}
+    started_at: str
+    deadline_at: str
+    remaining_seconds: int
+
+
+class BundleKeyResponse(BaseModel):
+    exam_id: str
+    version: str
+    key: str
+    question_order: Optional[List[int]] = None
+    option_orders: Optional[dict] = None
+
+
 # ──── Results ────
 
 class EvaluateSubmission(BaseModel):
@@ -175,6 +318,7 @@ class AdminDashboard(BaseModel):
     total_exams: int
     total_submissions: int
     recent_exams: List[dict] = []
+    unavailable: List[str] = []  # sections that failed to load this time
 
 
 class TeacherDashboard(BaseModel):
@@ -183,6 +327,7 @@ class TeacherDashboard(BaseModel):
     total_submissions: int
     pending_evaluations: int
     recent_exams: List[dict] = []
+    unavailable: List[str] = []
 
 
 class StudentDashboard(BaseModel):
@@ -191,3 +336,5 @@ class StudentDashboard(BaseModel):
     total_submissions: int
     average_percentage: Optional[float] = None
     recent_results: List[dict] = []
+    performance: Optional[dict] = None  # per-subject/semester averages, trend, department percentile
+    unavailable: List[str] = []
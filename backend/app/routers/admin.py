@@ -3,11 +3,25 @@ Admin Router
 Dashboard stats, user management (CRUD), system oversight
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends, Query
-from app.models.schemas import UserRegister, UserResponse, UserUpdate, AdminDashboard
+from fastapi import APIRouter, HTTPException, status, Depends, Query, BackgroundTasks
+from fastapi.responses import Response
+from app.models.schemas import (
+    UserRegister, UserResponse, UserUpdate, UserRole, AdminDashboard, BulkUserOperation, BulkUserAction,
+    CourseCreate, EnrollmentChange, GradingPolicy, HallCreate, SeatingPlanRequest, TimetableCheck
+)
 from app.services.supabase import get_supabase_admin
-from app.middleware.auth import require_role
+from app.services.bulk_users import select_users, create_job, get_job, start_job
+from app.services.enrollment import student_exam_index
+from app.services.fields import sparse_fields, select_columns
+from app.services.grading import normalize_bands, regrade_department
+from app.services.seating import SeatingError, generate_plan, hall_chart, chart_csv
+from app.services.timetable import exam_timetable
+from app.services.query_plan import QueryPlan
+from app.services.performance import department_ranker
+from app.middleware.auth import require_role, forget_profiles
 from typing import Optional
+from datetime import datetime, timezone
+import asyncio
 
 router = APIRouter()
 
@@ -17,33 +31,32 @@ async def admin_dashboard(current_user: dict = Depends(require_role("admin"))):
     """Get admin dashboard statistics."""
     try:
         sb = get_supabase_admin()
+        plan = QueryPlan()
 
-        # Count users by role
-        all_users = sb.table("profiles").select("role").execute()
-        users = all_users.data or []
-        total_teachers = sum(1 for u in users if u["role"] == "teacher")
-        total_students = sum(1 for u in users if u["role"] == "student")
+        # Users, counted by role below
+        plan.add("users", lambda: sb.table("profiles").select("role").execute().data or [])
 
-        # Count exams
-        exams = sb.table("exams").select("id", count="exact").execute()
-        total_exams = exams.count or 0
-
-        # Count submissions
-        submissions = sb.table("submissions").select("id", count="exact").execute()
-        total_submissions = submissions.count or 0
+        # Count exams and submissions (counts only, no rows)
+        plan.add("total_exams", lambda: sb.table("exams").select("id", count="exact", head=True).execute().count or 0, default=0)
+        plan.add("total_submissions", lambda: sb.table("submissions").select("id", count="exact", head=True).execute().count or 0, default=0)
 
         # Recent exams
-        recent = sb.table("exams").select("*").order("created_at", desc=True).limit(5).execute()
+        plan.add("recent_exams", lambda: sb.table("exams").select("*").order("created_at", desc=True).limit(5).execute().data or [], default=[])
 
+        data = await plan.run()
+        users = data["users"]
         return AdminDashboard(
             total_users=len(users),
-            total_teachers=total_teachers,
-            total_students=total_students,
-            total_exams=total_exams,
-            total_submissions=total_submissions,
-            recent_exams=recent.data or []
+            total_teachers=sum(1 for u in users if u["role"] == "teacher"),
+            total_students=sum(1 for u in users if u["role"] == "student"),
+            total_exams=data["total_exams"],
+            total_submissions=data["total_submissions"],
+            recent_exams=data["recent_exams"],
+            unavailable=plan.failed
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard: {str(e)}")
 
@@ -51,12 +64,13 @@ async def admin_dashboard(current_user: dict = Depends(require_role("admin"))):
 @router.get("/users", response_model=list)
 async def list_users(
     role: Optional[str] = Query(None, description="Filter by role"),
+    fields: Optional[list] = Depends(sparse_fields(UserResponse)),
     current_user: dict = Depends(require_role("admin"))
 ):
-    """List all users, optionally filtered by role."""
+    """List all users, optionally filtered by role (`fields=` picks the columns)."""
     try:
         sb = get_supabase_admin()
-        query = sb.table("profiles").select("*").order("created_at", desc=True)
+        query = sb.table("profiles").select(select_columns(fields)).order("created_at", desc=True)
 
         if role:
             query = query.eq("role", role)
@@ -127,6 +141,7 @@ async def update_user(
             raise HTTPException(status_code=400, detail="No fields to update")
 
         result = sb.table("profiles").update(update_data).eq("id", user_id).execute()
+        forget_profiles([user_id])
 
         return {"message": "User updated successfully"}
 
@@ -151,6 +166,7 @@ async def delete_user(
 
         # Delete profile first
         sb.table("profiles").delete().eq("id", user_id).execute()
+        forget_profiles([user_id])
 
         # Delete from Supabase Auth
         sb.auth.admin.delete_user(user_id)
@@ -161,3 +177,307 @@ async def delete_user(
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to delete user: {str(e)}")
+
+
+@router.post("/users/bulk", response_model=dict)
+async def bulk_user_operation(
+    operation: BulkUserOperation,
+    current_user: dict = Depends(require_role("admin"))
+):
+    """Update, deactivate or delete every user matching the selector, as a background job."""
+    try:
+        selector = operation.selector.model_dump(mode="json", exclude_none=True)
+        if not selector:
+            raise HTTPException(status_code=400, detail="Select users by ids, role, department or reg_number_prefix")
+
+        changes = None
+        if operation.action == BulkUserAction.update:
+            changes = operation.changes.model_dump(mode="json", exclude_none=True) if operation.changes else {}
+            if not changes:
+                raise HTTPException(status_code=400, detail="No fields to update")
+
+        if operation.action != BulkUserAction.update and selector.get("role") == UserRole.admin.value:
+            raise HTTPException(status_code=400, detail=f"Admins cannot be selected for bulk {operation.action.value}")
+
+        users = await asyncio.to_thread(select_users, selector, current_user["id"])
+        if operation.action != BulkUserAction.update:
+            admins = sum(1 for u in users if u["role"] == UserRole.admin.value)
+            if admins:
+                raise HTTPException(status_code=400, detail=f"Selection includes {admins} admin account(s); bulk {operation.action.value} only applies to students and teachers")
+
+        if operation.dry_run:
+            return {
+                "dry_run": True,
+                "action": operation.action.value,
+                "matched": len(users),
+                "changes": changes,
+                "sample": users[:20],
+            }
+
+        job = create_job(operation.action.value, current_user["id"], selector, changes, len(users))
+        start_job(job, [u["id"] for u in users])
+        return {"message": "Bulk operation started", "job_id": job["id"], "matched": len(users)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to start bulk operation: {str(e)}")
+
+
+@router.get("/users/bulk/{job_id}", response_model=dict)
+async def get_bulk_operation(
+    job_id: str,
+    current_user: dict = Depends(require_role("admin"))
+):
+    """Progress of a bulk user operation."""
+    try:
+        job = get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ──── Courses & Enrollment ────
+
+@router.get("/courses", response_model=list)
+async def list_courses(
+    department: Optional[str] = Query(None),
+    current_user: dict = Depends(require_role("admin", "teacher"))
+):
+    """List courses, optionally for one department."""
+    try:
+        sb = get_supabase_admin()
+        query = sb.table("courses").select("*").order("code")
+        if department:
+            query = query.eq("department", department)
+        return query.execute().data or []
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch courses: {str(e)}")
+
+
+@router.post("/courses", response_model=dict)
+async def create_course(
+    course: CourseCreate,
+    current_user: dict = Depends(require_role("admin"))
+):
+    """Create a course or section."""
+    try:
+        sb = get_supabase_admin()
+        result = sb.table("courses").insert(course.model_dump()).execute()
+        return {"message": "Course created", "course": result.data[0] if result.data else {}}
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to create course: {str(e)}")
+
+
+def _enrollment_student_ids(change: EnrollmentChange) -> list:
+    sb = get_supabase_admin()
+    student_ids = list(change.student_ids or [])
+    if change.department:
+        offset = 0
+        while True:
+            page = sb.table("profiles").select("id").eq("role", "student").eq("department", change.department).order("id").range(offset, offset + 999).execute().data or []
+            student_ids.extend(p["id"] for p in page)
+            offset += len(page)
+            if len(page) < 1000:
+                break
+    return list(dict.fromkeys(student_ids))
+
+
+@router.post("/courses/{course_id}/enrollments", response_model=dict)
+async def enroll_students(
+    course_id: str,
+    change: EnrollmentChange,
+    current_user: dict = Depends(require_role("admin"))
+):
+    """Enroll students in a course, by id and/or a whole department."""
+    try:
+        sb = get_supabase_admin()
+        student_ids = _enrollment_student_ids(change)
+        if not student_ids:
+            raise HTTPException(status_code=400, detail="No students to enroll")
+
+        rows = [{"course_id": course_id, "student_id": sid} for sid in student_ids]
+        for i in range(0, len(rows), 500):
+            sb.table("course_enrollments").upsert(rows[i:i + 500], on_conflict="course_id,student_id").execute()
+        student_exam_index.invalidate(student_ids)
+        exam_timetable.invalidate()
+
+        return {"message": "Students enrolled", "enrolled": len(student_ids)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to enroll students: {str(e)}")
+
+
+@router.delete("/courses/{course_id}/enrollments", response_model=dict)
+async def unenroll_students(
+    course_id: str,
+    change: EnrollmentChange,
+    current_user: dict = Depends(require_role("admin"))
+):
+    """Remove students from a course, by id and/or a whole department."""
+    try:
+        sb = get_supabase_admin()
+        student_ids = _enrollment_student_ids(change)
+        if not student_ids:
+            raise HTTPException(status_code=400, detail="No students to remove")
+
+        for i in range(0, len(student_ids), 200):
+            sb.table("course_enrollments").delete().eq("course_id", course_id).in_("student_id", student_ids[i:i + 200]).execute()
+        student_exam_index.invalidate(student_ids)
+        exam_timetable.invalidate()
+
+        return {"message": "Students removed", "removed": len(student_ids)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to remove students: {str(e)}")
+
+
+# ──── Grading Policies ────
+
+@router.get("/grading-policies", response_model=list)
+async def list_grading_policies(current_user: dict = Depends(require_role("admin", "teacher"))):
+    """Grade bands configured per department."""
+    try:
+        sb = get_supabase_admin()
+        return sb.table("grading_policies").select("*").order("department").execute().data or []
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.put("/grading-policies/{department}", response_model=dict)
+async def set_grading_policy(
+    department: str,
+    policy: GradingPolicy,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(require_role("admin"))
+):
+    """Set a department's grade bands and re-grade its exams (those without their own bands) in the background."""
+    try:
+        sb = get_supabase_admin()
+        bands = normalize_bands(policy.model_dump()["bands"])
+        sb.table("grading_policies").upsert({
+            "department": department,
+            "bands": bands,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }, on_conflict="department").execute()
+
+        background_tasks.add_task(regrade_department, department)
+        background_tasks.add_task(department_ranker.invalidate)
+        return {"message": "Grading policy saved; re-grading in the background", "bands": bands}
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to save grading policy: {str(e)}")
+
+
+# ──── Seating ────
+
+@router.get("/halls", response_model=list)
+async def list_halls(current_user: dict = Depends(require_role("admin"))):
+    """Exam halls with their seat layouts."""
+    try:
+        sb = get_supabase_admin()
+        return sb.table("exam_halls").select("*").order("name").execute().data or []
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch halls: {str(e)}")
+
+
+@router.post("/halls", response_model=dict)
+async def create_hall(hall: HallCreate, current_user: dict = Depends(require_role("admin"))):
+    """Add an exam hall: a rows × cols grid, optionally with blocked seats."""
+    try:
+        for seat in hall.blocked_seats:
+            if len(seat) != 2 or not (1 <= seat[0] <= hall.rows and 1 <= seat[1] <= hall.cols):
+                raise HTTPException(status_code=400, detail=f"Blocked seat {seat} is outside the hall")
+
+        sb = get_supabase_admin()
+        result = sb.table("exam_halls").insert(hall.model_dump()).execute()
+        return {"message": "Hall created", "hall": result.data[0] if result.data else {}}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to create hall: {str(e)}")
+
+
+@router.post("/seating/plans", response_model=dict)
+async def create_seating_plan(request: SeatingPlanRequest, current_user: dict = Depends(require_role("admin"))):
+    """Seat every student of the exams running at slot_start (and those overlapping them), keeping neighbours on different papers."""
+    try:
+        plan = await asyncio.to_thread(generate_plan, request.slot_start.isoformat(), request.hall_ids, current_user["id"])
+        return {"message": "Seating plan generated", "plan": plan}
+
+    except SeatingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate seating plan: {str(e)}")
+
+
+@router.get("/seating/plans/{plan_id}", response_model=dict)
+async def get_seating_plan(plan_id: str, current_user: dict = Depends(require_role("admin"))):
+    """A seating plan with its quality score."""
+    try:
+        sb = get_supabase_admin()
+        plan = sb.table("seating_plans").select("*").eq("id", plan_id).execute()
+        if not plan.data:
+            raise HTTPException(status_code=404, detail="Seating plan not found")
+        return plan.data[0]
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/seating/plans/{plan_id}/halls/{hall_id}/chart")
+async def get_hall_chart(
+    plan_id: str,
+    hall_id: str,
+    format: str = Query("json", pattern="^(json|csv)$"),
+    current_user: dict = Depends(require_role("admin"))
+):
+    """Seat chart of one hall, as a JSON grid or a printable CSV."""
+    try:
+        chart = await asyncio.to_thread(hall_chart, plan_id, hall_id)
+        if not chart:
+            raise HTTPException(status_code=404, detail="Hall not found")
+        if format == "json":
+            return chart
+
+        filename = "".join(c if c.isalnum() else "_" for c in chart["hall"]["name"]) or "hall"
+        return Response(
+            content=chart_csv(chart),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ──── Timetable ────
+
+@router.post("/timetable/validate", response_model=dict)
+async def validate_timetable(check: TimetableCheck, current_user: dict = Depends(require_role("admin"))):
+    """Every clash among upcoming exams, optionally with proposed moves or additions applied first."""
+    try:
+        proposed = [entry.model_dump() for entry in check.proposed]
+        clashes = await asyncio.to_thread(exam_timetable.validate, proposed)
+        return {"clashes": clashes, "count": len(clashes)}
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to validate timetable: {str(e)}")
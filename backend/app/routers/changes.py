@@ -0,0 +1,34 @@
+"""
+Change Feed Router
+Incremental sync: clients poll with the cursor from their last response
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from app.services.change_feed import CursorExpired, changes_since, latest_cursor
+from app.middleware.auth import get_current_user
+from typing import Optional
+import asyncio
+
+router = APIRouter()
+
+
+@router.get("/changes", response_model=dict)
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0, description="Cursor returned by the previous call"),
+    limit: int = Query(500, ge=1, le=2000),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Exams, submissions and results changed since the cursor, scoped to the caller.
+    Without `since`, returns the current cursor to start syncing from after a full load.
+    """
+    try:
+        if since is None:
+            return {"cursor": await asyncio.to_thread(latest_cursor), "has_more": False, "changes": {}}
+        return await asyncio.to_thread(changes_since, current_user, since, limit)
+    except CursorExpired:
+        raise HTTPException(status_code=410, detail="Cursor has expired, reload and start from a new cursor")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
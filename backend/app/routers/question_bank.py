@@ -0,0 +1,90 @@
+"""
+Question Bank Router
+Reusable questions tagged by subject and difficulty, with in-memory search
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from app.models.schemas import BankQuestionCreate, BankQuestionUpdate, Difficulty
+from app.services.supabase import get_supabase_admin
+from app.services.question_index import question_index
+from app.middleware.auth import require_role
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+
+router = APIRouter()
+
+
+@router.get("", response_model=list)
+async def search_questions(
+    q: str = Query("", description="Words or word fragments to search for"),
+    subject: Optional[str] = Query(None),
+    difficulty: Optional[Difficulty] = Query(None),
+    tag: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=200),
+    current_user: dict = Depends(require_role("teacher", "admin"))
+):
+    """Search the question bank."""
+    try:
+        await asyncio.to_thread(question_index.sync)
+        return question_index.search(q, subject=subject, difficulty=difficulty.value if difficulty else None, tag=tag, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("", response_model=dict)
+async def create_bank_question(question: BankQuestionCreate, current_user: dict = Depends(require_role("teacher", "admin"))):
+    """Add a question to the bank."""
+    try:
+        sb = get_supabase_admin()
+        data = question.model_dump(mode="json")
+        data["created_by"] = current_user["id"]
+        result = sb.table("question_bank").insert(data).execute()
+        for row in (result.data or []):
+            question_index.upsert(row)
+        return {"message": "Question added to bank", "question": result.data[0] if result.data else {}}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to add question: {str(e)}")
+
+
+@router.put("/{question_id}", response_model=dict)
+async def update_bank_question(
+    question_id: str,
+    update: BankQuestionUpdate,
+    current_user: dict = Depends(require_role("teacher", "admin"))
+):
+    """Edit a bank question (author only)."""
+    try:
+        sb = get_supabase_admin()
+        update_data = {k: v for k, v in update.model_dump(mode="json").items() if v is not None}
+        if not update_data:
+            raise HTTPException(status_code=400, detail="No fields to update")
+
+        result = sb.table("question_bank").update(update_data).eq("id", question_id).eq("created_by", current_user["id"]).is_("deleted_at", "null").execute()
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Question not found")
+
+        question_index.upsert(result.data[0])
+        return {"message": "Question updated", "question": result.data[0]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/{question_id}", response_model=dict)
+async def delete_bank_question(question_id: str, current_user: dict = Depends(require_role("teacher", "admin"))):
+    """Remove a question from the bank. Exams that already use it keep their copy."""
+    try:
+        sb = get_supabase_admin()
+        deleted_at = datetime.now(timezone.utc).isoformat()
+        result = sb.table("question_bank").update({"deleted_at": deleted_at}).eq("id", question_id).eq("created_by", current_user["id"]).execute()
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Question not found")
+
+        question_index.remove(question_id)
+        return {"message": "Question removed from bank"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -3,11 +3,24 @@ Student Router
 View exams, submit answers, view results
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends
-from app.models.schemas import SubmissionCreate, StudentDashboard
+from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi.responses import Response
+from app.models.schemas import SubmissionCreate, StudentDashboard, AutosaveRequest, ExamSessionResponse, BundleKeyResponse, ExamResponse
 from app.services.supabase import get_supabase_admin
+from app.services.exam_sessions import draft_store, load_session, new_session, parse_timestamp, remaining_seconds
+from app.services.repository import repository, student_paper
+from app.services.shuffle import shuffled_questions, canonical_answers, permutation
+from app.services.bundles import BUNDLES_ENABLED, bundle_cache, bundle_key, encode_key
+from app.services.rpc import call_rpc
+from app.services.performance import student_performance
+from app.services.archive import archived_student_results
+from app.services.enrollment import student_exam_index
+from app.services.fields import sparse_fields, project
+from app.services.query_plan import QueryPlan
 from app.middleware.auth import require_role
 from datetime import datetime, timezone
+from typing import Optional
+import asyncio
 
 router = APIRouter()
 
@@ -16,73 +29,62 @@ router = APIRouter()
 async def student_dashboard(current_user: dict = Depends(require_role("student"))):
     """Get student dashboard statistics."""
     try:
-        sb = get_supabase_admin()
         student_id = current_user["id"]
+        plan = QueryPlan()
 
-        # Upcoming / active exams
-        exams = sb.table("exams").select("*").in_("status", ["scheduled", "active"]).order("scheduled_at").execute()
-        upcoming = exams.data or []
-
-        # Student's submissions
-        subs = sb.table("submissions").select("*").eq("student_id", student_id).execute()
-        total_submissions = len(subs.data or [])
+        # Upcoming / active exams this student is enrolled for
+        plan.add("upcoming_exams", student_exam_index.exams_for(current_user))
 
-        # Completed exams (submitted)
-        submitted_exam_ids = [s["exam_id"] for s in (subs.data or [])]
-        completed_exams = len(set(submitted_exam_ids))
+        # Submission counts (total and distinct exams)
+        plan.add("counts", repository.dashboard_counts(student_id), default={"completed_exams": 0, "total_submissions": 0})
 
-        # Published results
-        results = sb.table("results").select("*").eq("student_id", student_id).eq("published", True).execute()
-        result_list = results.data or []
+        # Published results, each with its exam embedded
+        plan.add("recent_results", repository.student_results(student_id), default=[])
 
-        average_percentage = None
-        if result_list:
-            percentages = [r["percentage"] for r in result_list if r.get("percentage") is not None]
-            if percentages:
-                average_percentage = round(sum(percentages) / len(percentages), 2)
-
-        # Enrich results with exam info
-        recent_results = []
-        for r in result_list[:5]:
-            exam = sb.table("exams").select("title, subject").eq("id", r["exam_id"]).single().execute()
-            if exam.data:
-                r["exam"] = exam.data
-            recent_results.append(r)
+        # Averages come from the incrementally maintained performance index
+        plan.add("performance", repository.read(
+            ("student_performance", student_id),
+            lambda: asyncio.to_thread(student_performance, current_user)
+        ), default=None)
 
+        data = await plan.run()
+        performance = data["performance"]
         return StudentDashboard(
-            upcoming_exams=upcoming,
-            completed_exams=completed_exams,
-            total_submissions=total_submissions,
-            average_percentage=average_percentage,
-            recent_results=recent_results
+            upcoming_exams=data["upcoming_exams"],
+            completed_exams=data["counts"]["completed_exams"],
+            total_submissions=data["counts"]["total_submissions"],
+            average_percentage=performance["average_percentage"] if performance else None,
+            recent_results=data["recent_results"][:5],
+            performance=performance,
+            unavailable=plan.failed
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Dashboard error: {str(e)}")
 
 
 @router.get("/exams", response_model=list)
-async def list_available_exams(current_user: dict = Depends(require_role("student"))):
-    """List all scheduled/active exams for students."""
+async def list_available_exams(
+    fields: Optional[list] = Depends(sparse_fields(ExamResponse, extra=("teacher_name",))),
+    current_user: dict = Depends(require_role("student"))
+):
+    """List the scheduled/active exams the student is enrolled for (`fields=` picks the fields)."""
     try:
         sb = get_supabase_admin()
-        result = sb.table("exams").select("*").in_("status", ["scheduled", "active"]).order("scheduled_at").execute()
-
-        exams = result.data or []
+        # Indexed by course/department; rows carry the teacher name already
+        exams = await student_exam_index.exams_for(current_user)
+        if not exams:
+            return []
 
-        # Mark which exams student already submitted
+        # Mark which of these exams the student already submitted
         student_id = current_user["id"]
-        subs = sb.table("submissions").select("exam_id").eq("student_id", student_id).execute()
+        subs = sb.table("submissions").select("exam_id").eq("student_id", student_id).in_("exam_id", [e["id"] for e in exams]).execute()
         submitted_ids = {s["exam_id"] for s in (subs.data or [])}
 
-        for exam in exams:
-            exam["already_submitted"] = exam["id"] in submitted_ids
-            # Enrich with teacher name
-            teacher = sb.table("profiles").select("full_name").eq("id", exam["teacher_id"]).single().execute()
-            if teacher.data:
-                exam["teacher_name"] = teacher.data["full_name"]
-
-        return exams
+        # The listing is shared between requests, so annotate (trimmed) copies
+        return [dict(exam, already_submitted=exam["id"] in submitted_ids) for exam in project(exams, fields)]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -94,27 +96,29 @@ async def get_exam_with_questions(exam_id: str, current_user: dict = Depends(req
     try:
         sb = get_supabase_admin()
 
-        # Get exam
-        exam = sb.table("exams").select("*").eq("id", exam_id).single().execute()
-        if not exam.data:
+        # Get the cached, sanitized paper
+        exam, questions = await student_paper(exam_id)
+        if not exam:
             raise HTTPException(status_code=404, detail="Exam not found")
 
-        if exam.data["status"] not in ("scheduled", "active"):
+        if exam["status"] not in ("scheduled", "active"):
             raise HTTPException(status_code=400, detail="This exam is not available")
+        if not await asyncio.to_thread(student_exam_index.can_take, current_user, exam):
+            raise HTTPException(status_code=403, detail="You are not enrolled for this exam")
+        # Before the start the paper only leaves the server encrypted (see /bundle)
+        _require_started(exam)
 
         # Check if already submitted
         existing = sb.table("submissions").select("id").eq("exam_id", exam_id).eq("student_id", current_user["id"]).execute()
         if existing.data:
             raise HTTPException(status_code=400, detail="You have already submitted this exam")
 
-        # Get questions (hide correct answers)
-        questions = sb.table("questions").select("*").eq("exam_id", exam_id).order("order_num").execute()
-        q_list = questions.data or []
-        for q in q_list:
-            q.pop("correct_answer", None)  # Hide answers from students
-
-        exam_data = exam.data
-        exam_data["questions"] = q_list
+        # Each student gets their own deterministic question/option order
+        exam_data = dict(exam)
+        if exam.get("shuffle", True):
+            exam_data["questions"] = shuffled_questions(exam_id, current_user["id"], questions)
+        else:
+            exam_data["questions"] = [dict(q) for q in questions]
 
         return exam_data
 
@@ -124,71 +128,253 @@ async def get_exam_with_questions(exam_id: str, current_user: dict = Depends(req
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/exams/{exam_id}/submit", response_model=dict)
-async def submit_exam(
-    exam_id: str,
-    submission: SubmissionCreate,
-    current_user: dict = Depends(require_role("student"))
-):
-    """Submit answers for an exam."""
+# ──── Exam Bundles (download early, unlock at start) ────
+
+def _require_started(exam: dict):
+    wait = (parse_timestamp(exam["scheduled_at"]) - datetime.now(timezone.utc)).total_seconds()
+    if wait > 0:
+        raise HTTPException(status_code=403, detail=f"Exam starts in {int(wait) + 1} seconds")
+
+
+def _require_bundles():
+    if not BUNDLES_ENABLED:
+        raise HTTPException(status_code=503, detail="Exam bundles are not configured on this server")
+
+
+@router.get("/exams/{exam_id}/bundle")
+async def download_exam_bundle(exam_id: str, request: Request, current_user: dict = Depends(require_role("student"))):
+    """Encrypted paper for a published exam. Fetch it any time before the start."""
     try:
+        _require_bundles()
+        exam, bundle = await bundle_cache.get(exam_id)
+        if not exam:
+            raise HTTPException(status_code=404, detail="Exam not found")
+        if exam["status"] not in ("scheduled", "active"):
+            raise HTTPException(status_code=400, detail="This exam is not available")
+        if not await asyncio.to_thread(student_exam_index.can_take, current_user, exam):
+            raise HTTPException(status_code=403, detail="You are not enrolled for this exam")
+
+        etag = f'"{bundle.version}"'
+        headers = {"ETag": etag, "X-Bundle-Version": bundle.version, "Cache-Control": "private, max-age=60"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=bundle.payload, media_type="application/octet-stream", headers=headers)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/exams/{exam_id}/seat", response_model=dict)
+async def get_exam_seat(exam_id: str, current_user: dict = Depends(require_role("student"))):
+    """Hall and seat allotted to the student for an exam."""
+    try:
+        sb = get_supabase_admin()
+        seat = sb.table("seat_assignments").select(
+            "seat_row, seat_col, hall:exam_halls(name, building)"
+        ).eq("exam_id", exam_id).eq("student_id", current_user["id"]).execute()
+        if not seat.data:
+            raise HTTPException(status_code=404, detail="No seat allotted yet")
+        seat = seat.data[0]
+        return {"exam_id": exam_id, "hall": seat["hall"], "row": seat["seat_row"], "seat": seat["seat_col"]}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/exams/{exam_id}/bundle/key", response_model=BundleKeyResponse)
+async def get_exam_bundle_key(exam_id: str, current_user: dict = Depends(require_role("student"))):
+    """Decryption key for the bundle (plus this student's question order), released at the start time."""
+    try:
+        _require_bundles()
+        exam, bundle = await bundle_cache.get(exam_id)
+        if not exam:
+            raise HTTPException(status_code=404, detail="Exam not found")
+        if exam["status"] not in ("scheduled", "active"):
+            raise HTTPException(status_code=400, detail="This exam is not available")
+        if not await asyncio.to_thread(student_exam_index.can_take, current_user, exam):
+            raise HTTPException(status_code=403, detail="You are not enrolled for this exam")
+
+        _require_started(exam)
+
         sb = get_supabase_admin()
+        existing = sb.table("submissions").select("id").eq("exam_id", exam_id).eq("student_id", current_user["id"]).execute()
+        if existing.data:
+            raise HTTPException(status_code=400, detail="You have already submitted this exam")
+
+        response = BundleKeyResponse(exam_id=exam_id, version=bundle.version, key=encode_key(bundle_key(exam_id, bundle.version)))
+        if exam.get("shuffle", True):
+            _, questions = await student_paper(exam_id)
+            order, option_orders = permutation(exam_id, current_user["id"], questions)
+            response.question_order = order
+            response.option_orders = {qid: list(o) for qid, o in option_orders.items()}
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _canonical(exam_id: str, student_id: str, answers: dict) -> dict:
+    """Undo per-student option shuffling so stored answers use canonical option text."""
+    exam, questions = await student_paper(exam_id)
+    if not exam or not exam.get("shuffle", True):
+        return answers
+    return canonical_answers(exam_id, student_id, questions, answers)
+
+
+# ──── Exam Sessions (autosave) ────
+
+def _session_response(session: dict) -> ExamSessionResponse:
+    return ExamSessionResponse(
+        exam_id=session["exam_id"],
+        student_id=session["student_id"],
+        answers=session.get("answers") or {},
+        started_at=session["started_at"],
+        deadline_at=session["deadline_at"],
+        remaining_seconds=remaining_seconds(session),
+    )
+
+
+@router.post("/exams/{exam_id}/session/start", response_model=ExamSessionResponse)
+async def start_exam_session(exam_id: str, current_user: dict = Depends(require_role("student"))):
+    """Start (or resume) an exam session and return the saved draft."""
+    try:
         student_id = current_user["id"]
 
-        # Verify exam exists and is active
-        exam = sb.table("exams").select("*").eq("id", exam_id).single().execute()
+        session = load_session(exam_id, student_id)
+        if session:
+            return _session_response(session)
+
+        sb = get_supabase_admin()
+        exam = sb.table("exams").select("id, status, scheduled_at, duration_minutes, course_id, department").eq("id", exam_id).single().execute()
         if not exam.data:
             raise HTTPException(status_code=404, detail="Exam not found")
 
         if exam.data["status"] not in ("scheduled", "active"):
-            raise HTTPException(status_code=400, detail="This exam is not accepting submissions")
+            raise HTTPException(status_code=400, detail="This exam is not available")
+
+        if not student_exam_index.can_take(current_user, exam.data):
+            raise HTTPException(status_code=403, detail="You are not enrolled for this exam")
+
+        _require_started(exam.data)
 
-        # Check for duplicate submission
         existing = sb.table("submissions").select("id").eq("exam_id", exam_id).eq("student_id", student_id).execute()
         if existing.data:
-            raise HTTPException(status_code=400, detail="Already submitted this exam")
+            raise HTTPException(status_code=400, detail="You have already submitted this exam")
 
-        # Demand PDF file URL
-        if not submission.file_url or not submission.file_url.endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Submissions must be a PDF file.")
+        session = new_session(exam.data, student_id)
+        if session["remaining_seconds"] == 0:
+            raise HTTPException(status_code=403, detail="The time for this exam is over")
+        draft_store.put(session)
+        return _session_response(session)
 
-        # Create submission
-        sub_data = {
-            "exam_id": exam_id,
-            "student_id": student_id,
-            "answers": submission.answers,
-            "file_url": submission.file_url,
-            "status": "submitted"
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        result = sb.table("submissions").insert(sub_data).execute()
 
-        return {"message": "Exam submitted successfully", "submission_id": result.data[0]["id"] if result.data else None}
+@router.post("/exams/{exam_id}/session/heartbeat", response_model=dict)
+async def exam_session_heartbeat(exam_id: str, current_user: dict = Depends(require_role("student"))):
+    """Keep the session alive and return the remaining time."""
+    try:
+        student_id = current_user["id"]
+        session = draft_store.touch(exam_id, student_id)
+        if not session and load_session(exam_id, student_id):
+            session = draft_store.touch(exam_id, student_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="No active session for this exam")
+
+        return {"remaining_seconds": session["remaining_seconds"], "last_seen_at": session["last_seen_at"]}
 
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/results", response_model=list)
-async def get_results(current_user: dict = Depends(require_role("student"))):
-    """Get all published results for the current student."""
+@router.put("/exams/{exam_id}/session/answers", response_model=dict)
+async def autosave_answers(
+    exam_id: str,
+    draft: AutosaveRequest,
+    current_user: dict = Depends(require_role("student"))
+):
+    """Autosave draft answers. Writes are coalesced and flushed in the background."""
     try:
-        sb = get_supabase_admin()
         student_id = current_user["id"]
+        session = load_session(exam_id, student_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="No active session for this exam")
+
+        if remaining_seconds(session) <= 0:
+            raise HTTPException(status_code=400, detail="Exam time is over")
+        # The session may predate an unenrollment; save_exam_drafts() re-checks when flushing
+        exam, _ = await student_paper(exam_id)
+        if not exam or not await asyncio.to_thread(student_exam_index.can_take, current_user, exam):
+            raise HTTPException(status_code=403, detail="You are not enrolled for this exam")
+
+        session = draft_store.touch(exam_id, student_id, await _canonical(exam_id, student_id, draft.answers))
+        return {"message": "Draft saved", "remaining_seconds": session["remaining_seconds"]}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 
-        results = sb.table("results").select("*").eq("student_id", student_id).eq("published", True).order("evaluated_at", desc=True).execute()
+@router.post("/exams/{exam_id}/submit", response_model=dict)
+async def submit_exam(
+    exam_id: str,
+    submission: SubmissionCreate,
+    current_user: dict = Depends(require_role("student"))
+):
+    """Submit answers for an exam."""
+    try:
+        student_id = current_user["id"]
 
-        result_list = results.data or []
+        # Promote the autosaved draft: submitted answers win over draft ones
+        draft = load_session(exam_id, student_id) or {}
+        # The RPC checks the deadline too, but a fresh session may not be flushed yet
+        if draft and remaining_seconds(draft) == 0:
+            raise HTTPException(status_code=403, detail="The time for this exam is over")
+        answers = {**(draft.get("answers") or {}), **(await _canonical(exam_id, student_id, submission.answers))}
+
+        # Validation and insert run in one transaction (see submit_exam in supabase_schema.sql);
+        # the exam_sessions row is cleared by a DB trigger
+        submission_id = call_rpc("submit_exam", {
+            "p_exam_id": exam_id,
+            "p_student_id": student_id,
+            "p_answers": answers,
+            "p_file_url": submission.file_url,
+        })
+        draft_store.pop(exam_id, student_id)
+
+        return {"message": "Exam submitted successfully", "submission_id": submission_id}
 
-        # Enrich with exam info
-        for r in result_list:
-            exam = sb.table("exams").select("title, subject, total_marks, scheduled_at").eq("id", r["exam_id"]).single().execute()
-            if exam.data:
-                r["exam"] = exam.data
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        return result_list
 
+@router.get("/results", response_model=list)
+async def get_results(current_user: dict = Depends(require_role("student"))):
+    """Get all published results for the current student, including archived exams."""
+    try:
+        hot = await repository.student_results(current_user["id"])
+        archived = await repository.read(
+            ("archived_results", current_user["id"]),
+            lambda: asyncio.to_thread(archived_student_results, current_user["id"])
+        )
+        if not archived:
+            return hot
+        return sorted(hot + archived, key=lambda r: r.get("evaluated_at") or "", reverse=True)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
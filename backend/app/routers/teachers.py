@@ -3,17 +3,39 @@ Teacher Router
 Exam CRUD, question management, submission review, result publishing
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import Response, StreamingResponse
 from app.models.schemas import (
     ExamCreate, ExamUpdate, ExamResponse, QuestionCreate,
-    EvaluateSubmission, TeacherDashboard
+    EvaluateSubmission, TeacherDashboard, AttachBankQuestions
 )
 from app.services.supabase import get_supabase_admin
+from app.services.exam_scheduler import exam_scheduler
+from app.services.rpc import call_rpc
+from app.services.performance import department_ranker
+from app.services.repository import invalidate_paper
+from app.services.similarity import similarity_report
+from app.services.archive import archived_exam, archived_table
+from app.services.fields import sparse_fields, select_columns
+from app.services.answer_zip import entry_names, stream_zip
+from app.services.grading import normalize_bands, regrade_exam
+from app.services.timetable import exam_timetable, TimetableBusy, TIMETABLE_STATUSES
+from app.services.query_plan import QueryPlan
 from app.middleware.auth import require_role
-from typing import List
+from typing import List, Optional
+import asyncio
+import csv
+import io
 
 router = APIRouter()
 
+# Fields that move an exam in the timetable or change who sits it
+TIMETABLE_FIELDS = {"scheduled_at", "duration_minutes", "status", "course_id"}
+
+# ExamUpdate fields where an explicit null means "back to the default"
+# (course_id: the whole department; grade_bands: the department's policy)
+CLEARABLE_EXAM_FIELDS = ("course_id", "grade_bands")
+
 
 @router.get("/dashboard", response_model=TeacherDashboard)
 async def teacher_dashboard(current_user: dict = Depends(require_role("teacher"))):
@@ -22,34 +44,33 @@ async def teacher_dashboard(current_user: dict = Depends(require_role("teacher")
         sb = get_supabase_admin()
         teacher_id = current_user["id"]
 
-        # Teacher's exams
-        exams = sb.table("exams").select("*").eq("teacher_id", teacher_id).execute()
-        exam_list = exams.data or []
-        exam_ids = [e["id"] for e in exam_list]
-
-        active_exams = sum(1 for e in exam_list if e["status"] in ("scheduled", "active"))
+        def submission_count(status=None):
+            # Filtered through the embedded exam, so it doesn't wait for the exam list
+            query = sb.table("submissions").select("id, exam:exams!inner(teacher_id)", count="exact", head=True).eq("exam.teacher_id", teacher_id)
+            if status:
+                query = query.eq("status", status)
+            return query.execute().count or 0
 
+        plan = QueryPlan()
+        # Teacher's exams, newest first
+        plan.add("exams", lambda: sb.table("exams").select("*").eq("teacher_id", teacher_id).order("created_at", desc=True).execute().data or [])
         # Submissions for teacher's exams
-        total_submissions = 0
-        pending_evaluations = 0
-        if exam_ids:
-            for eid in exam_ids:
-                subs = sb.table("submissions").select("id, status").eq("exam_id", eid).execute()
-                sub_list = subs.data or []
-                total_submissions += len(sub_list)
-                pending_evaluations += sum(1 for s in sub_list if s["status"] == "submitted")
-
-        # Recent exams
-        recent = sb.table("exams").select("*").eq("teacher_id", teacher_id).order("created_at", desc=True).limit(5).execute()
+        plan.add("total_submissions", lambda: submission_count(), default=0)
+        plan.add("pending_evaluations", lambda: submission_count("submitted"), default=0)
+        data = await plan.run()
 
+        exam_list = data["exams"]
         return TeacherDashboard(
             total_exams=len(exam_list),
-            active_exams=active_exams,
-            total_submissions=total_submissions,
-            pending_evaluations=pending_evaluations,
-            recent_exams=recent.data or []
+            active_exams=sum(1 for e in exam_list if e["status"] in ("scheduled", "active")),
+            total_submissions=data["total_submissions"],
+            pending_evaluations=data["pending_evaluations"],
+            recent_exams=exam_list[:5],
+            unavailable=plan.failed
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Dashboard error: {str(e)}")
 
@@ -57,16 +78,46 @@ async def teacher_dashboard(current_user: dict = Depends(require_role("teacher")
 # ──── Exam CRUD ────
 
 @router.get("/exams", response_model=list)
-async def list_exams(current_user: dict = Depends(require_role("teacher"))):
-    """List all exams created by this teacher."""
+async def list_exams(
+    fields: Optional[list] = Depends(sparse_fields(ExamResponse)),
+    current_user: dict = Depends(require_role("teacher"))
+):
+    """List all exams created by this teacher (`fields=` picks the columns)."""
     try:
         sb = get_supabase_admin()
-        result = sb.table("exams").select("*").eq("teacher_id", current_user["id"]).order("created_at", desc=True).execute()
+        result = sb.table("exams").select(select_columns(fields)).eq("teacher_id", current_user["id"]).order("created_at", desc=True).execute()
         return result.data or []
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _reject_clashes(exam: dict):
+    """409 if the exam would overlap another one for some of the same students."""
+    if exam.get("status") not in TIMETABLE_STATUSES:
+        return
+    clashes = exam_timetable.clashes(exam)
+    if clashes:
+        listed = "; ".join(
+            f"{c['clashes_with']['title']} at {c['clashes_with']['scheduled_at']} ({c['reason']})" for c in clashes[:5]
+        )
+        more = f" and {len(clashes) - 5} more" if len(clashes) > 5 else ""
+        raise HTTPException(status_code=409, detail=f"Exam time clashes with: {listed}{more}")
+
+
+def _write_checked(exam: dict, write) -> list:
+    """
+    Clash-check `exam` (the row as it will be) and run `write` while holding
+    the timetable, so no other create/update can slip in between. Runs in a
+    worker thread; returns the written rows.
+    """
+    with exam_timetable.writing():
+        _reject_clashes(exam)
+        rows = write()
+        for row in rows:
+            exam_timetable.upsert(row)
+        return rows
+
+
 @router.post("/exams", response_model=dict)
 async def create_exam(exam: ExamCreate, current_user: dict = Depends(require_role("teacher"))):
     """Create a new exam."""
@@ -75,10 +126,22 @@ async def create_exam(exam: ExamCreate, current_user: dict = Depends(require_rol
         exam_data = {
             **exam.model_dump(),
             "teacher_id": current_user["id"],
+            "department": current_user.get("department"),
             "status": "draft"
         }
-        result = sb.table("exams").insert(exam_data).execute()
-        return {"message": "Exam created", "exam": result.data[0] if result.data else {}}
+        if exam_data.get("grade_bands"):
+            exam_data["grade_bands"] = normalize_bands(exam_data["grade_bands"])
+
+        created = await asyncio.to_thread(
+            _write_checked, exam_data, lambda: sb.table("exams").insert(exam_data).execute().data or []
+        )
+        for exam_row in created:
+            exam_scheduler.schedule(exam_row)
+        return {"message": "Exam created", "exam": created[0] if created else {}}
+    except TimetableBusy:
+        raise HTTPException(status_code=503, detail="The timetable is busy, try again")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create exam: {str(e)}")
 
@@ -107,15 +170,53 @@ async def update_exam(
     """Update an exam."""
     try:
         sb = get_supabase_admin()
-        update_data = {k: v for k, v in update.model_dump().items() if v is not None}
+        # Unset fields are left alone; an explicit null only clears the clearable ones
+        update_data = {
+            k: v for k, v in update.model_dump(exclude_unset=True).items()
+            if v is not None or k in CLEARABLE_EXAM_FIELDS
+        }
         if "status" in update_data:
             update_data["status"] = update_data["status"].value if hasattr(update_data["status"], "value") else update_data["status"]
 
         if not update_data:
             raise HTTPException(status_code=400, detail="No fields to update")
-
-        sb.table("exams").update(update_data).eq("id", exam_id).eq("teacher_id", current_user["id"]).execute()
+        if update_data.get("grade_bands") is not None:
+            update_data["grade_bands"] = normalize_bands(update_data["grade_bands"])
+        if "total_marks" in update_data:
+            # Checked before writing: a lower total would push percentages past 100 (and DECIMAL(5,2))
+            highest = sb.table("results").select("marks_obtained, exam:exams!inner(teacher_id)").eq("exam_id", exam_id).eq(
+                "exam.teacher_id", current_user["id"]
+            ).order("marks_obtained", desc=True).limit(1).execute()
+            if highest.data and highest.data[0]["marks_obtained"] > update_data["total_marks"]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Total marks cannot be below the highest marks already awarded ({highest.data[0]['marks_obtained']})"
+                )
+        def write():
+            return sb.table("exams").update(update_data).eq("id", exam_id).eq("teacher_id", current_user["id"]).execute().data or []
+
+        if update_data.keys() & TIMETABLE_FIELDS:
+            current = sb.table("exams").select("*").eq("id", exam_id).eq("teacher_id", current_user["id"]).execute()
+            if not current.data:
+                raise HTTPException(status_code=404, detail="Exam not found")
+            updated_rows = await asyncio.to_thread(_write_checked, {**current.data[0], **update_data}, write)
+        else:
+            updated_rows = await asyncio.to_thread(write)
+            for updated in updated_rows:
+                await asyncio.to_thread(exam_timetable.upsert, updated)
+        for updated in updated_rows:
+            exam_scheduler.schedule(updated)
+        invalidate_paper(exam_id)
+
+        # Existing results were graded against the old total/bands
+        if updated_rows and ("total_marks" in update_data or "grade_bands" in update_data):
+            regrade = regrade_exam(exam_id)
+            if regrade["regraded"]:
+                department_ranker.invalidate()
+            return {"message": "Exam updated", "regrade": regrade}
         return {"message": "Exam updated"}
+    except TimetableBusy:
+        raise HTTPException(status_code=503, detail="The timetable is busy, try again")
     except HTTPException:
         raise
     except Exception as e:
@@ -128,6 +229,9 @@ async def delete_exam(exam_id: str, current_user: dict = Depends(require_role("t
     try:
         sb = get_supabase_admin()
         sb.table("exams").delete().eq("id", exam_id).eq("teacher_id", current_user["id"]).execute()
+        exam_scheduler.discard(exam_id)
+        exam_timetable.remove(exam_id)
+        invalidate_paper(exam_id)
         return {"message": "Exam deleted"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -161,6 +265,7 @@ async def add_questions(
             question_data.append(qd)
 
         result = sb.table("questions").insert(question_data).execute()
+        invalidate_paper(exam_id)
         return {"message": f"{len(questions)} questions added", "questions": result.data or []}
 
     except HTTPException:
@@ -169,6 +274,58 @@ async def add_questions(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/exams/{exam_id}/questions/from-bank", response_model=dict)
+async def attach_bank_questions(
+    exam_id: str,
+    attach: AttachBankQuestions,
+    current_user: dict = Depends(require_role("teacher"))
+):
+    """Add questions from the question bank to an exam, in the given order."""
+    try:
+        sb = get_supabase_admin()
+
+        # Verify exam ownership
+        exam = sb.table("exams").select("id").eq("id", exam_id).eq("teacher_id", current_user["id"]).single().execute()
+        if not exam.data:
+            raise HTTPException(status_code=404, detail="Exam not found")
+
+        bank = sb.table("question_bank").select("*").in_("id", attach.question_ids).is_("deleted_at", "null").execute()
+        by_id = {q["id"]: q for q in (bank.data or [])}
+        missing = [qid for qid in attach.question_ids if qid not in by_id]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Bank questions not found: {', '.join(missing)}")
+
+        order_num = attach.start_order
+        if order_num is None:
+            last = sb.table("questions").select("order_num").eq("exam_id", exam_id).order("order_num", desc=True).limit(1).execute()
+            order_num = (last.data[0]["order_num"] + 1) if last.data else 1
+
+        # The exam keeps its own copy, so later bank edits don't change past papers
+        import json
+        question_data = []
+        for offset, qid in enumerate(attach.question_ids):
+            bq = by_id[qid]
+            question_data.append({
+                "exam_id": exam_id,
+                "bank_question_id": qid,
+                "question_text": bq["question_text"],
+                "question_type": bq["question_type"],
+                "options": json.dumps(bq["options"]) if bq.get("options") else None,
+                "correct_answer": bq.get("correct_answer"),
+                "marks": bq["marks"],
+                "order_num": order_num + offset,
+            })
+
+        result = sb.table("questions").insert(question_data).execute()
+        invalidate_paper(exam_id)
+        return {"message": f"{len(question_data)} questions added from bank", "questions": result.data or []}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/exams/{exam_id}/questions", response_model=list)
 async def get_questions(exam_id: str, current_user: dict = Depends(require_role("teacher"))):
     """Get all questions for an exam."""
@@ -198,9 +355,18 @@ async def publish_exam(
         if exam.data["status"] not in ("draft", "scheduled"):
             raise HTTPException(status_code=400, detail="Can only publish draft or scheduled exams")
 
-        sb.table("exams").update({"status": "scheduled"}).eq("id", exam_id).execute()
+        # Drafts are left out of clash checks, so scheduling is where a clash gets caught
+        rows = await asyncio.to_thread(
+            _write_checked, {**exam.data, "status": "scheduled"},
+            lambda: sb.table("exams").update({"status": "scheduled"}).eq("id", exam_id).execute().data or []
+        )
+        for published in rows:
+            exam_scheduler.schedule(published)
+        invalidate_paper(exam_id)
         return {"message": "Exam scheduled successfully"}
 
+    except TimetableBusy:
+        raise HTTPException(status_code=503, detail="The timetable is busy, try again")
     except HTTPException:
         raise
     except Exception as e:
@@ -237,71 +403,60 @@ async def get_submissions(exam_id: str, current_user: dict = Depends(require_rol
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/submissions/{submission_id}/evaluate", response_model=dict)
-async def evaluate_submission(
-    submission_id: str,
-    evaluation: EvaluateSubmission,
+@router.get("/exams/{exam_id}/similarity", response_model=dict)
+async def get_similarity_report(
+    exam_id: str,
+    threshold: float = Query(0.7, ge=0.1, le=1.0, description="Minimum Jaccard similarity to flag"),
     current_user: dict = Depends(require_role("teacher"))
 ):
-    """Grade a student submission."""
+    """Flag pairs of submissions with near-identical text answers."""
     try:
         sb = get_supabase_admin()
 
-        # Get submission
-        sub = sb.table("submissions").select("*").eq("id", submission_id).single().execute()
-        if not sub.data:
-            raise HTTPException(status_code=404, detail="Submission not found")
-
-        # Get exam to verify ownership and total marks
-        exam = sb.table("exams").select("*").eq("id", sub.data["exam_id"]).eq("teacher_id", current_user["id"]).single().execute()
+        # Verify exam ownership
+        exam = sb.table("exams").select("id").eq("id", exam_id).eq("teacher_id", current_user["id"]).single().execute()
         if not exam.data:
-            raise HTTPException(status_code=403, detail="Not authorized to evaluate this submission")
-
-        total_marks = exam.data["total_marks"]
-        if evaluation.marks_obtained > total_marks:
-            raise HTTPException(status_code=400, detail=f"Marks cannot exceed total marks ({total_marks})")
-
-        percentage = round((evaluation.marks_obtained / total_marks) * 100, 2)
-
-        # Determine grade
-        if percentage >= 90:
-            grade = "A+"
-        elif percentage >= 80:
-            grade = "A"
-        elif percentage >= 70:
-            grade = "B+"
-        elif percentage >= 60:
-            grade = "B"
-        elif percentage >= 50:
-            grade = "C"
-        elif percentage >= 40:
-            grade = "D"
-        else:
-            grade = "F"
-
-        # Insert/update result
-        result_data = {
-            "exam_id": sub.data["exam_id"],
-            "student_id": sub.data["student_id"],
-            "submission_id": submission_id,
-            "marks_obtained": evaluation.marks_obtained,
-            "total_marks": total_marks,
-            "percentage": percentage,
-            "grade": grade,
-            "remarks": evaluation.remarks,
-            "evaluated_by": current_user["id"],
-            "published": False
-        }
+            raise HTTPException(status_code=404, detail="Exam not found")
 
-        # Check if result already exists
-        existing = sb.table("results").select("id").eq("submission_id", submission_id).execute()
-        if existing.data:
-            sb.table("results").update(result_data).eq("submission_id", submission_id).execute()
-        else:
-            sb.table("results").insert(result_data).execute()
+        report = await asyncio.to_thread(similarity_report, exam_id, threshold)
+
+        # Enrich flagged pairs with student info (one lookup for all students)
+        student_ids = {p[k] for p in report["flagged_pairs"] for k in ("student_a", "student_b")}
+        if student_ids:
+            profiles = sb.table("profiles").select("id, full_name, reg_number").in_("id", list(student_ids)).execute()
+            by_id = {p["id"]: p for p in (profiles.data or [])}
+            for pair in report["flagged_pairs"]:
+                pair["student_a"] = by_id.get(pair["student_a"], {"id": pair["student_a"]})
+                pair["student_b"] = by_id.get(pair["student_b"], {"id": pair["student_b"]})
+
+        return report
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Update submission status
-        sb.table("submissions").update({"status": "evaluated"}).eq("id", submission_id).execute()
+
+@router.post("/submissions/{submission_id}/evaluate", response_model=dict)
+async def evaluate_submission(
+    submission_id: str,
+    evaluation: EvaluateSubmission,
+    current_user: dict = Depends(require_role("teacher"))
+):
+    """Grade a student submission."""
+    try:
+        # Ownership check, grading and result upsert run in one transaction
+        # (see evaluate_submission in supabase_schema.sql)
+        outcome = call_rpc("evaluate_submission", {
+            "p_submission_id": submission_id,
+            "p_teacher_id": current_user["id"],
+            "p_marks": evaluation.marks_obtained,
+            "p_remarks": evaluation.remarks,
+        })
+        grade = outcome["grade"]
+        percentage = float(outcome["percentage"])
+        # Re-evaluation un-publishes the result, which can change department ranks
+        department_ranker.invalidate()
 
         return {"message": "Submission evaluated", "grade": grade, "percentage": percentage}
 
@@ -314,21 +469,114 @@ async def evaluate_submission(
 @router.post("/exams/{exam_id}/publish-results", response_model=dict)
 async def publish_results(exam_id: str, current_user: dict = Depends(require_role("teacher"))):
     """Publish all results for an exam."""
+    try:
+        call_rpc("publish_results", {"p_exam_id": exam_id, "p_teacher_id": current_user["id"]})
+        exam_scheduler.discard(exam_id)
+        department_ranker.invalidate()
+
+        return {"message": "Results published successfully"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/exams/{exam_id}/results/export")
+async def export_results(exam_id: str, current_user: dict = Depends(require_role("teacher"))):
+    """Download an exam's results as CSV. Works for archived exams too."""
     try:
         sb = get_supabase_admin()
 
-        # Verify ownership
-        exam = sb.table("exams").select("id").eq("id", exam_id).eq("teacher_id", current_user["id"]).single().execute()
+        exam = sb.table("exams").select("id, title").eq("id", exam_id).eq("teacher_id", current_user["id"]).execute()
+        if exam.data:
+            title = exam.data[0]["title"]
+            results = sb.table("results").select("*").eq("exam_id", exam_id).execute().data or []
+        else:
+            entry = archived_exam(exam_id)
+            if not entry or entry["teacher_id"] != current_user["id"]:
+                raise HTTPException(status_code=404, detail="Exam not found")
+            title = entry["title"]
+            results = archived_table(entry, "results")
+
+        student_ids = list({r["student_id"] for r in results})
+        students = {}
+        for i in range(0, len(student_ids), 200):
+            rows = sb.table("profiles").select("id, full_name, reg_number").in_("id", student_ids[i:i + 200]).execute().data or []
+            students.update({s["id"]: s for s in rows})
+
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["reg_number", "full_name", "marks_obtained", "total_marks", "percentage", "grade", "published"])
+        for r in sorted(results, key=lambda r: students.get(r["student_id"], {}).get("reg_number") or ""):
+            student = students.get(r["student_id"], {})
+            writer.writerow([
+                student.get("reg_number"), student.get("full_name"), r["marks_obtained"],
+                r["total_marks"], r.get("percentage"), r.get("grade"), r.get("published"),
+            ])
+
+        filename = "".join(c if c.isalnum() else "_" for c in title) or "results"
+        return Response(
+            content=out.getvalue(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/exams/{exam_id}/submissions/zip")
+async def download_answer_scripts(exam_id: str, current_user: dict = Depends(require_role("teacher"))):
+    """Stream a ZIP of every uploaded answer PDF for an exam, named by register number."""
+    try:
+        sb = get_supabase_admin()
+
+        exam = sb.table("exams").select("id, title").eq("id", exam_id).eq("teacher_id", current_user["id"]).execute()
         if not exam.data:
             raise HTTPException(status_code=404, detail="Exam not found")
 
-        # Publish all results
-        sb.table("results").update({"published": True}).eq("exam_id", exam_id).execute()
+        subs = sb.table("submissions").select("id, student_id, file_url").eq("exam_id", exam_id).not_.is_("file_url", "null").execute().data or []
+        if not subs:
+            raise HTTPException(status_code=404, detail="No answer files for this exam")
+
+        student_ids = list({s["student_id"] for s in subs})
+        students = {}
+        for i in range(0, len(student_ids), 200):
+            rows = sb.table("profiles").select("id, full_name, reg_number").in_("id", student_ids[i:i + 200]).execute().data or []
+            students.update({s["id"]: s for s in rows})
+        for sub in subs:
+            sub["student"] = students.get(sub["student_id"])
+        subs.sort(key=lambda s: (s["student"] or {}).get("reg_number") or "")
+
+        filename = "".join(c if c.isalnum() else "_" for c in exam.data[0]["title"]) or "answers"
+        return StreamingResponse(
+            stream_zip(entry_names(subs)),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}_answers.zip"'},
+        )
 
-        # Update exam status
-        sb.table("exams").update({"status": "results_published"}).eq("id", exam_id).execute()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return {"message": "Results published successfully"}
+
+@router.post("/exams/{exam_id}/regrade", response_model=dict)
+async def regrade_results(exam_id: str, current_user: dict = Depends(require_role("teacher"))):
+    """Recompute percentage and grade of every result with the exam's current grading policy."""
+    try:
+        sb = get_supabase_admin()
+        exam = sb.table("exams").select("id").eq("id", exam_id).eq("teacher_id", current_user["id"]).execute()
+        if not exam.data:
+            raise HTTPException(status_code=404, detail="Exam not found")
+
+        regrade = regrade_exam(exam_id)
+        if regrade["regraded"]:
+            department_ranker.invalidate()
+        return regrade
 
     except HTTPException:
         raise
@@ -0,0 +1,153 @@
+"""
+Answer Script ZIP
+Streams every answer PDF of an exam into one ZIP while the files are still downloading
+"""
+
+import asyncio
+import os
+import zipfile
+from urllib.parse import quote, unquote, urlsplit
+
+import httpx
+
+from app.services.supabase import SUPABASE_SERVICE_KEY, SUPABASE_URL
+
+ANSWERS_BUCKET = "answers"
+# Public, signed and authenticated object URLs all name the bucket after one of these
+_OBJECT_URL_PREFIXES = ("/storage/v1/object/public/", "/storage/v1/object/sign/", "/storage/v1/object/authenticated/", "/storage/v1/object/")
+ZIP_FETCH_CONCURRENCY = int(os.getenv("ZIP_FETCH_CONCURRENCY", "8"))
+CHUNK_SIZE = 64 * 1024
+CHUNKS_BUFFERED_PER_FILE = 4  # memory stays under concurrency × this × CHUNK_SIZE
+_DONE = object()
+
+
+class _Sink:
+    """Write-only file object for zipfile; the generator drains what it collects."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+class _Download:
+    def __init__(self, name: str, path):
+        self.name = name
+        self.path = path
+        self.chunks = asyncio.Queue(maxsize=CHUNKS_BUFFERED_PER_FILE)
+        self.error = None
+
+
+def answer_object_path(file_url: str):
+    """
+    Object path inside this project's answers bucket that a file_url points
+    at, or None. file_url is student-supplied, so only the path is trusted
+    and only from this project's own storage URLs.
+    """
+    url, project = urlsplit(file_url), urlsplit(SUPABASE_URL)
+    if (url.scheme, url.netloc.lower()) != (project.scheme, project.netloc.lower()):
+        return None
+    path = unquote(url.path)
+    for prefix in _OBJECT_URL_PREFIXES:
+        if path.startswith(f"{prefix}{ANSWERS_BUCKET}/"):
+            object_path = path[len(prefix) + len(ANSWERS_BUCKET) + 1:]
+            break
+    else:
+        return None
+    if any(part in ("", ".", "..") for part in object_path.split("/")):
+        return None
+    return object_path
+
+
+def entry_names(submissions: list) -> list:
+    """(file name, object path or None) per submission with a file, named by reg_number and made unique."""
+    seen, entries = {}, []
+    for sub in submissions:
+        if not sub.get("file_url"):
+            continue
+        student = sub.get("student") or {}
+        base = student.get("reg_number") or student.get("full_name") or sub["student_id"]
+        base = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(base))
+        seen[base] = seen.get(base, 0) + 1
+        name = base if seen[base] == 1 else f"{base}_{seen[base]}"
+        entries.append((f"{name}.pdf", answer_object_path(sub["file_url"])))
+    return entries
+
+
+async def _fetch(client: httpx.AsyncClient, download: _Download, ready: asyncio.Queue, slots: asyncio.Semaphore):
+    announced = False
+    async with slots:
+        try:
+            if download.path is None:
+                raise ValueError(f"file_url is not in the {ANSWERS_BUCKET} storage bucket")
+            # Fetched with the service key from our own storage API, never from the stored URL
+            url = f"{SUPABASE_URL.rstrip('/')}/storage/v1/object/{ANSWERS_BUCKET}/{quote(download.path)}"
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    if not announced:
+                        await ready.put(download)
+                        announced = True
+                    # Blocks while the writer is busy elsewhere, which bounds memory
+                    await download.chunks.put(chunk)
+        except Exception as e:
+            download.error = str(e)
+        finally:
+            if not announced:
+                await ready.put(download)
+            await download.chunks.put(_DONE)
+
+
+async def stream_zip(entries: list):
+    """
+    Async generator of ZIP bytes. Up to ZIP_FETCH_CONCURRENCY files download at
+    once; each is written as soon as its first bytes arrive (stored, since
+    PDFs are already compressed). Failed files are listed in MISSING.txt.
+    """
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+    ready = asyncio.Queue()
+    slots = asyncio.Semaphore(ZIP_FETCH_CONCURRENCY)
+    missing = []
+
+    headers = {"Authorization": f"Bearer {SUPABASE_SERVICE_KEY}", "apikey": SUPABASE_SERVICE_KEY or ""}
+    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0), follow_redirects=False, headers=headers) as client:
+        downloads = [_Download(name, path) for name, path in entries]
+        tasks = [asyncio.create_task(_fetch(client, d, ready, slots)) for d in downloads]
+        try:
+            for _ in downloads:
+                download = await ready.get()
+                entry = None
+                while True:
+                    chunk = await download.chunks.get()
+                    if chunk is _DONE:
+                        break
+                    if entry is None:
+                        entry = archive.open(download.name, "w", force_zip64=True)
+                    entry.write(chunk)
+                    if sink.parts:
+                        yield sink.drain()
+                if entry is not None:
+                    entry.close()
+                if download.error:
+                    missing.append(f"{download.name}: {download.error}")
+                if sink.parts:
+                    yield sink.drain()
+
+            if missing:
+                archive.writestr("MISSING.txt", "Files that could not be fetched:\n" + "\n".join(missing) + "\n")
+            archive.close()
+            yield sink.drain()
+        finally:
+            for task in tasks:
+                task.cancel()
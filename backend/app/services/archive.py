@@ -0,0 +1,175 @@
+"""
+Cold-Data Archival
+Moves old completed exams out of the hot tables into compressed columnar files in Storage
+"""
+
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from app.services.cache import TTLCache
+from app.services.exam_sessions import parse_timestamp
+from app.services.leases import try_acquire_lease
+from app.services.performance import semester_for
+from app.services.supabase import get_supabase_admin
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BUCKET = os.getenv("ARCHIVE_BUCKET", "archive")
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "20"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL", "86400"))
+LEASE_NAME = "exam_archiver"
+LEASE_TTL_SECONDS = 3600
+ARCHIVED_TABLES = ("exams", "questions", "submissions", "results")
+PAGE_SIZE = 1000
+
+# Decompressed archive files, keyed by storage path (archives never change once written)
+_file_cache = TTLCache(maxsize=128, ttl=3600)
+
+
+# ──── File format ────
+
+def encode_table(rows: list) -> bytes:
+    """
+    Column-oriented JSON, gzip-compressed: one list per column, so repeated
+    values (exam ids, statuses, grades) sit next to each other and compress well.
+    """
+    columns = sorted({key for row in rows for key in row})
+    table = {"columns": columns, "rows": len(rows), "data": {c: [row.get(c) for row in rows] for c in columns}}
+    return gzip.compress(json.dumps(table, separators=(",", ":"), default=str).encode(), compresslevel=9)
+
+
+def decode_table(blob: bytes) -> list:
+    table = json.loads(gzip.decompress(blob))
+    data = table["data"]
+    return [{c: data[c][i] for c in table["columns"]} for i in range(table["rows"])]
+
+
+def partition_path(exam: dict, department: str) -> str:
+    term = semester_for(parse_timestamp(exam["scheduled_at"]))
+    return f"term={term}/department={department or 'unknown'}/exam={exam['id']}"
+
+
+def _load_file(path: str) -> list:
+    rows = _file_cache.get(path)
+    if rows is None:
+        sb = get_supabase_admin()
+        rows = decode_table(sb.storage.from_(ARCHIVE_BUCKET).download(path))
+        _file_cache.set(path, rows)
+    return rows
+
+
+# ──── Archiving ────
+
+def _all_rows(table: str, exam_id: str) -> list:
+    sb = get_supabase_admin()
+    rows, offset = [], 0
+    while True:
+        page = sb.table(table).select("*").eq("exam_id", exam_id).order("id").range(offset, offset + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        offset += len(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+def archive_candidates(limit: int = ARCHIVE_BATCH) -> list:
+    sb = get_supabase_admin()
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+    result = sb.table("exams").select("*").in_("status", ["completed", "results_published"]).lt("scheduled_at", cutoff).order("scheduled_at").limit(limit).execute()
+    return result.data or []
+
+
+def archive_exam(exam: dict) -> dict:
+    """
+    Write one exam and its questions, submissions and results to Storage, record
+    it in the archive index, then delete it from the hot tables. Files are
+    uploaded before anything is deleted, so a failure leaves the exam hot.
+    """
+    sb = get_supabase_admin()
+    teacher = sb.table("profiles").select("department").eq("id", exam["teacher_id"]).execute()
+    department = teacher.data[0].get("department") if teacher.data else None
+    base = partition_path(exam, department)
+
+    tables = {"exams": [exam]}
+    for table in ARCHIVED_TABLES[1:]:
+        tables[table] = _all_rows(table, exam["id"])
+
+    storage = sb.storage.from_(ARCHIVE_BUCKET)
+    for table, rows in tables.items():
+        storage.upload(f"{base}/{table}.json.gz", encode_table(rows), {"content-type": "application/gzip", "upsert": "true"})
+
+    sb.table("archived_exams").upsert({
+        "exam_id": exam["id"],
+        "teacher_id": exam["teacher_id"],
+        "title": exam["title"],
+        "subject": exam["subject"],
+        "total_marks": exam["total_marks"],
+        "scheduled_at": exam["scheduled_at"],
+        "term": semester_for(parse_timestamp(exam["scheduled_at"])),
+        "department": department,
+        "path": base,
+        "question_count": len(tables["questions"]),
+        "submission_count": len(tables["submissions"]),
+        "result_count": len(tables["results"]),
+    }, on_conflict="exam_id").execute()
+
+    index_rows = [{"student_id": r["student_id"], "exam_id": exam["id"]} for r in tables["results"] if r.get("published")]
+    for i in range(0, len(index_rows), 500):
+        sb.table("archived_result_index").upsert(index_rows[i:i + 500], on_conflict="student_id,exam_id").execute()
+
+    sb.rpc("delete_archived_exam", {"p_exam_id": exam["id"]}).execute()
+    return {"exam_id": exam["id"], "path": base, **{t: len(rows) for t, rows in tables.items()}}
+
+
+def archive_once(limit: int = ARCHIVE_BATCH) -> list:
+    archived = []
+    for exam in archive_candidates(limit):
+        try:
+            archived.append(archive_exam(exam))
+        except Exception as e:
+            print(f"Failed to archive exam {exam['id']}: {e}")
+    return archived
+
+
+async def archive_loop():
+    """Background task: archive old exams in small batches on whichever instance holds the lease."""
+    while True:
+        try:
+            if try_acquire_lease(LEASE_NAME, LEASE_TTL_SECONDS):
+                while True:
+                    archived = await asyncio.to_thread(archive_once)
+                    if archived:
+                        print(f"Archived {len(archived)} exam(s): {[a['exam_id'] for a in archived]}")
+                    if len(archived) < ARCHIVE_BATCH:
+                        break
+        except Exception as e:
+            print(f"Error in archive_loop task: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+
+# ──── Read-through ────
+
+def archived_exam(exam_id: str):
+    sb = get_supabase_admin()
+    row = sb.table("archived_exams").select("*").eq("exam_id", exam_id).execute()
+    return row.data[0] if row.data else None
+
+
+def archived_table(entry: dict, table: str) -> list:
+    """All rows of one table for an archived exam (entry from archived_exams)."""
+    return _load_file(f"{entry['path']}/{table}.json.gz")
+
+
+def archived_student_results(student_id: str) -> list:
+    """Published archived results for a student, shaped like repository.student_results()."""
+    sb = get_supabase_admin()
+    index = sb.table("archived_result_index").select("exam:archived_exams(*)").eq("student_id", student_id).execute().data or []
+    results = []
+    for entry in (i["exam"] for i in index if i.get("exam")):
+        exam = {k: entry[k] for k in ("title", "subject", "total_marks", "scheduled_at")}
+        for r in archived_table(entry, "results"):
+            if r["student_id"] == student_id and r.get("published"):
+                results.append({**r, "exam": exam, "archived": True})
+    return results
@@ -0,0 +1,71 @@
+"""
+Auth Key Material
+Verifies Supabase access tokens locally (JWT secret or the project's JWKS) so requests skip the Auth round trip
+"""
+
+import os
+import threading
+import time
+
+import httpx
+from jose import jwt
+
+from app.services.supabase import SUPABASE_URL
+
+JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+JWKS_TTL_SECONDS = float(os.getenv("AUTH_JWKS_TTL", "3600"))
+JWT_AUDIENCE = "authenticated"
+
+
+class SigningKeys:
+    """
+    Public keys from the project's JWKS endpoint, refreshed hourly, plus the
+    legacy HS256 secret when SUPABASE_JWT_SECRET is set. When neither can
+    verify a token, `verify` returns None and the caller asks Supabase Auth.
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._keys) and time.monotonic() - self._loaded_at < JWKS_TTL_SECONDS
+
+    def load(self) -> int:
+        """Fetch the JWKS. Returns the number of keys now cached."""
+        if not SUPABASE_URL:
+            return 0
+        try:
+            response = httpx.get(f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json", timeout=10)
+            response.raise_for_status()
+            keys = {k["kid"]: k for k in response.json().get("keys", []) if k.get("kid")}
+        except Exception as e:
+            print(f"Failed to load auth signing keys: {e}")
+            keys = {}
+        with self._lock:
+            if keys:
+                self._keys = keys
+            # Back off for a full TTL even on failure, so a missing JWKS isn't refetched per request
+            self._loaded_at = time.monotonic()
+        return len(self._keys)
+
+    def verify(self, token: str):
+        """Claims of a valid token, None if it can't be checked locally. Raises JWTError if invalid."""
+        header = jwt.get_unverified_header(token)
+        alg = header.get("alg")
+        if alg == "HS256":
+            if not JWT_SECRET:
+                return None
+            return jwt.decode(token, JWT_SECRET, algorithms=["HS256"], audience=JWT_AUDIENCE)
+
+        if time.monotonic() - self._loaded_at >= JWKS_TTL_SECONDS:
+            self.load()
+        key = self._keys.get(header.get("kid"))
+        if key is None:
+            return None
+        return jwt.decode(token, key, algorithms=[alg], audience=JWT_AUDIENCE)
+
+
+signing_keys = SigningKeys()
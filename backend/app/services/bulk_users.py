@@ -0,0 +1,195 @@
+"""
+Bulk User Operations
+Update, deactivate or delete many users as a background job with progress tracking
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from app.middleware.auth import forget_profiles
+from app.services.supabase import get_supabase_admin
+
+AUTH_CONCURRENCY = int(os.getenv("BULK_AUTH_CONCURRENCY", "8"))
+CHUNK_SIZE = 200
+PAGE_SIZE = 1000
+MAX_ERRORS_KEPT = 50
+BAN_DURATION = "876000h"  # ~100 years; Supabase Auth has no permanent "disabled" flag
+# Running jobs save progress after every chunk; one silent for this long died with its instance
+STALE_JOB_SECONDS = int(os.getenv("BULK_JOB_STALE_SECONDS", "900"))
+
+# Keeps references to running jobs so they are not garbage collected mid-run
+_running = set()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def like_prefix(prefix: str) -> str:
+    """LIKE pattern matching values that start with `prefix` literally."""
+    if "*" in prefix:
+        # PostgREST turns * into % before the escapes apply
+        raise ValueError("reg_number_prefix cannot contain '*'")
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+def select_users(selector: dict, exclude_id: str = None) -> list:
+    """Profiles (id, email, full_name, role, department, reg_number) matching every given filter."""
+    sb = get_supabase_admin()
+
+    def filtered(query):
+        if selector.get("role"):
+            query = query.eq("role", selector["role"])
+        if selector.get("department"):
+            query = query.eq("department", selector["department"])
+        if selector.get("reg_number_prefix"):
+            query = query.like("reg_number", like_prefix(selector["reg_number_prefix"]))
+        return query
+
+    columns = "id, email, full_name, role, department, reg_number"
+    users = []
+    if selector.get("ids"):
+        ids = list(dict.fromkeys(selector["ids"]))
+        for i in range(0, len(ids), CHUNK_SIZE):
+            users.extend(filtered(sb.table("profiles").select(columns).in_("id", ids[i:i + CHUNK_SIZE])).execute().data or [])
+    else:
+        offset = 0
+        while True:
+            page = filtered(sb.table("profiles").select(columns)).order("id").range(offset, offset + PAGE_SIZE - 1).execute().data or []
+            users.extend(page)
+            offset += len(page)
+            if len(page) < PAGE_SIZE:
+                break
+    # An admin never bulk-edits their own account
+    return [u for u in users if u["id"] != exclude_id]
+
+
+def create_job(action: str, requested_by: str, selector: dict, changes: dict, total: int) -> dict:
+    sb = get_supabase_admin()
+    job = sb.table("bulk_user_jobs").insert({
+        "action": action,
+        "requested_by": requested_by,
+        "selector": selector,
+        "changes": changes,
+        "total": total,
+    }).execute()
+    return job.data[0]
+
+
+def get_job(job_id: str):
+    sb = get_supabase_admin()
+    job = sb.table("bulk_user_jobs").select("*").eq("id", job_id).execute()
+    return job.data[0] if job.data else None
+
+
+class _Progress:
+    """Counts outcomes and writes them to the job row at most once per chunk."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.processed = self.succeeded = self.failed = 0
+        self.errors = []
+
+    def ok(self, count: int = 1):
+        self.processed += count
+        self.succeeded += count
+
+    def fail(self, user_id, error, count: int = 1):
+        self.processed += count
+        self.failed += count
+        if len(self.errors) < MAX_ERRORS_KEPT:
+            self.errors.append({"user_id": user_id, "error": str(error)[:300]})
+
+    def save(self, **extra):
+        sb = get_supabase_admin()
+        sb.table("bulk_user_jobs").update({
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "errors": self.errors,
+            "heartbeat_at": _now(),
+            **extra,
+        }).eq("id", self.job_id).execute()
+
+
+def _update_chunk(ids: list, changes: dict):
+    sb = get_supabase_admin()
+    sb.table("profiles").update(changes).in_("id", ids).execute()
+    forget_profiles(ids)
+
+
+def _delete_profiles(ids: list):
+    sb = get_supabase_admin()
+    sb.table("profiles").delete().in_("id", ids).execute()
+    forget_profiles(ids)
+
+
+async def _auth_calls(ids: list, call, progress: _Progress):
+    """Run one Auth admin call per user with at most AUTH_CONCURRENCY in flight."""
+    semaphore = asyncio.Semaphore(AUTH_CONCURRENCY)
+
+    async def one(user_id):
+        async with semaphore:
+            try:
+                await asyncio.to_thread(call, user_id)
+                progress.ok()
+            except Exception as e:
+                progress.fail(user_id, e)
+
+    await asyncio.gather(*(one(user_id) for user_id in ids))
+
+
+async def run_job(job: dict, user_ids: list):
+    sb = get_supabase_admin()
+    progress = _Progress(job["id"])
+    await asyncio.to_thread(progress.save, status="running", started_at=_now())
+    try:
+        for i in range(0, len(user_ids), CHUNK_SIZE):
+            chunk = user_ids[i:i + CHUNK_SIZE]
+            if job["action"] == "update":
+                try:
+                    await asyncio.to_thread(_update_chunk, chunk, job["changes"])
+                    progress.ok(len(chunk))
+                except Exception as e:
+                    progress.fail(None, e, len(chunk))
+            elif job["action"] == "deactivate":
+                # The profile flag locks out tokens that were issued before the ban
+                try:
+                    await asyncio.to_thread(_update_chunk, chunk, {"deactivated_at": _now()})
+                except Exception as e:
+                    progress.fail(None, e, len(chunk))
+                    continue
+                await _auth_calls(chunk, lambda uid: sb.auth.admin.update_user_by_id(uid, {"ban_duration": BAN_DURATION}), progress)
+            elif job["action"] == "delete":
+                # Same order as the single-user delete: profile first, then the Auth account
+                try:
+                    await asyncio.to_thread(_delete_profiles, chunk)
+                except Exception as e:
+                    progress.fail(None, e, len(chunk))
+                    continue
+                await _auth_calls(chunk, sb.auth.admin.delete_user, progress)
+            await asyncio.to_thread(progress.save)
+        await asyncio.to_thread(progress.save, status="completed", finished_at=_now())
+    except Exception as e:
+        print(f"Bulk user job {job['id']} failed: {e}")
+        progress.errors.append({"user_id": None, "error": str(e)[:300]})
+        await asyncio.to_thread(progress.save, status="failed", finished_at=_now())
+
+
+def fail_stale_jobs() -> int:
+    """Mark jobs whose instance stopped (restart, crash) mid-run as failed."""
+    sb = get_supabase_admin()
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=STALE_JOB_SECONDS)).isoformat()
+    stale = sb.table("bulk_user_jobs").update({
+        "status": "failed",
+        "finished_at": _now(),
+    }).in_("status", ["pending", "running"]).lt("heartbeat_at", cutoff).execute()
+    return len(stale.data or [])
+
+
+def start_job(job: dict, user_ids: list):
+    task = asyncio.create_task(run_job(job, user_ids))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
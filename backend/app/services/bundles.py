@@ -0,0 +1,113 @@
+"""
+Encrypted Exam Bundles
+The sanitized paper is downloadable ahead of time; only its key is released at the start time
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import zlib
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from app.services.repository import student_paper
+
+# A dedicated secret: anyone holding it can derive every paper's key ahead of time
+BUNDLE_SECRET = os.getenv("BUNDLE_SECRET", "").encode()
+BUNDLES_ENABLED = bool(BUNDLE_SECRET)
+BUNDLE_FORMAT = b"ECB1"
+# Only what the paper needs; status is left out so activation doesn't change the bundle
+BUNDLE_EXAM_FIELDS = ("id", "title", "subject", "description", "duration_minutes", "total_marks", "scheduled_at", "shuffle")
+
+
+class ExamBundle:
+    """One encrypted build of a paper. `version` changes whenever the paper does."""
+
+    __slots__ = ("exam_id", "version", "payload", "_paper")
+
+    def __init__(self, exam_id: str, version: str, payload: bytes, paper):
+        self.exam_id = exam_id
+        self.version = version
+        self.payload = payload
+        self._paper = paper
+
+
+def _derive(label: str, exam_id: str, version: str, size: int) -> bytes:
+    if not BUNDLES_ENABLED:
+        raise RuntimeError("BUNDLE_SECRET must be set to serve exam bundles")
+    return hmac.new(BUNDLE_SECRET, f"{label}:{exam_id}:{version}".encode(), hashlib.sha256).digest()[:size]
+
+
+def bundle_key(exam_id: str, version: str) -> bytes:
+    """
+    AES-256 key for one bundle version. Keys and nonces are derived from a
+    server secret, so every instance builds byte-identical bundles without
+    storing any key material.
+    """
+    return _derive("key", exam_id, version, 32)
+
+
+def _plaintext(exam: dict, questions: list) -> tuple:
+    """Canonical paper bytes (exam + sanitized questions) and the version they hash to."""
+    exam = {k: exam.get(k) for k in BUNDLE_EXAM_FIELDS}
+    plaintext = json.dumps({"exam": exam, "questions": questions}, separators=(",", ":"), sort_keys=True, default=str).encode()
+    return plaintext, hashlib.sha256(plaintext).hexdigest()[:32]
+
+
+def build_bundle(exam_id: str, exam: dict, questions: list, paper=None) -> ExamBundle:
+    """Compress and encrypt the paper (exam + sanitized questions in canonical order)."""
+    plaintext, version = _plaintext(exam, questions)
+    nonce = _derive("nonce", exam_id, version, 12)
+    ciphertext = AESGCM(bundle_key(exam_id, version)).encrypt(nonce, zlib.compress(plaintext, 9), exam_id.encode())
+    return ExamBundle(exam_id, version, BUNDLE_FORMAT + nonce + ciphertext, paper)
+
+
+def open_bundle(payload: bytes, exam_id: str, key: bytes) -> dict:
+    """Reverse of build_bundle (what clients do once they get the key)."""
+    if payload[:4] != BUNDLE_FORMAT:
+        raise ValueError("Unknown bundle format")
+    nonce, ciphertext = payload[4:16], payload[16:]
+    return json.loads(zlib.decompress(AESGCM(key).decrypt(nonce, ciphertext, exam_id.encode())))
+
+
+class BundleCache:
+    """
+    Latest bundle per exam. A refetched paper (invalidate_paper() or the paper
+    cache TTL) is only hashed; compression and encryption rerun when its
+    content, and so its version, actually changed.
+    """
+
+    def __init__(self):
+        self._bundles = {}
+        self._lock = threading.Lock()
+
+    async def get(self, exam_id: str):
+        paper = await student_paper(exam_id)
+        exam, questions = paper
+        if not exam:
+            with self._lock:
+                self._bundles.pop(exam_id, None)
+            return None, None
+        with self._lock:
+            bundle = self._bundles.get(exam_id)
+        if bundle is not None and bundle._paper is paper:
+            return exam, bundle
+
+        _, version = _plaintext(exam, questions)
+        if bundle is None or bundle.version != version:
+            bundle = build_bundle(exam_id, exam, questions, paper)
+        else:
+            bundle._paper = paper
+        with self._lock:
+            self._bundles[exam_id] = bundle
+        return exam, bundle
+
+
+bundle_cache = BundleCache()
+
+
+def encode_key(key: bytes) -> str:
+    return base64.b64encode(key).decode()
@@ -0,0 +1,163 @@
+"""
+Change Feed
+Deltas of exams, submissions and results since a cursor, read from the trigger-maintained change_log
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from app.middleware.auth import forget_profiles
+from app.services.enrollment import student_exam_index
+from app.services.supabase import get_supabase_admin
+from app.services.timetable import exam_timetable
+
+FEED_TABLES = ("exams", "submissions", "results")
+CACHE_SYNC_SECONDS = float(os.getenv("CACHE_SYNC_INTERVAL", "5"))
+RETENTION_DAYS = int(os.getenv("CHANGE_LOG_RETENTION_DAYS", "7"))
+STUDENT_VISIBLE_EXAM_STATUSES = ("scheduled", "active", "results_published")
+PAGE_SIZE = 1000
+
+
+class CursorExpired(Exception):
+    """The cursor points at log entries that were already pruned."""
+
+
+def latest_cursor() -> int:
+    """
+    Cursors are transaction-id watermarks (see change_feed_watermark() in the
+    schema): every entry below one is committed and final, whatever order the
+    writing transactions committed in.
+    """
+    sb = get_supabase_admin()
+    return sb.rpc("change_feed_watermark", {}).execute().data
+
+
+def _pruned_before() -> int:
+    sb = get_supabase_admin()
+    row = sb.table("change_feed_state").select("pruned_before").limit(1).execute()
+    return row.data[0]["pruned_before"] if row.data else 0
+
+
+def _visible(user: dict, table: str, row: dict) -> bool:
+    if user["role"] != "student":
+        return True
+    if table == "exams":
+        # Every exam change is logged for students; only the ones they can sit are shown
+        return row.get("status") in STUDENT_VISIBLE_EXAM_STATUSES and student_exam_index.can_take(user, row)
+    if table == "results":
+        return bool(row.get("published"))
+    return True
+
+
+def _scoped(user: dict, query):
+    # The log also carries profile and enrollment changes, which only feed cache invalidation
+    query = query.in_("table_name", list(FEED_TABLES))
+    if user["role"] == "teacher":
+        return query.eq("teacher_id", user["id"])
+    if user["role"] == "student":
+        return query.or_(f"student_id.eq.{user['id']},table_name.eq.exams")
+    return query
+
+
+def changes_since(user: dict, since: int, limit: int = 500) -> dict:
+    """
+    Rows inserted/updated since the cursor (current state) plus ids of deleted
+    rows, scoped to the caller. Cost is proportional to the number of changes.
+    May hit the database for enrollments: call from a worker thread.
+    """
+    sb = get_supabase_admin()
+    if since < _pruned_before():
+        raise CursorExpired()
+
+    watermark = latest_cursor()
+    entries = _scoped(user, sb.table("change_log").select("txid, table_name, row_id, op")).gte(
+        "txid", since
+    ).lt("txid", watermark).order("txid").order("seq").limit(limit).execute().data or []
+
+    # Pages end on a transaction boundary so the next cursor never splits one
+    cursor, has_more = watermark, len(entries) == limit
+    if has_more:
+        last = entries[-1]["txid"]
+        if entries[0]["txid"] == last:
+            entries = _scoped(user, sb.table("change_log").select("txid, table_name, row_id, op")).eq(
+                "txid", last
+            ).order("seq").execute().data or []
+            cursor = last + 1
+        else:
+            entries = [e for e in entries if e["txid"] != last]
+            cursor = last
+
+    # Collapse to the latest operation per row
+    latest = {}
+    for entry in entries:
+        latest[(entry["table_name"], entry["row_id"])] = entry["op"]
+
+    changes = {table: {"upserted": [], "deleted": []} for table in FEED_TABLES}
+    for table in FEED_TABLES:
+        live_ids = [row_id for (t, row_id), op in latest.items() if t == table and op != "delete"]
+        deleted = {row_id for (t, row_id), op in latest.items() if t == table and op == "delete"}
+
+        for i in range(0, len(live_ids), 200):
+            rows = sb.table(table).select("*").in_("id", live_ids[i:i + 200]).execute().data or []
+            found = set()
+            for row in rows:
+                found.add(row["id"])
+                if _visible(user, table, row):
+                    changes[table]["upserted"].append(row)
+                else:
+                    deleted.add(row["id"])
+            # Rows that disappeared since they were logged are deletions too
+            deleted.update(set(live_ids[i:i + 200]) - found)
+
+        changes[table]["deleted"] = sorted(deleted)
+
+    return {
+        "cursor": cursor,
+        "has_more": has_more,
+        "changes": changes,
+    }
+
+
+def prune_change_log() -> None:
+    sb = get_supabase_admin()
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)).isoformat()
+    sb.rpc("prune_change_log", {"p_before": cutoff}).execute()
+
+
+def _apply_invalidations(since: int) -> int:
+    """Drop cached state for profiles and enrollments changed since the cursor; returns the next cursor."""
+    sb = get_supabase_admin()
+    watermark = latest_cursor()
+    rows, offset = [], 0
+    while True:
+        page = sb.table("change_log").select("table_name, row_id, student_id").in_(
+            "table_name", ["profiles", "course_enrollments"]
+        ).gte("txid", since).lt("txid", watermark).order("txid").order("seq").range(
+            offset, offset + PAGE_SIZE - 1
+        ).execute().data or []
+        rows.extend(page)
+        offset += len(page)
+        if len(page) < PAGE_SIZE:
+            break
+
+    forget_profiles({row["row_id"] for row in rows if row["table_name"] == "profiles"})
+    enrolled = {row["student_id"] for row in rows if row["table_name"] == "course_enrollments"}
+    if enrolled:
+        student_exam_index.invalidate(enrolled)
+        exam_timetable.invalidate()
+    return watermark
+
+
+async def cache_invalidation_loop():
+    """Background task; applies profile and enrollment changes made on any instance to this one's caches."""
+    cursor = None
+    while True:
+        try:
+            if cursor is None:
+                cursor = await asyncio.to_thread(latest_cursor)
+            else:
+                cursor = await asyncio.to_thread(_apply_invalidations, cursor)
+        except Exception as e:
+            print(f"Error in cache_invalidation_loop task: {e}")
+        await asyncio.sleep(CACHE_SYNC_SECONDS)
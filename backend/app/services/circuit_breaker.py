@@ -0,0 +1,102 @@
+"""
+Circuit Breaker
+Stops calling an upstream that keeps failing, so requests fail fast instead of piling up
+"""
+
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "10"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(HTTPException):
+    """
+    Raised instead of calling an upstream whose breaker is open. It is an
+    HTTPException (503 + Retry-After), so routers that re-raise HTTPExceptions
+    pass it straight through.
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"{name} is unavailable, retry shortly",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.5)))},
+        )
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open every call
+    is rejected; after `reset_seconds` a single probe is let through
+    (half-open), and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go ahead now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            waited = time.monotonic() - self._opened_at
+            if self.state == OPEN and waited >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self._counters["rejected"] += 1
+            raise CircuitOpenError(self.name, max(0.0, self.reset_seconds - waited))
+
+    def record_success(self):
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            self.state = CLOSED
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self._counters["opened"] += 1
+
+    async def call(self, fn):
+        """Await `fn()` under the breaker."""
+        self.check()
+        try:
+            result = await fn()
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_seconds": self.reset_seconds,
+                **self._counters,
+            }
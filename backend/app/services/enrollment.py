@@ -0,0 +1,110 @@
+"""
+Enrollment
+Which students an exam is for, and an indexed lookup of each student's open exams
+"""
+
+import asyncio
+import os
+import threading
+
+from app.services.cache import TTLCache
+from app.services.repository import repository
+from app.services.supabase import get_supabase_admin
+
+ENROLLMENT_CACHE_TTL = float(os.getenv("ENROLLMENT_CACHE_TTL", "300"))
+CHUNK_SIZE = 200
+PAGE_SIZE = 1000
+
+
+def _paged(query_for_range) -> list:
+    rows, offset = [], 0
+    while True:
+        page = query_for_range(offset, offset + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        offset += len(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+def exam_audience(exam: dict, columns: str = "*") -> list:
+    """Profiles of the students an exam is for: its course's enrollments, else its department."""
+    sb = get_supabase_admin()
+    if exam.get("course_id"):
+        enrolled = _paged(lambda lo, hi: sb.table("course_enrollments").select("student_id").eq("course_id", exam["course_id"]).order("student_id").range(lo, hi))
+        ids = [e["student_id"] for e in enrolled]
+        profiles = []
+        for i in range(0, len(ids), CHUNK_SIZE):
+            profiles.extend(sb.table("profiles").select(columns).in_("id", ids[i:i + CHUNK_SIZE]).execute().data or [])
+        return profiles
+
+    def students(lo, hi):
+        query = sb.table("profiles").select(columns).eq("role", "student")
+        if exam.get("department"):
+            query = query.eq("department", exam["department"])
+        return query.order("id").range(lo, hi)
+    return _paged(students)
+
+
+class StudentExamIndex:
+    """
+    Open exams indexed by course and by department, rebuilt whenever the shared
+    open-exam listing is refetched, plus a cache of each student's courses.
+    A student's exams are then a few dictionary lookups, so the cost follows
+    the number of exams they are actually enrolled for.
+    """
+
+    def __init__(self):
+        self._courses = TTLCache(maxsize=50000, ttl=ENROLLMENT_CACHE_TTL)
+        self._listing = None
+        self._by_course = {}
+        self._by_department = {}
+        self._lock = threading.Lock()
+
+    def _index(self, listing: list):
+        with self._lock:
+            if listing is self._listing:
+                return
+            by_course, by_department = {}, {}
+            for exam in listing:
+                if exam.get("course_id"):
+                    by_course.setdefault(exam["course_id"], []).append(exam)
+                else:
+                    by_department.setdefault(exam.get("department"), []).append(exam)
+            self._listing, self._by_course, self._by_department = listing, by_course, by_department
+
+    def courses_for(self, student_id: str) -> tuple:
+        courses = self._courses.get(student_id)
+        if courses is None:
+            sb = get_supabase_admin()
+            rows = sb.table("course_enrollments").select("course_id").eq("student_id", student_id).execute().data or []
+            courses = tuple(r["course_id"] for r in rows)
+            self._courses.set(student_id, courses)
+        return courses
+
+    async def exams_for(self, student: dict) -> list:
+        """Scheduled/active exams for this student, by start time. Shared rows: don't mutate."""
+        self._index(await repository.open_exams())
+        courses = await asyncio.to_thread(self.courses_for, student["id"])
+        with self._lock:
+            exams = [e for c in courses for e in self._by_course.get(c, ())]
+            exams += self._by_department.get(student.get("department"), ())
+            # Exams whose teacher has no department stay open to everyone
+            if student.get("department") is not None:
+                exams += self._by_department.get(None, ())
+        return sorted(exams, key=lambda e: e["scheduled_at"])
+
+    def can_take(self, student: dict, exam: dict) -> bool:
+        if exam.get("course_id"):
+            return exam["course_id"] in self.courses_for(student["id"])
+        return exam.get("department") in (None, student.get("department"))
+
+    def invalidate(self, student_ids=None):
+        """Drop cached course lists (all of them when no ids are given)."""
+        if student_ids is None:
+            self._courses.clear()
+            return
+        for student_id in student_ids:
+            self._courses.delete(student_id)
+
+
+student_exam_index = StudentExamIndex()
@@ -0,0 +1,190 @@
+"""
+Exam Status Scheduler
+Min-heap of upcoming transitions (scheduled → active → completed), applied in batches
+"""
+
+import asyncio
+import heapq
+import os
+import threading
+import time
+from datetime import timedelta
+
+from app.services.supabase import get_supabase_admin
+from app.services.exam_sessions import parse_timestamp
+from app.services.leases import try_acquire_lease, release_lease
+
+SCHEDULER_ENABLED = os.getenv("EXAM_SCHEDULER_ENABLED", "true").lower() == "true"
+LEASE_NAME = "exam_scheduler"
+LEASE_TTL_SECONDS = int(os.getenv("EXAM_SCHEDULER_LEASE_TTL", "60"))
+MAX_SLEEP_SECONDS = float(os.getenv("EXAM_SCHEDULER_MAX_SLEEP", "15"))
+MIN_SLEEP_SECONDS = 1.0
+# Edits made on other instances reach the leader's heap at the next resync
+RESYNC_SECONDS = float(os.getenv("EXAM_SCHEDULER_RESYNC", "30"))
+
+
+def exam_transitions(exam: dict) -> list:
+    """Upcoming (epoch, target_status) pairs for an exam, based on its current status."""
+    if exam.get("status") not in ("scheduled", "active"):
+        return []
+    start = parse_timestamp(exam["scheduled_at"])
+    end = start + timedelta(minutes=exam["duration_minutes"])
+    transitions = [(end.timestamp(), "completed")]
+    if exam["status"] == "scheduled":
+        transitions.insert(0, (start.timestamp(), "active"))
+    return transitions
+
+
+class ExamScheduler:
+    """
+    Heap entries are (due_at, exam_id, target_status, version). Rescheduling or
+    deleting an exam bumps its version, so outdated entries are skipped lazily.
+    Only the lease holder keeps a heap; on followers schedule() is a no-op,
+    since nothing there would ever pop the entries.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._versions = {}
+        self._leading = False
+        self._lock = threading.Lock()
+        self._wakeup = None
+
+    def schedule(self, exam: dict):
+        """Replace any pending transitions for this exam with fresh ones."""
+        with self._lock:
+            if not self._leading:
+                return
+            version = self._versions.get(exam["id"], 0) + 1
+            self._versions[exam["id"]] = version
+            for due_at, target in exam_transitions(exam):
+                heapq.heappush(self._heap, (due_at, exam["id"], target, version))
+        self._notify()
+
+    def discard(self, exam_id: str):
+        with self._lock:
+            if exam_id in self._versions:
+                self._versions[exam_id] += 1
+
+    def rebuild(self, exams: list):
+        """Take over scheduling with the given exams (called by the lease holder)."""
+        with self._lock:
+            self._heap = []
+            self._versions = {}
+            self._leading = True
+        for exam in exams:
+            self.schedule(exam)
+
+    def step_down(self):
+        """Lost the lease: forget everything, another instance schedules now."""
+        with self._lock:
+            self._heap = []
+            self._versions = {}
+            self._leading = False
+
+    def requeue(self, due: dict, at: float):
+        """Put transitions back after applying them failed."""
+        with self._lock:
+            for exam_id, target in due.items():
+                version = self._versions.setdefault(exam_id, 1)
+                heapq.heappush(self._heap, (at, exam_id, target, version))
+
+    def next_due(self):
+        """Epoch of the earliest live transition, or None."""
+        with self._lock:
+            while self._heap:
+                due_at, exam_id, _, version = self._heap[0]
+                if self._versions.get(exam_id) == version:
+                    return due_at
+                heapq.heappop(self._heap)
+            return None
+
+    def pop_due(self, now: float) -> dict:
+        """Remove every transition due by `now`, grouped as {exam_id: target_status}."""
+        due = {}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, exam_id, target, version = heapq.heappop(self._heap)
+                if self._versions.get(exam_id) == version:
+                    # A later "completed" wins over an "active" popped in the same batch
+                    if due.get(exam_id) != "completed":
+                        due[exam_id] = target
+        return due
+
+    def _notify(self):
+        if self._wakeup is not None:
+            try:
+                self._wakeup.set()
+            except RuntimeError:
+                pass
+
+    async def wait(self, timeout: float):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, timeout))
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def __len__(self):
+        return len(self._heap)
+
+
+exam_scheduler = ExamScheduler()
+
+
+def load_pending_exams() -> list:
+    sb = get_supabase_admin()
+    result = sb.table("exams").select("id, status, scheduled_at, duration_minutes").in_("status", ["scheduled", "active"]).execute()
+    return result.data or []
+
+
+def apply_transitions(exam_ids: list) -> list:
+    """
+    Move the given exams to the status their times call for, in one call.
+    The database re-checks scheduled_at/duration, so a stale heap can't
+    activate an exam that was rescheduled on another instance.
+    """
+    if not exam_ids:
+        return []
+    sb = get_supabase_admin()
+    result = sb.rpc("apply_exam_transitions", {"p_exam_ids": exam_ids}).execute()
+    return result.data or []
+
+
+async def exam_scheduler_loop():
+    """Background task: sleep until the next transition, then apply every due one."""
+    is_leader = False
+    last_sync = 0.0
+
+    while True:
+        due = {}
+        try:
+            was_leader = is_leader
+            is_leader = await asyncio.to_thread(try_acquire_lease, LEASE_NAME, LEASE_TTL_SECONDS)
+            if was_leader and not is_leader:
+                exam_scheduler.step_down()
+
+            if is_leader and (not was_leader or time.time() - last_sync >= RESYNC_SECONDS):
+                exam_scheduler.rebuild(await asyncio.to_thread(load_pending_exams))
+                last_sync = time.time()
+
+            if is_leader:
+                due = exam_scheduler.pop_due(time.time())
+                if due:
+                    changed = await asyncio.to_thread(apply_transitions, list(due))
+                    print(f"Exam scheduler moved {len(changed)} exam(s): {[(e['id'], e['status']) for e in changed]}")
+        except Exception as e:
+            print(f"Error in exam_scheduler_loop task: {e}")
+            if due:
+                exam_scheduler.requeue(due, time.time() + MIN_SLEEP_SECONDS)
+
+        next_due = exam_scheduler.next_due()
+        # Wake at the next transition, but renew the lease well before it expires
+        sleep_for = MAX_SLEEP_SECONDS if next_due is None else min(MAX_SLEEP_SECONDS, next_due - time.time())
+        await exam_scheduler.wait(max(MIN_SLEEP_SECONDS, sleep_for))
+
+
+def stop_exam_scheduler():
+    release_lease(LEASE_NAME)
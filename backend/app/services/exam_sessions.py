@@ -0,0 +1,183 @@
+"""
+Exam Session Draft Store
+Write-coalescing in-memory store for autosaved answers, flushed to Supabase in batches
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.services.supabase import get_supabase_admin
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("DRAFT_FLUSH_INTERVAL", "5"))
+FLUSH_BATCH_SIZE = int(os.getenv("DRAFT_FLUSH_BATCH_SIZE", "500"))
+IDLE_EVICT_SECONDS = int(os.getenv("DRAFT_IDLE_EVICT_SECONDS", "3600"))
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse an ISO timestamp returned by Supabase into an aware datetime."""
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def remaining_seconds(session: dict) -> int:
+    """Seconds left before the session deadline (never negative)."""
+    deadline = parse_timestamp(session["deadline_at"])
+    return max(0, int((deadline - datetime.now(timezone.utc)).total_seconds()))
+
+
+def new_session(exam: dict, student_id: str) -> dict:
+    """
+    Build a fresh session row for a student starting an exam. A late start
+    gets what is left of the exam, not the full duration.
+    """
+    now = datetime.now(timezone.utc)
+    duration = timedelta(minutes=exam["duration_minutes"])
+    deadline = min(now + duration, parse_timestamp(exam["scheduled_at"]) + duration)
+    return {
+        "exam_id": exam["id"],
+        "student_id": student_id,
+        "answers": {},
+        "started_at": now.isoformat(),
+        "deadline_at": deadline.isoformat(),
+        "last_seen_at": now.isoformat(),
+        "remaining_seconds": max(0, int((deadline - now).total_seconds())),
+    }
+
+
+class DraftStore:
+    """
+    Holds the latest draft per (exam, student) and remembers which ones changed.
+    Repeated autosaves between two flushes collapse into a single upstream write.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._dirty = set()
+        self._touched = {}
+        self._lock = threading.Lock()
+
+    def get(self, exam_id: str, student_id: str) -> Optional[dict]:
+        with self._lock:
+            session = self._sessions.get((exam_id, student_id))
+            return dict(session) if session else None
+
+    def put(self, session: dict, dirty: bool = True):
+        key = (session["exam_id"], session["student_id"])
+        with self._lock:
+            self._sessions[key] = dict(session)
+            self._touched[key] = time.monotonic()
+            if dirty:
+                self._dirty.add(key)
+
+    def touch(self, exam_id: str, student_id: str, answers: Optional[dict] = None) -> Optional[dict]:
+        """
+        Record a heartbeat (and optionally merge answers) without hitting the
+        database. Only changed answers make the draft dirty; heartbeats alone
+        stay in memory.
+        """
+        key = (exam_id, student_id)
+        with self._lock:
+            session = self._sessions.get(key)
+            if not session:
+                return None
+            if answers:
+                merged = {**session.get("answers", {}), **answers}
+                if merged != session.get("answers"):
+                    session["answers"] = merged
+                    self._dirty.add(key)
+            session["last_seen_at"] = datetime.now(timezone.utc).isoformat()
+            session["remaining_seconds"] = remaining_seconds(session)
+            self._touched[key] = time.monotonic()
+            return dict(session)
+
+    def pop(self, exam_id: str, student_id: str) -> Optional[dict]:
+        key = (exam_id, student_id)
+        with self._lock:
+            self._dirty.discard(key)
+            self._touched.pop(key, None)
+            return self._sessions.pop(key, None)
+
+    def drain_dirty(self) -> list:
+        """Take a snapshot of every changed draft and clear the dirty set."""
+        with self._lock:
+            rows = [dict(self._sessions[key]) for key in self._dirty if key in self._sessions]
+            self._dirty.clear()
+            return rows
+
+    def mark_dirty(self, rows: list):
+        """Re-queue rows whose flush failed, unless they were submitted meanwhile."""
+        with self._lock:
+            for row in rows:
+                key = (row["exam_id"], row["student_id"])
+                if key in self._sessions:
+                    self._dirty.add(key)
+
+    def evict_idle(self, max_idle_seconds: int = IDLE_EVICT_SECONDS) -> int:
+        """Drop clean sessions nobody has touched for a while."""
+        cutoff = time.monotonic() - max_idle_seconds
+        with self._lock:
+            stale = [k for k, t in self._touched.items() if t < cutoff and k not in self._dirty]
+            for key in stale:
+                self._sessions.pop(key, None)
+                self._touched.pop(key, None)
+            return len(stale)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+draft_store = DraftStore()
+
+
+def load_session(exam_id: str, student_id: str) -> Optional[dict]:
+    """Return the draft from memory, falling back to the last flushed copy in the database."""
+    session = draft_store.get(exam_id, student_id)
+    if session:
+        return session
+
+    sb = get_supabase_admin()
+    result = sb.table("exam_sessions").select("*").eq("exam_id", exam_id).eq("student_id", student_id).execute()
+    if not result.data:
+        return None
+
+    session = {k: v for k, v in result.data[0].items() if k not in ("id", "updated_at")}
+    draft_store.put(session, dirty=False)
+    return session
+
+
+def flush_drafts() -> int:
+    """
+    Write every changed draft to exam_sessions in batches. save_exam_drafts()
+    skips drafts whose exam was submitted meanwhile, so a flush racing a
+    submit cannot bring back the session the submit just cleared.
+    """
+    rows = draft_store.drain_dirty()
+    if not rows:
+        return 0
+
+    sb = get_supabase_admin()
+    written = 0
+    for i in range(0, len(rows), FLUSH_BATCH_SIZE):
+        batch = rows[i:i + FLUSH_BATCH_SIZE]
+        try:
+            written += sb.rpc("save_exam_drafts", {"p_rows": batch}).execute().data or 0
+        except Exception as e:
+            print(f"Failed to flush {len(batch)} exam drafts: {e}")
+            draft_store.mark_dirty(rows[i:])
+            break
+    return written
+
+
+async def draft_flush_loop():
+    """Background task that periodically flushes coalesced drafts."""
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        try:
+            flush_drafts()
+            draft_store.evict_idle()
+        except Exception as e:
+            print(f"Error in draft_flush_loop task: {e}")
@@ -0,0 +1,40 @@
+"""
+Sparse Fieldsets
+`?fields=a,b,c` validated against a response model and turned into a PostgREST column list
+"""
+
+from typing import Optional
+
+from fastapi import HTTPException, Query
+
+
+def sparse_fields(model, required=("id",), extra=()):
+    """
+    Dependency factory: parses `fields=` into a column list (None means all
+    columns). Names must be fields of `model` (or `extra`); `required` columns
+    are always included so clients can still key the rows.
+    """
+    allowed = set(model.model_fields) | set(extra)
+
+    def dependency(fields: Optional[str] = Query(None, description="Comma-separated fields to return")) -> Optional[list]:
+        if not fields:
+            return None
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(requested) - allowed)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(sorted(allowed))}")
+        return list(dict.fromkeys([*required, *requested]))
+
+    return dependency
+
+
+def select_columns(fields: Optional[list]) -> str:
+    """PostgREST select() argument for a fieldset."""
+    return "*" if fields is None else ",".join(fields)
+
+
+def project(rows: list, fields: Optional[list]) -> list:
+    """Trim already-fetched rows (e.g. shared cached listings) to a fieldset."""
+    if fields is None:
+        return rows
+    return [{f: row.get(f) for f in fields} for row in rows]
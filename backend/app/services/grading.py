@@ -0,0 +1,39 @@
+"""
+Grading Policy
+Configurable grade bands and re-grading of an exam's results
+"""
+
+from app.services.supabase import get_supabase_admin
+
+
+def normalize_bands(bands: list) -> list:
+    """Sorted highest first, with unique thresholds and one band starting at 0. Raises ValueError."""
+    ordered = sorted(({"min_percentage": float(b["min_percentage"]), "grade": b["grade"]} for b in bands), key=lambda b: -b["min_percentage"])
+    thresholds = [b["min_percentage"] for b in ordered]
+    if len(set(thresholds)) != len(thresholds):
+        raise ValueError("Grade band thresholds must be unique")
+    if not ordered or thresholds[-1] != 0:
+        raise ValueError("The lowest grade band must start at 0")
+    return ordered
+
+
+def regrade_exam(exam_id: str) -> dict:
+    """
+    Recompute total_marks, percentage and grade of every result of an exam from
+    its current total_marks and grade bands (see regrade_exam in supabase_schema.sql).
+    """
+    sb = get_supabase_admin()
+    return sb.rpc("regrade_exam", {"p_exam_id": exam_id}).execute().data
+
+
+def regrade_department(department: str) -> list:
+    """Re-grade every exam in a department that follows the department policy."""
+    sb = get_supabase_admin()
+    exams = sb.table("exams").select("id").eq("department", department).is_("grade_bands", "null").execute().data or []
+    summaries = []
+    for exam in exams:
+        try:
+            summaries.append(regrade_exam(exam["id"]))
+        except Exception as e:
+            print(f"Failed to re-grade exam {exam['id']}: {e}")
+    return summaries
@@ -0,0 +1,36 @@
+"""
+Service Leases
+Database-backed leases so a background job runs on exactly one instance
+"""
+
+import os
+import uuid
+
+from app.services.supabase import get_supabase_admin
+
+# Identifies this process when holding a lease
+INSTANCE_ID = os.getenv("INSTANCE_ID") or uuid.uuid4().hex
+
+
+def try_acquire_lease(name: str, ttl_seconds: int) -> bool:
+    """Acquire or renew the named lease. Returns True while this instance holds it."""
+    try:
+        sb = get_supabase_admin()
+        result = sb.rpc("acquire_lease", {
+            "p_name": name,
+            "p_holder": INSTANCE_ID,
+            "p_ttl_seconds": ttl_seconds,
+        }).execute()
+        return bool(result.data)
+    except Exception as e:
+        print(f"Failed to acquire lease {name}: {e}")
+        return False
+
+
+def release_lease(name: str):
+    """Give the lease up early (e.g. on shutdown) so another instance can take over."""
+    try:
+        sb = get_supabase_admin()
+        sb.table("service_leases").delete().eq("name", name).eq("holder", INSTANCE_ID).execute()
+    except Exception as e:
+        print(f"Failed to release lease {name}: {e}")
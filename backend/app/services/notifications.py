@@ -0,0 +1,207 @@
+"""
+Notification Outbox Dispatcher
+Delivers events written to notification_outbox in batches, with retries and backoff
+"""
+
+import asyncio
+import json
+import os
+import random
+import smtplib
+import threading
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+
+import httpx
+
+from app.services.enrollment import exam_audience
+from app.services.supabase import get_supabase_admin
+
+DISPATCH_INTERVAL_SECONDS = float(os.getenv("NOTIFY_DISPATCH_INTERVAL", "10"))
+CLAIM_LIMIT = int(os.getenv("NOTIFY_CLAIM_LIMIT", "10"))
+CLAIM_LEASE_SECONDS = int(os.getenv("NOTIFY_CLAIM_LEASE", "300"))
+BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "100"))
+MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE_SECONDS = float(os.getenv("NOTIFY_BACKOFF_BASE", "30"))
+BACKOFF_MAX_SECONDS = float(os.getenv("NOTIFY_BACKOFF_MAX", "3600"))
+PAGE_SIZE = 1000
+
+
+# ──── Sinks ────
+
+class FileSink:
+    """Appends one JSON line per notification. Meant for local testing."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send_batch(self, notifications: list):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for n in notifications:
+                f.write(json.dumps(n) + "\n")
+
+
+class WebhookSink:
+    """POSTs each batch as a JSON array to a webhook URL."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send_batch(self, notifications: list):
+        response = httpx.post(self.url, json=notifications, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class EmailSink:
+    """Sends one email per notification over a single SMTP connection per batch."""
+
+    def __init__(self, host: str, port: int, username: str, password: str, sender: str):
+        self.host, self.port = host, port
+        self.username, self.password = username, password
+        self.sender = sender
+
+    def send_batch(self, notifications: list):
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for n in notifications:
+                if not n.get("to"):
+                    continue
+                msg = EmailMessage()
+                msg["From"] = self.sender
+                msg["To"] = n["to"]
+                msg["Subject"] = n["subject"]
+                msg.set_content(n["body"])
+                smtp.send_message(msg)
+
+
+def build_sink():
+    """Pick the delivery sink from NOTIFY_SINK (file, webhook or email)."""
+    kind = os.getenv("NOTIFY_SINK", "file").lower()
+    if kind == "webhook":
+        return WebhookSink(os.environ["NOTIFY_WEBHOOK_URL"])
+    if kind == "email":
+        return EmailSink(
+            os.environ["SMTP_HOST"],
+            int(os.getenv("SMTP_PORT", "587")),
+            os.getenv("SMTP_USERNAME", ""),
+            os.getenv("SMTP_PASSWORD", ""),
+            os.getenv("SMTP_FROM", "noreply@examconnect.local"),
+        )
+    return FileSink(os.getenv("NOTIFY_FILE_PATH", "/tmp/examconnect-notifications.jsonl"))
+
+
+# ──── Fan-out ────
+
+def _student_profiles(student_ids: list) -> list:
+    sb = get_supabase_admin()
+    profiles = []
+    for i in range(0, len(student_ids), 200):
+        chunk = student_ids[i:i + 200]
+        profiles.extend(sb.table("profiles").select("id, email, full_name").in_("id", chunk).execute().data or [])
+    return profiles
+
+
+def recipients_for(event: dict) -> list:
+    """Students to notify for an outbox event, in a stable order so retries can resume."""
+    sb = get_supabase_admin()
+    if event["event_type"] == "results_published":
+        rows = []
+        while True:
+            page = sb.table("results").select("student_id").eq("exam_id", event["exam_id"]).eq("published", True).order(
+                "student_id"
+            ).range(len(rows), len(rows) + PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+        profiles = _student_profiles(sorted({r["student_id"] for r in rows}))
+    else:
+        exam = sb.table("exams").select("id, course_id, department").eq("id", event["exam_id"]).execute()
+        profiles = exam_audience(exam.data[0], "id, email, full_name") if exam.data else []
+    return sorted(profiles, key=lambda p: p["id"])
+
+
+def render(event: dict, exam: dict, student: dict) -> dict:
+    title = exam.get("title", "your exam")
+    if event["event_type"] == "results_published":
+        subject = f"Results published: {title}"
+        body = f"Hi {student.get('full_name', '')},\n\nResults for {title} are now available on Exam Connect."
+    else:
+        subject = f"Exam scheduled: {title}"
+        body = f"Hi {student.get('full_name', '')},\n\n{title} ({exam.get('subject', '')}) is scheduled for {exam.get('scheduled_at')}."
+    return {
+        "event_id": event["id"],
+        "event_type": event["event_type"],
+        "exam_id": event["exam_id"],
+        "student_id": student["id"],
+        "to": student.get("email"),
+        "subject": subject,
+        "body": body,
+    }
+
+
+# ──── Dispatch ────
+
+def _backoff(attempts: int) -> timedelta:
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)))
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def deliver(event: dict, sink) -> None:
+    """Send one event to all its recipients, resuming after the last delivered batch."""
+    sb = get_supabase_admin()
+    exam = sb.table("exams").select("title, subject, scheduled_at").eq("id", event["exam_id"]).execute()
+    exam = exam.data[0] if exam.data else {}
+
+    recipients = recipients_for(event)
+    progress = event.get("progress") or 0
+    for i in range(progress, len(recipients), BATCH_SIZE):
+        batch = [render(event, exam, r) for r in recipients[i:i + BATCH_SIZE]]
+        sink.send_batch(batch)
+        progress = i + len(batch)
+        sb.table("notification_outbox").update({"progress": progress}).eq("id", event["id"]).execute()
+
+    sb.table("notification_outbox").update({
+        "status": "sent",
+        "sent_at": datetime.now(timezone.utc).isoformat(),
+        "recipient_count": len(recipients),
+        "last_error": None,
+    }).eq("id", event["id"]).execute()
+
+
+def dispatch_once(sink) -> int:
+    """Claim a batch of due events and deliver them. Returns how many were claimed."""
+    sb = get_supabase_admin()
+    events = sb.rpc("claim_outbox_batch", {"p_limit": CLAIM_LIMIT, "p_lease_seconds": CLAIM_LEASE_SECONDS}).execute().data or []
+
+    for event in events:
+        try:
+            deliver(event, sink)
+        except Exception as e:
+            attempts = (event.get("attempts") or 0) + 1
+            update = {"attempts": attempts, "last_error": str(e)[:1000]}
+            if attempts >= MAX_ATTEMPTS:
+                update["status"] = "failed"
+            else:
+                update["status"] = "pending"
+                update["next_attempt_at"] = (datetime.now(timezone.utc) + _backoff(attempts)).isoformat()
+            sb.table("notification_outbox").update(update).eq("id", event["id"]).execute()
+            print(f"Notification event {event['id']} failed (attempt {attempts}): {e}")
+
+    return len(events)
+
+
+async def notification_dispatch_loop():
+    """Background task that drains the outbox. Claims use SKIP LOCKED, so every instance may run it."""
+    sink = build_sink()
+    while True:
+        try:
+            # Keep draining while there is a backlog, otherwise wait for the next tick
+            while await asyncio.to_thread(dispatch_once, sink) == CLAIM_LIMIT:
+                pass
+        except Exception as e:
+            print(f"Error in notification_dispatch_loop task: {e}")
+        await asyncio.sleep(DISPATCH_INTERVAL_SECONDS)
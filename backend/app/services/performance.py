@@ -0,0 +1,115 @@
+"""
+Student Performance Index
+Reads the incrementally maintained student_performance table and ranks students within a department
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from app.services.supabase import get_supabase_admin
+
+RANK_TTL_SECONDS = float(os.getenv("RANK_TTL_SECONDS", "300"))
+PAGE_SIZE = 1000  # PostgREST's default max rows per response
+
+
+def semester_for(at: datetime) -> str:
+    """Mirror of the SQL semester_for(): odd semester is Jul–Dec, even is Jan–Jun."""
+    return f"{at.year}-{'odd' if at.month >= 7 else 'even'}"
+
+
+def _semester_key(semester: str):
+    year, _, half = semester.partition("-")
+    return int(year), 0 if half == "even" else 1
+
+
+def percentile_ranks(averages: np.ndarray) -> np.ndarray:
+    """
+    Percentile rank (0–100) of every value in one vectorized pass: the share of
+    the cohort scoring below, counting ties as half.
+    """
+    if averages.size == 0:
+        return averages
+    ordered = np.sort(averages)
+    below = np.searchsorted(ordered, averages, side="left")
+    at_or_below = np.searchsorted(ordered, averages, side="right")
+    return (below + 0.5 * (at_or_below - below)) / averages.size * 100
+
+
+class DepartmentRanker:
+    """Caches student → percentile rank per department; recomputed lazily after invalidation."""
+
+    def __init__(self):
+        self._ranks = {}
+        self._lock = threading.Lock()
+
+    def _compute(self, department: str) -> dict:
+        sb = get_supabase_admin()
+        rows = []
+        while True:
+            page = sb.table("student_overall_performance").select("student_id, average").eq("department", department).order("student_id").range(len(rows), len(rows) + PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+        if not rows:
+            return {}
+        student_ids = [r["student_id"] for r in rows]
+        averages = np.fromiter((float(r["average"]) for r in rows), dtype=np.float64, count=len(rows))
+        ranks = np.round(percentile_ranks(averages), 1)
+        return dict(zip(student_ids, ranks.tolist()))
+
+    def rank_of(self, student_id: str, department: Optional[str]) -> Optional[float]:
+        if not department:
+            return None
+        with self._lock:
+            cached = self._ranks.get(department)
+        if not cached or time.monotonic() - cached[0] > RANK_TTL_SECONDS:
+            cached = (time.monotonic(), self._compute(department))
+            with self._lock:
+                self._ranks[department] = cached
+        return cached[1].get(student_id)
+
+    def invalidate(self, department: Optional[str] = None):
+        with self._lock:
+            if department is None:
+                self._ranks.clear()
+            else:
+                self._ranks.pop(department, None)
+
+
+department_ranker = DepartmentRanker()
+
+
+def student_performance(student: dict) -> dict:
+    """Running averages per subject and semester, overall average, trend and department rank."""
+    sb = get_supabase_admin()
+    rows = sb.table("student_performance").select("subject, semester, result_count, percentage_sum").eq("student_id", student["id"]).gt("result_count", 0).execute().data or []
+
+    by_subject, by_semester = {}, {}
+    total_count, total_sum = 0, 0.0
+    for r in rows:
+        count, pct_sum = r["result_count"], float(r["percentage_sum"])
+        total_count += count
+        total_sum += pct_sum
+        for bucket, key in ((by_subject, r["subject"]), (by_semester, r["semester"])):
+            c, s = bucket.get(key, (0, 0.0))
+            bucket[key] = (c + count, s + pct_sum)
+
+    def averages(bucket: dict) -> dict:
+        return {k: round(s / c, 2) for k, (c, s) in bucket.items()}
+
+    semesters = averages(by_semester)
+    trend = [{"semester": k, "average": semesters[k]} for k in sorted(semesters, key=_semester_key)]
+
+    return {
+        "average_percentage": round(total_sum / total_count, 2) if total_count else None,
+        "results_counted": total_count,
+        "by_subject": averages(by_subject),
+        "by_semester": semesters,
+        "trend": trend,
+        "department_percentile": department_ranker.rank_of(student["id"], student.get("department")),
+    }
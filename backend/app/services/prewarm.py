@@ -0,0 +1,124 @@
+"""
+Exam-Day Pre-Warming
+Loads papers, student profiles and auth keys into the caches shortly before each exam starts
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.middleware.auth import PROFILE_CACHE_TTL, cache_profiles
+from app.services.auth_keys import signing_keys
+from app.services.bundles import BUNDLES_ENABLED, bundle_cache
+from app.services.enrollment import exam_audience
+from app.services.exam_sessions import parse_timestamp
+from app.services.repository import paper_cache, repository, student_paper
+from app.services.supabase import get_supabase_admin
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() == "true"
+# Start warming this long before scheduled_at, and keep exams warm this long after it
+PREWARM_LEAD_SECONDS = float(os.getenv("PREWARM_LEAD", "300"))
+PREWARM_TAIL_SECONDS = float(os.getenv("PREWARM_TAIL", "600"))
+PREWARM_INTERVAL_SECONDS = float(os.getenv("PREWARM_INTERVAL", "20"))
+PREWARM_CONNECTIONS = int(os.getenv("PREWARM_CONNECTIONS", "8"))
+
+
+def _ping():
+    sb = get_supabase_admin()
+    sb.table("exams").select("id").limit(1).execute()
+
+
+async def open_connections(count: int = PREWARM_CONNECTIONS):
+    """Fill the upstream connection pools with `count` live connections."""
+    await asyncio.gather(*(asyncio.to_thread(_ping) for _ in range(count)))
+    if repository.postgres is not None:
+        await repository.postgres.pool()
+
+
+class Prewarmer:
+    """Tracks what has been warmed for each upcoming exam on this instance."""
+
+    def __init__(self):
+        self.status = {}
+        self.connections_at = 0.0
+
+    def upcoming(self, exams: list) -> list:
+        now = datetime.now(timezone.utc)
+        window_start = now - timedelta(seconds=PREWARM_TAIL_SECONDS)
+        window_end = now + timedelta(seconds=PREWARM_LEAD_SECONDS)
+        return [e for e in exams if window_start <= parse_timestamp(e["scheduled_at"]) <= window_end]
+
+    async def warm_exam(self, exam: dict):
+        state = self.status.setdefault(exam["id"], {"profiles_at": 0.0, "profiles": 0})
+        state.update(title=exam["title"], scheduled_at=exam["scheduled_at"], error=None)
+        try:
+            # The paper cache has a short TTL, so this runs every tick
+            if BUNDLES_ENABLED:
+                await bundle_cache.get(exam["id"])
+            else:
+                await student_paper(exam["id"])
+
+            # Profiles are far bigger; refresh them before the cached copies expire
+            if time.time() - state["profiles_at"] > PROFILE_CACHE_TTL / 2:
+                profiles = await asyncio.to_thread(exam_audience, exam)
+                cache_profiles(profiles)
+                state["profiles"] = len(profiles)
+                state["profiles_at"] = time.time()
+        except Exception as e:
+            state["error"] = str(e)
+            print(f"Failed to pre-warm exam {exam['id']}: {e}")
+
+    async def warm_once(self) -> list:
+        exams = self.upcoming(await repository.open_exams())
+        if not exams:
+            return []
+
+        if not signing_keys.loaded:
+            await asyncio.to_thread(signing_keys.load)
+        if time.time() - self.connections_at > PREWARM_INTERVAL_SECONDS * 3:
+            await open_connections()
+            self.connections_at = time.time()
+
+        await asyncio.gather(*(self.warm_exam(e) for e in exams))
+        live = {e["id"] for e in exams}
+        for exam_id in list(self.status):
+            if exam_id not in live:
+                del self.status[exam_id]
+        return exams
+
+    async def readiness(self) -> dict:
+        """Warm/cold state of every exam in the pre-warm window, as seen by this instance."""
+        exams = []
+        for exam in self.upcoming(await repository.open_exams()):
+            state = self.status.get(exam["id"], {})
+            paper = exam["id"] in paper_cache
+            profiles = time.time() - state.get("profiles_at", 0.0) < PROFILE_CACHE_TTL
+            exams.append({
+                "exam_id": exam["id"],
+                "title": exam["title"],
+                "scheduled_at": exam["scheduled_at"],
+                "status": "warm" if paper and profiles else "cold",
+                "paper_cached": paper,
+                "profiles_cached": state.get("profiles", 0) if profiles else 0,
+                "error": state.get("error"),
+            })
+        return {
+            "ready": all(e["status"] == "warm" for e in exams),
+            "auth_keys_loaded": signing_keys.loaded,
+            "connections_warm": time.time() - self.connections_at < PREWARM_INTERVAL_SECONDS * 3,
+            "exams": exams,
+        }
+
+
+prewarmer = Prewarmer()
+
+
+async def prewarm_loop():
+    """Background task; every instance warms its own caches."""
+    while True:
+        try:
+            await prewarmer.warm_once()
+        except Exception as e:
+            print(f"Error in prewarm_loop task: {e}")
+        await asyncio.sleep(PREWARM_INTERVAL_SECONDS)
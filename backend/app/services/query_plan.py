@@ -0,0 +1,70 @@
+"""
+Query Plan
+Runs independent reads concurrently under one deadline, tolerating failures of optional parts
+"""
+
+import asyncio
+import inspect
+import os
+
+from fastapi import HTTPException
+
+QUERY_PLAN_TIMEOUT = float(os.getenv("QUERY_PLAN_TIMEOUT", "10"))
+_REQUIRED = object()
+
+
+class QueryPlan:
+    """
+    plan = QueryPlan()
+    plan.add("exams", lambda: sb.table("exams").select("*").execute().data)
+    plan.add("counts", repository.dashboard_counts(user_id), default={})
+    results = await plan.run()
+
+    Parts are sync callables (run in worker threads) or awaitables; all start
+    at once, so the plan takes about as long as its slowest read. Parts given
+    a `default` are optional: if they fail or miss the deadline the default is
+    used and their name is listed in `plan.failed`. A required part failing
+    re-raises its error (HTTPExceptions pass through); missing the deadline
+    is a 504.
+    """
+
+    def __init__(self, timeout: float = QUERY_PLAN_TIMEOUT):
+        self.timeout = timeout
+        self._parts = {}
+        self.failed = []
+
+    def add(self, name: str, source, default=_REQUIRED):
+        self._parts[name] = (source, default)
+        return self
+
+    @staticmethod
+    async def _call(source):
+        if inspect.isawaitable(source):
+            return await source
+        return await asyncio.to_thread(source)
+
+    async def run(self) -> dict:
+        tasks = {name: asyncio.create_task(self._call(source)) for name, (source, _) in self._parts.items()}
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.timeout)
+        for task in pending:
+            task.cancel()  # worker threads finish on their own; their results are dropped
+
+        results, errors = {}, {}
+        for name, task in tasks.items():
+            if task not in done:
+                errors[name] = None
+            elif task.exception() is not None:
+                errors[name] = task.exception()
+            else:
+                results[name] = task.result()
+
+        for name, error in errors.items():
+            default = self._parts[name][1]
+            if default is _REQUIRED:
+                if error is None:
+                    raise HTTPException(status_code=504, detail=f"Timed out loading {name}")
+                raise error
+            print(f"Query plan part '{name}' failed: {error or 'timed out'}")
+            self.failed.append(name)
+            results[name] = default
+        return results
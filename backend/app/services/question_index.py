@@ -0,0 +1,183 @@
+"""
+Question Bank Search Index
+In-memory inverted word index plus trigram index, kept in sync incrementally
+"""
+
+import heapq
+import re
+import threading
+import time
+from typing import Optional
+
+from app.services.supabase import get_supabase_admin
+
+SYNC_INTERVAL_SECONDS = 30
+PAGE_SIZE = 1000
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    return _WORD_RE.findall((text or "").lower())
+
+
+def trigrams(word: str, pad: bool = True) -> set:
+    """Trigrams of a word; indexed words are padded, query fragments only when very short."""
+    padded = f"  {word} " if pad else word
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class QuestionIndex:
+    """
+    Maps words and trigrams to question ids. A query token matches a question
+    either exactly (word index) or as a substring/partial word (all of the
+    token's trigrams present), so "photosynth" finds "photosynthesis".
+    """
+
+    def __init__(self):
+        self._docs = {}
+        self._words = {}
+        self._grams = {}
+        self._recency = {}  # question id → insertion counter, newer is larger
+        self._counter = 0
+        self._lock = threading.RLock()
+        self._synced_at = 0  # txid watermark: every row written below it has been read
+        self._checked_at = 0.0
+
+    # ──── Incremental maintenance ────
+
+    def _terms(self, doc: dict):
+        words = set(tokenize(doc.get("question_text")))
+        words.update(tokenize(doc.get("subject")))
+        for tag in doc.get("tags") or []:
+            words.update(tokenize(tag))
+        grams = set()
+        for word in words:
+            grams |= trigrams(word)
+        return words, grams
+
+    def _unlink(self, question_id: str):
+        doc = self._docs.pop(question_id, None)
+        self._recency.pop(question_id, None)
+        if not doc:
+            return
+        words, grams = self._terms(doc)
+        for postings, keys in ((self._words, words), (self._grams, grams)):
+            for key in keys:
+                ids = postings.get(key)
+                if ids is not None:
+                    ids.discard(question_id)
+                    if not ids:
+                        del postings[key]
+
+    def upsert(self, doc: dict):
+        with self._lock:
+            self._unlink(doc["id"])
+            if doc.get("deleted_at"):
+                return
+            self._docs[doc["id"]] = doc
+            self._counter += 1
+            self._recency[doc["id"]] = self._counter
+            words, grams = self._terms(doc)
+            for word in words:
+                self._words.setdefault(word, set()).add(doc["id"])
+            for gram in grams:
+                self._grams.setdefault(gram, set()).add(doc["id"])
+
+    def remove(self, question_id: str):
+        with self._lock:
+            self._unlink(question_id)
+
+    def sync(self, force: bool = False):
+        """Pull rows changed since the last sync (covers edits made on other instances)."""
+        if not force and time.monotonic() - self._checked_at < SYNC_INTERVAL_SECONDS:
+            return
+        self._checked_at = time.monotonic()
+
+        sb = get_supabase_admin()
+        watermark = sb.rpc("change_feed_watermark", {}).execute().data
+        last = None
+        while True:
+            # Keyset paging: a row rewritten mid-sync leaves the txid range, which would shift offsets
+            query = sb.table("question_bank").select("*").gte("txid", self._synced_at).lt("txid", watermark)
+            if last:
+                query = query.or_(f"txid.gt.{last['txid']},and(txid.eq.{last['txid']},id.gt.{last['id']})")
+            page = query.order("txid").order("id").limit(PAGE_SIZE).execute().data or []
+            for doc in page:
+                self.upsert(doc)
+            if len(page) < PAGE_SIZE:
+                break
+            last = page[-1]
+        self._synced_at = max(self._synced_at, watermark)
+
+    # ──── Search ────
+
+    def _postings(self, token: str) -> list:
+        """Trigram posting sets a question must all be in to contain the token, rarest first."""
+        grams = trigrams(token, pad=len(token) < 3)
+        return sorted((self._grams.get(g, set()) for g in grams), key=len)
+
+    def search(
+        self,
+        query: str = "",
+        subject: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        tag: Optional[str] = None,
+        limit: int = 20,
+    ) -> list:
+        subject = subject.lower() if subject else None
+        tag = tag.lower() if tag else None
+
+        def wanted(doc: dict) -> bool:
+            if subject and (doc.get("subject") or "").lower() != subject:
+                return False
+            if difficulty and doc.get("difficulty") != difficulty:
+                return False
+            return not tag or tag in [t.lower() for t in doc.get("tags") or []]
+
+        with self._lock:
+            tokens = set(tokenize(query))
+            if not tokens:
+                # Newest first: _recency is re-inserted on every upsert, so its order is recency order
+                found = []
+                for qid in reversed(self._recency):
+                    if len(found) >= limit:
+                        break
+                    if wanted(self._docs[qid]):
+                        found.append(qid)
+                return [self._docs[qid] for qid in found]
+
+            # Every token must appear (whole or partial word). Start from the
+            # rarest posting and shrink the candidate set from there.
+            postings = sorted((p for t in tokens for p in self._postings(t)), key=len)
+            candidates = set(postings[0]) if postings else set()
+            for posting in postings[1:]:
+                if not candidates:
+                    return []
+                candidates &= posting
+
+            # Questions matching every term as a whole word rank first, then
+            # partial matches; newest first within each tier
+            whole = set(candidates)
+            for token in tokens:
+                whole &= self._words.get(token, set())
+            tiers = [whole, candidates - whole]
+
+            found = []
+            for tier in tiers:
+                if subject or difficulty or tag:
+                    tier = [qid for qid in tier if wanted(self._docs[qid])]
+                found.extend(heapq.nlargest(limit - len(found), tier, key=self._recency.__getitem__))
+                if len(found) >= limit:
+                    break
+            return [self._docs[qid] for qid in found]
+
+    def get(self, question_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._docs.get(question_id)
+
+    def __len__(self):
+        return len(self._docs)
+
+
+question_index = QuestionIndex()
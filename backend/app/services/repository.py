@@ -0,0 +1,335 @@
+"""
+Read Repository
+Hot read paths with two backends: PostgREST (default) and direct Postgres via asyncpg
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+
+from app.services.supabase import get_supabase_admin
+from app.services.cache import TTLCache
+from app.services.single_flight import SingleFlight
+from app.services.circuit_breaker import CircuitBreaker
+from app.middleware.stale import mark_stale
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "2"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+PAPER_CACHE_TTL = float(os.getenv("PAPER_CACHE_TTL", "30"))
+# Open-exam listings are identical for every student; keep them for a moment after each fetch
+OPEN_EXAMS_TTL = float(os.getenv("OPEN_EXAMS_TTL", "1"))
+# How long a last good read may be served while the upstream is failing
+STALE_MAX_AGE = float(os.getenv("STALE_MAX_AGE", "3600"))
+REVALIDATE_ATTEMPTS = 8
+REVALIDATE_MAX_DELAY = 15.0
+
+# Query families that can be routed to a backend, e.g.
+# READ_BACKENDS="exam_paper=postgres,student_results=postgres"
+QUERY_FAMILIES = ("exam_paper", "student_results", "dashboard_counts", "open_exams")
+OPEN_STATUSES = ["scheduled", "active"]
+
+
+def _jsonable(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _row(record) -> dict:
+    return {k: _jsonable(v) for k, v in dict(record).items()}
+
+
+def valid_uuid(value) -> bool:
+    """Ids come from URLs; a malformed one matches nothing rather than erroring."""
+    try:
+        UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+class PostgrestBackend:
+    """Runs the blocking supabase-py calls in a worker thread."""
+
+    name = "postgrest"
+
+    async def exam_paper(self, exam_id: str):
+        def query():
+            sb = get_supabase_admin()
+            exam = sb.table("exams").select("*").eq("id", exam_id).execute()
+            if not exam.data:
+                return None, []
+            questions = sb.table("questions").select("*").eq("exam_id", exam_id).order("order_num").execute()
+            return exam.data[0], questions.data or []
+        return await asyncio.to_thread(query)
+
+    async def student_results(self, student_id: str) -> list:
+        def query():
+            sb = get_supabase_admin()
+            # Embed the exam in the same round trip instead of one lookup per result
+            result = sb.table("results").select(
+                "*, exam:exams(title, subject, total_marks, scheduled_at)"
+            ).eq("student_id", student_id).eq("published", True).order("evaluated_at", desc=True).execute()
+            return result.data or []
+        return await asyncio.to_thread(query)
+
+    async def dashboard_counts(self, student_id: str) -> dict:
+        def query():
+            sb = get_supabase_admin()
+            subs = sb.table("submissions").select("exam_id").eq("student_id", student_id).execute()
+            sub_list = subs.data or []
+            return {
+                "total_submissions": len(sub_list),
+                "completed_exams": len({s["exam_id"] for s in sub_list}),
+            }
+        return await asyncio.to_thread(query)
+
+    async def open_exams(self) -> list:
+        def query():
+            sb = get_supabase_admin()
+            exams = sb.table("exams").select("*").in_("status", OPEN_STATUSES).order("scheduled_at").execute().data or []
+            teacher_ids = list({e["teacher_id"] for e in exams if e.get("teacher_id")})
+            names = {}
+            if teacher_ids:
+                teachers = sb.table("profiles").select("id, full_name").in_("id", teacher_ids).execute().data or []
+                names = {t["id"]: t["full_name"] for t in teachers}
+            for exam in exams:
+                exam["teacher_name"] = names.get(exam.get("teacher_id"))
+            return exams
+        return await asyncio.to_thread(query)
+
+
+class PostgresBackend:
+    """Direct asyncpg pool. asyncpg prepares and caches each statement per connection."""
+
+    name = "postgres"
+
+    EXAM_SQL = "SELECT * FROM exams WHERE id = $1"
+    QUESTIONS_SQL = "SELECT * FROM questions WHERE exam_id = $1 ORDER BY order_num"
+    RESULTS_SQL = """
+        SELECT r.*, json_build_object(
+            'title', e.title, 'subject', e.subject,
+            'total_marks', e.total_marks, 'scheduled_at', e.scheduled_at
+        ) AS exam
+        FROM results r JOIN exams e ON e.id = r.exam_id
+        WHERE r.student_id = $1 AND r.published
+        ORDER BY r.evaluated_at DESC
+    """
+    OPEN_EXAMS_SQL = """
+        SELECT e.*, p.full_name AS teacher_name
+        FROM exams e LEFT JOIN profiles p ON p.id = e.teacher_id
+        WHERE e.status = ANY($1::text[])
+        ORDER BY e.scheduled_at
+    """
+    COUNTS_SQL = """
+        SELECT count(*) AS total_submissions, count(DISTINCT exam_id) AS completed_exams
+        FROM submissions WHERE student_id = $1
+    """
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+
+    @staticmethod
+    async def _init_connection(conn):
+        for type_name in ("json", "jsonb"):
+            await conn.set_type_codec(type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def pool(self):
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    import asyncpg
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=PG_POOL_MIN,
+                        max_size=PG_POOL_MAX,
+                        init=self._init_connection,
+                    )
+        return self._pool
+
+    async def exam_paper(self, exam_id: str):
+        pool = await self.pool()
+        async with pool.acquire() as conn:
+            exam = await conn.fetchrow(self.EXAM_SQL, UUID(exam_id))
+            if not exam:
+                return None, []
+            questions = await conn.fetch(self.QUESTIONS_SQL, UUID(exam_id))
+        return _row(exam), [_row(q) for q in questions]
+
+    async def student_results(self, student_id: str) -> list:
+        pool = await self.pool()
+        rows = await pool.fetch(self.RESULTS_SQL, UUID(student_id))
+        return [_row(r) for r in rows]
+
+    async def dashboard_counts(self, student_id: str) -> dict:
+        pool = await self.pool()
+        row = await pool.fetchrow(self.COUNTS_SQL, UUID(student_id))
+        return _row(row)
+
+    async def open_exams(self) -> list:
+        pool = await self.pool()
+        rows = await pool.fetch(self.OPEN_EXAMS_SQL, OPEN_STATUSES)
+        return [_row(r) for r in rows]
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+def _postgres_available() -> bool:
+    if not DATABASE_URL:
+        return False
+    try:
+        import asyncpg  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _parse_backend_map(spec: str) -> dict:
+    mapping = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        family, _, backend = item.partition("=")
+        if family.strip() in QUERY_FAMILIES:
+            mapping[family.strip()] = backend.strip().lower()
+    return mapping
+
+
+class ReadRepository:
+    """
+    Routes each query family to its configured backend. Identical reads that
+    overlap in time are coalesced into one upstream call, so callers share
+    the returned objects and must not mutate them. When a read fails, the
+    last good value is served instead (stale-while-revalidate).
+    """
+
+    def __init__(self, backend_spec: str = ""):
+        self.postgrest = PostgrestBackend()
+        self.postgres = PostgresBackend(DATABASE_URL) if _postgres_available() else None
+        self.routes = {}
+        for family, backend in _parse_backend_map(backend_spec).items():
+            if backend == "postgres" and self.postgres is None:
+                print(f"READ_BACKENDS wants postgres for {family}, but DATABASE_URL/asyncpg is missing; using PostgREST")
+                continue
+            self.routes[family] = backend
+        self.flights = SingleFlight()
+        # PostgREST calls are guarded by the transport's breaker; asyncpg gets its own
+        self.postgres_breaker = CircuitBreaker("Postgres")
+        self.last_good = TTLCache(maxsize=10000, ttl=STALE_MAX_AGE)
+        self.stale_served = 0
+        self._refreshing = {}
+
+    def backend_for(self, family: str):
+        return self.postgres if self.routes.get(family) == "postgres" else self.postgrest
+
+    async def read(self, key: tuple, fetch, ttl: float = 0):
+        """
+        Coalesced read of key[0]'s family, falling back to the last good value
+        on failure. Also usable for reads outside the query families.
+        """
+        if self.backend_for(key[0]) is self.postgres:
+            call = lambda: self.postgres_breaker.call(fetch)  # noqa: E731
+        else:
+            call = fetch
+        try:
+            value = await self.flights.do(key, call, ttl=ttl)
+        except Exception:
+            stale = self.last_good.get(key)
+            if stale is None:
+                raise
+            self.stale_served += 1
+            mark_stale()
+            self._revalidate(key, call)
+            return stale
+        self.last_good.set(key, value)
+        return value
+
+    def _revalidate(self, key: tuple, call):
+        """Keep retrying a failed read in the background until it succeeds (once per key)."""
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                for attempt in range(REVALIDATE_ATTEMPTS):
+                    await asyncio.sleep(min(REVALIDATE_MAX_DELAY, 0.5 * 2 ** attempt))
+                    try:
+                        self.last_good.set(key, await self.flights.do(key, call))
+                        return
+                    except Exception:
+                        continue
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def exam_paper(self, exam_id: str):
+        """Exam row plus its questions (with answers) in order, or (None, [])."""
+        if not valid_uuid(exam_id):
+            return None, []
+        return await self.read(("exam_paper", exam_id), lambda: self.backend_for("exam_paper").exam_paper(exam_id))
+
+    async def student_results(self, student_id: str) -> list:
+        """Published results for a student, newest first, each with an embedded `exam`."""
+        return await self.read(("student_results", student_id), lambda: self.backend_for("student_results").student_results(student_id))
+
+    async def dashboard_counts(self, student_id: str) -> dict:
+        return await self.read(("dashboard_counts", student_id), lambda: self.backend_for("dashboard_counts").dashboard_counts(student_id))
+
+    async def open_exams(self) -> list:
+        """Scheduled and active exams by start time, each with `teacher_name`."""
+        return await self.read(("open_exams",), lambda: self.backend_for("open_exams").open_exams(), ttl=OPEN_EXAMS_TTL)
+
+    def stale_stats(self) -> dict:
+        return {
+            "stale_served": self.stale_served,
+            "revalidating": len(self._refreshing),
+            "last_good_entries": len(self.last_good),
+        }
+
+    async def close(self):
+        if self.postgres is not None:
+            await self.postgres.close()
+
+
+repository = ReadRepository(os.getenv("READ_BACKENDS", ""))
+
+# Sanitized exam papers (no correct answers, MCQ options parsed) shared by every student
+paper_cache = TTLCache(maxsize=256, ttl=PAPER_CACHE_TTL)
+
+
+def _sanitize_question(q: dict) -> dict:
+    q = {k: v for k, v in q.items() if k != "correct_answer"}
+    if isinstance(q.get("options"), str):
+        try:
+            q["options"] = json.loads(q["options"])
+        except ValueError:
+            pass
+    return q
+
+
+async def student_paper(exam_id: str):
+    """Cached (exam, sanitized questions) for students. Callers must not mutate the result."""
+    paper = paper_cache.get(exam_id)
+    if paper is None:
+        exam, questions = await repository.exam_paper(exam_id)
+        if not exam:
+            return None, []
+        paper = (exam, [_sanitize_question(q) for q in questions])
+        paper_cache.set(exam_id, paper)
+    return paper
+
+
+def invalidate_paper(exam_id: str):
+    paper_cache.delete(exam_id)
@@ -0,0 +1,25 @@
+"""
+Postgres RPC Helper
+Calls database functions and maps their PTxxx error codes to HTTP errors
+"""
+
+from fastapi import HTTPException
+from postgrest.exceptions import APIError
+
+from app.services.supabase import get_supabase_admin
+
+
+def call_rpc(function: str, params: dict):
+    """
+    Call a Postgres function in one round trip and return its data.
+    Functions signal client errors with SQLSTATE 'PT<status>' (e.g. PT404),
+    which is re-raised here as an HTTPException with the same status.
+    """
+    sb = get_supabase_admin()
+    try:
+        return sb.rpc(function, params).execute().data
+    except APIError as e:
+        code = str(e.code or "")
+        if code.startswith("PT") and code[2:].isdigit():
+            raise HTTPException(status_code=int(code[2:]), detail=e.message)
+        raise
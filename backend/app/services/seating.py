@@ -0,0 +1,264 @@
+"""
+Seating
+Seats every student of an exam slot across the halls so that neighbours sit different papers
+"""
+
+import csv
+import heapq
+import io
+from collections import defaultdict
+from datetime import timedelta
+
+from app.services.enrollment import exam_audience
+from app.services.exam_sessions import parse_timestamp
+from app.services.supabase import get_supabase_admin
+from app.services.timetable import MAX_DURATION_MINUTES
+
+PAGE_SIZE = 1000
+
+
+class SeatingError(ValueError):
+    pass
+
+
+def hall_seats(hall: dict) -> list:
+    """Usable (row, col) positions of a hall, row by row, 1-based."""
+    blocked = {tuple(seat) for seat in hall.get("blocked_seats") or []}
+    return [
+        (row, col)
+        for row in range(1, hall["rows"] + 1)
+        for col in range(1, hall["cols"] + 1)
+        if (row, col) not in blocked
+    ]
+
+
+def seat_group(student: dict) -> tuple:
+    """Students in the same group must not sit next to each other."""
+    return (student["subject"], student.get("department"))
+
+
+def allocate(students: list, halls: list) -> list:
+    """
+    Greedy interleaving. Seats are filled row by row; each seat takes the next
+    student of the largest remaining group that differs from the occupants to
+    its left and in front (which covers every side-by-side and front/back
+    pair). When only a clashing group is left and there are spare seats, the
+    seat is left empty instead. O(students × log groups).
+
+    `students` need id, subject, department; returns (hall_id, row, col, student).
+    """
+    groups = defaultdict(list)
+    for student in sorted(students, key=lambda s: s.get("reg_number") or "", reverse=True):
+        groups[seat_group(student)].append(student)
+    # Ties broken by insertion order, never by comparing group keys (which may hold None)
+    heap = [(-len(members), order, key) for order, (key, members) in enumerate(groups.items())]
+    heapq.heapify(heap)
+
+    capacity = sum(len(hall_seats(h)) for h in halls)
+    if capacity < len(students):
+        raise SeatingError(f"{len(students)} students but only {capacity} seats in the selected halls")
+    spare = capacity - len(students)
+
+    assignments = []
+    for hall in halls:
+        grid = {}
+        for row, col in hall_seats(hall):
+            if not heap:
+                break
+            avoid = (grid.get((row, col - 1)), grid.get((row - 1, col)))
+            skipped, pick = [], None
+            while heap:
+                entry = heapq.heappop(heap)
+                if entry[2] in avoid:
+                    skipped.append(entry)
+                else:
+                    pick = entry
+                    break
+            if pick is None:
+                if spare > 0:
+                    spare -= 1
+                    for entry in skipped:
+                        heapq.heappush(heap, entry)
+                    continue
+                pick = skipped.pop(0)  # largest clashing group: unavoidable
+            for entry in skipped:
+                heapq.heappush(heap, entry)
+
+            remaining, order, key = pick
+            student = groups[key].pop()
+            grid[(row, col)] = key
+            assignments.append((hall["id"], row, col, student))
+            if remaining + 1 < 0:
+                heapq.heappush(heap, (remaining + 1, order, key))
+    return assignments
+
+
+def quality(assignments: list) -> dict:
+    """
+    Share of occupied side-by-side and front/back seat pairs whose students are
+    in different groups, overall and per hall (100 = no two neighbours clash).
+    """
+    grids = defaultdict(dict)
+    for hall_id, row, col, student in assignments:
+        grids[hall_id][(row, col)] = seat_group(student)
+
+    halls, total_pairs, total_clashes = {}, 0, 0
+    for hall_id, grid in grids.items():
+        pairs = clashes = 0
+        for (row, col), key in grid.items():
+            for neighbour in ((row, col + 1), (row + 1, col)):
+                if neighbour in grid:
+                    pairs += 1
+                    clashes += grid[neighbour] == key
+        halls[hall_id] = {"seated": len(grid), "adjacent_pairs": pairs, "clashes": clashes}
+        total_pairs += pairs
+        total_clashes += clashes
+
+    return {
+        "score": round(100.0 * (1 - total_clashes / total_pairs), 2) if total_pairs else 100.0,
+        "seated": len(assignments),
+        "adjacent_pairs": total_pairs,
+        "clashes": total_clashes,
+        "halls": halls,
+    }
+
+
+def slot_students(exams: list) -> tuple:
+    """Students of every exam in the slot, one entry per student, plus those booked twice."""
+    seated, double_booked = {}, []
+    for exam in exams:
+        for profile in exam_audience(exam, "id, full_name, reg_number, department"):
+            if profile["id"] in seated:
+                double_booked.append(profile["id"])
+                continue
+            seated[profile["id"]] = {**profile, "exam_id": exam["id"], "subject": exam["subject"]}
+    return list(seated.values()), double_booked
+
+
+def slot_exams(at: str) -> tuple:
+    """
+    Scheduled/active exams running at `at`, plus every exam overlapping those
+    in time (transitively), with the (start, end) they span together. Their
+    students are in the halls at the same time, so they share one plan even
+    when the exams start at different times.
+    """
+    sb = get_supabase_admin()
+    at = parse_timestamp(at)
+    exams, lo, hi = {}, at, at
+    while True:
+        candidates = sb.table("exams").select(
+            "id, subject, department, course_id, scheduled_at, duration_minutes"
+        ).in_("status", ["scheduled", "active"]).gte(
+            "scheduled_at", (lo - timedelta(minutes=MAX_DURATION_MINUTES)).isoformat()
+        ).lte("scheduled_at", hi.isoformat()).execute().data or []
+
+        for exam in candidates:
+            start = parse_timestamp(exam["scheduled_at"])
+            end = start + timedelta(minutes=exam["duration_minutes"])
+            # Running at `at` to seed the slot, then anything overlapping the span so far
+            if (start <= at < end) if not exams else (start < hi and end > lo):
+                exams[exam["id"]] = exam
+        if not exams:
+            return [], None, None
+
+        starts = [parse_timestamp(e["scheduled_at"]) for e in exams.values()]
+        ends = [s + timedelta(minutes=e["duration_minutes"]) for s, e in zip(starts, exams.values())]
+        if (min(starts), max(ends)) == (lo, hi):
+            return list(exams.values()), lo, hi
+        lo, hi = min(starts), max(ends)
+
+
+def generate_plan(slot_start: str, hall_ids: list, created_by: str) -> dict:
+    """
+    Allocate and store the seating plan of the exams running at `slot_start`
+    (see slot_exams), replacing every earlier plan it overlaps.
+    """
+    sb = get_supabase_admin()
+    exams, start, end = slot_exams(slot_start)
+    if not exams:
+        raise SeatingError("No scheduled exams are running at this time")
+
+    query = sb.table("exam_halls").select("*")
+    if hall_ids:
+        query = query.in_("id", hall_ids)
+    halls = query.execute().data or []
+    if hall_ids:
+        order = {hid: i for i, hid in enumerate(hall_ids)}
+        halls.sort(key=lambda h: order[h["id"]])
+    else:
+        halls.sort(key=lambda h: h["name"])
+    if not halls:
+        raise SeatingError("No exam halls configured")
+
+    students, double_booked = slot_students(exams)
+    assignments = allocate(students, halls)
+    score = quality(assignments)
+
+    # Old plans are deleted and the new one written in one transaction (see replace_seating_plan)
+    plan = sb.rpc("replace_seating_plan", {
+        "p_slot_start": start.isoformat(),
+        "p_slot_end": end.isoformat(),
+        "p_exam_ids": [e["id"] for e in exams],
+        "p_hall_ids": [h["id"] for h in halls],
+        "p_quality": score,
+        "p_created_by": created_by,
+        "p_seats": [
+            {"hall_id": hall_id, "seat_row": row, "seat_col": col,
+             "student_id": student["id"], "exam_id": student["exam_id"]}
+            for hall_id, row, col, student in assignments
+        ],
+    }).execute().data
+
+    return {**plan, "double_booked": double_booked}
+
+
+def hall_chart(plan_id: str, hall_id: str) -> dict:
+    """Seat grid of one hall in a plan: None for empty seats, "blocked" for unusable ones."""
+    sb = get_supabase_admin()
+    hall = sb.table("exam_halls").select("*").eq("id", hall_id).execute()
+    if not hall.data:
+        return None
+    hall = hall.data[0]
+
+    seats, offset = [], 0
+    while True:
+        page = sb.table("seat_assignments").select(
+            "seat_row, seat_col, student_id, exam_id, student:profiles(full_name, reg_number, department), exam:exams(title, subject)"
+        ).eq("plan_id", plan_id).eq("hall_id", hall_id).order("seat_row").order("seat_col").range(offset, offset + PAGE_SIZE - 1).execute().data or []
+        seats.extend(page)
+        offset += len(page)
+        if len(page) < PAGE_SIZE:
+            break
+
+    grid = [[None] * hall["cols"] for _ in range(hall["rows"])]
+    for row, col in hall.get("blocked_seats") or []:
+        grid[row - 1][col - 1] = "blocked"
+    for seat in seats:
+        student, exam = seat.get("student") or {}, seat.get("exam") or {}
+        grid[seat["seat_row"] - 1][seat["seat_col"] - 1] = {
+            "student_id": seat["student_id"],
+            "reg_number": student.get("reg_number"),
+            "full_name": student.get("full_name"),
+            "department": student.get("department"),
+            "exam_id": seat["exam_id"],
+            "subject": exam.get("subject"),
+        }
+    return {"hall": hall, "seated": len(seats), "grid": grid}
+
+
+def chart_csv(chart: dict) -> str:
+    """Printable chart: one CSV row per hall row, "REG (Subject)" per seat."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow([chart["hall"]["name"]] + [f"Seat {c}" for c in range(1, chart["hall"]["cols"] + 1)])
+    for index, row in enumerate(chart["grid"], start=1):
+        cells = []
+        for seat in row:
+            if seat == "blocked":
+                cells.append("X")
+            elif seat:
+                cells.append(f"{seat['reg_number'] or seat['full_name']} ({seat['subject']})")
+            else:
+                cells.append("")
+        writer.writerow([f"Row {index}"] + cells)
+    return out.getvalue()
@@ -0,0 +1,88 @@
+"""
+Per-Student Paper Shuffling
+Deterministic question and MCQ option order derived from (exam id, student id)
+"""
+
+import hashlib
+import itertools
+
+# All orderings of small option lists, so an MCQ costs one table lookup instead of a shuffle
+_SMALL_PERMUTATIONS = {k: list(itertools.permutations(range(k))) for k in range(1, 7)}
+
+
+def _entropy(exam_id: str, student_id: str, bits: int) -> int:
+    """At least `bits` of deterministic pseudo-random bits for this (exam, student)."""
+    key = f"{exam_id}:{student_id}".encode()
+    blocks = [
+        hashlib.blake2b(key, digest_size=64, salt=i.to_bytes(16, "big")).digest()
+        for i in range(bits // 500 + 1)
+    ]
+    return int.from_bytes(b"".join(blocks), "big")
+
+
+def _shuffle(items: list, state: int):
+    """Fisher–Yates driven by a big integer (factorial number system), in place."""
+    for i in range(len(items) - 1, 0, -1):
+        state, j = divmod(state, i + 1)
+        items[i], items[j] = items[j], items[i]
+    return state
+
+
+def permutation(exam_id: str, student_id: str, questions: list) -> tuple:
+    """
+    (question order, {question_id: option order}) for one student. The same
+    inputs always give the same permutation, so nothing is stored per student.
+    """
+    option_counts = [
+        (q["id"], len(q["options"]))
+        for q in questions
+        if q.get("question_type") == "mcq" and q.get("options")
+    ]
+    # log2(n!) <= n * log2(n); a generous upper bound keeps this cheap to compute
+    bits = sum(n * n.bit_length() for n in [len(questions)] + [c for _, c in option_counts])
+    state = _entropy(exam_id, student_id, bits)
+
+    order = list(range(len(questions)))
+    state = _shuffle(order, state)
+    option_orders = {}
+    for question_id, count in option_counts:
+        table = _SMALL_PERMUTATIONS.get(count)
+        if table:
+            state, pick = divmod(state, len(table))
+            option_orders[question_id] = table[pick]
+        else:
+            opt_order = list(range(count))
+            state = _shuffle(opt_order, state)
+            option_orders[question_id] = opt_order
+    return order, option_orders
+
+
+def shuffled_questions(exam_id: str, student_id: str, questions: list) -> list:
+    """Copy of the (sanitized, options already parsed) questions in this student's order."""
+    order, option_orders = permutation(exam_id, student_id, questions)
+    shuffled = []
+    for position, index in enumerate(order, start=1):
+        q = dict(questions[index])
+        opt_order = option_orders.get(q["id"])
+        if opt_order:
+            q["options"] = [q["options"][i] for i in opt_order]
+        q["display_order"] = position
+        shuffled.append(q)
+    return shuffled
+
+
+def canonical_answers(exam_id: str, student_id: str, questions: list, answers: dict) -> dict:
+    """
+    Map a student's answers back to canonical form. Answers are keyed by question
+    id already; MCQ answers sent as a displayed option index become the option text.
+    """
+    _, option_orders = permutation(exam_id, student_id, questions)
+    by_id = {q["id"]: q for q in questions}
+    canonical = {}
+    for question_id, value in answers.items():
+        q = by_id.get(question_id)
+        opt_order = option_orders.get(question_id)
+        if q and opt_order and isinstance(value, int) and not isinstance(value, bool) and 0 <= value < len(opt_order):
+            value = q["options"][opt_order[value]]
+        canonical[question_id] = value
+    return canonical
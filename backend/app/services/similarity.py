@@ -0,0 +1,149 @@
+"""
+Answer Similarity Engine
+MinHash signatures + LSH banding to find near-duplicate text answers without comparing every pair
+"""
+
+import re
+import zlib
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+
+from app.services.supabase import get_supabase_admin
+
+NUM_PERM = 128
+BANDS, ROWS = 32, 4  # BANDS * ROWS == NUM_PERM; candidate threshold ≈ (1/BANDS)^(1/ROWS) ≈ 0.42
+SHINGLE_SIZE = 5  # characters
+MIN_SHINGLES = 10  # very short answers are too likely to match by chance
+PAGE_SIZE = 1000
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+# Fixed seed: signatures stay comparable across runs and instances
+_A = _rng.randint(1, 1 << 61, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 61, size=NUM_PERM, dtype=np.uint64)
+
+_SPACE_RE = re.compile(r"\s+")
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def shingles(text: str) -> set:
+    """Hashed character shingles of normalized text."""
+    normalized = _SPACE_RE.sub(" ", _PUNCT_RE.sub("", (text or "").lower())).strip()
+    return {
+        zlib.crc32(normalized[i:i + SHINGLE_SIZE].encode())
+        for i in range(max(0, len(normalized) - SHINGLE_SIZE + 1))
+    }
+
+
+def minhash(shingle_set: set) -> np.ndarray:
+    """NUM_PERM-value MinHash signature, computed for all permutations at once."""
+    hashes = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+    permuted = ((_A[:, None] * hashes[None, :] + _B[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=1)
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def candidate_pairs(signatures: dict) -> set:
+    """Keys whose signatures collide in at least one LSH band."""
+    buckets = defaultdict(list)
+    for key, sig in signatures.items():
+        for band in range(BANDS):
+            buckets[(band, sig[band * ROWS:(band + 1) * ROWS].tobytes())].append(key)
+
+    pairs = set()
+    for members in buckets.values():
+        if len(members) > 1:
+            pairs.update(combinations(sorted(members), 2))
+    return pairs
+
+
+def _paged(query_for_range) -> list:
+    rows, offset = [], 0
+    while True:
+        page = query_for_range(offset, offset + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        offset += len(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+def _load_signatures(exam_id: str) -> dict:
+    sb = get_supabase_admin()
+    rows = _paged(lambda lo, hi: sb.table("answer_signatures").select("submission_id, question_id, signature").eq("exam_id", exam_id).order("submission_id").order("question_id").range(lo, hi))
+    return {(r["submission_id"], r["question_id"]): np.array(r["signature"], dtype=np.uint64) for r in rows}
+
+
+def similarity_report(exam_id: str, threshold: float = 0.7) -> dict:
+    """
+    Flag pairs of submissions whose answers to the same text question have
+    Jaccard similarity >= threshold. Signatures are cached in answer_signatures,
+    so a re-run only computes them for new submissions.
+    """
+    sb = get_supabase_admin()
+    questions = sb.table("questions").select("id").eq("exam_id", exam_id).eq("question_type", "text").execute().data or []
+    text_question_ids = {q["id"] for q in questions}
+    submissions = _paged(lambda lo, hi: sb.table("submissions").select("id, student_id, answers").eq("exam_id", exam_id).order("id").range(lo, hi))
+
+    cached = _load_signatures(exam_id)
+    shingle_sets, new_rows = {}, []
+    by_question = defaultdict(dict)
+
+    for sub in submissions:
+        answers = sub.get("answers") if isinstance(sub.get("answers"), dict) else {}
+        for question_id, answer in answers.items():
+            if question_id not in text_question_ids or not isinstance(answer, str):
+                continue
+            key = (sub["id"], question_id)
+            shingle_set = shingles(answer)
+            if len(shingle_set) < MIN_SHINGLES:
+                continue
+            shingle_sets[key] = shingle_set
+
+            signature = cached.get(key)
+            if signature is None:
+                signature = minhash(shingle_set)
+                new_rows.append({
+                    "exam_id": exam_id,
+                    "submission_id": sub["id"],
+                    "question_id": question_id,
+                    "signature": signature.astype(np.int64).tolist(),
+                })
+            by_question[question_id][sub["id"]] = signature
+
+    if new_rows:
+        for i in range(0, len(new_rows), 500):
+            sb.table("answer_signatures").upsert(new_rows[i:i + 500], on_conflict="submission_id,question_id").execute()
+
+    students = {s["id"]: s["student_id"] for s in submissions}
+    flagged, candidates_checked = [], 0
+    for question_id, signatures in by_question.items():
+        for sub_a, sub_b in candidate_pairs(signatures):
+            candidates_checked += 1
+            score = jaccard(shingle_sets[(sub_a, question_id)], shingle_sets[(sub_b, question_id)])
+            if score >= threshold:
+                flagged.append({
+                    "question_id": question_id,
+                    "submission_a": sub_a,
+                    "submission_b": sub_b,
+                    "student_a": students[sub_a],
+                    "student_b": students[sub_b],
+                    "similarity": round(score, 3),
+                })
+
+    flagged.sort(key=lambda f: f["similarity"], reverse=True)
+    return {
+        "exam_id": exam_id,
+        "threshold": threshold,
+        "answers_compared": len(shingle_sets),
+        "signatures_computed": len(new_rows),
+        "candidate_pairs": candidates_checked,
+        "flagged_pairs": flagged,
+    }
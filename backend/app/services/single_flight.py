@@ -0,0 +1,64 @@
+"""
+Request Coalescing
+Identical reads that are in flight at the same time share one upstream call
+"""
+
+import asyncio
+
+from app.services.cache import TTLCache
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """
+    The first caller for a key starts the upstream call; callers arriving while it
+    runs await the same task instead of issuing their own. A result may also be
+    kept for a very short TTL so bursts just after completion are absorbed too.
+    Errors are shared with the waiters but never cached.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self._in_flight = {}
+        self._results = TTLCache(maxsize=maxsize, ttl=0)
+        self.calls = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+
+    async def do(self, key, fn, ttl: float = 0):
+        """Result of `await fn()`, shared with every concurrent caller using the same key."""
+        self.calls += 1
+        if ttl:
+            value = self._results.get(key, _MISSING)
+            if value is not _MISSING:
+                self.cache_hits += 1
+                return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+
+            def done(t, key=key):
+                if self._in_flight.get(key) is t:
+                    del self._in_flight[key]
+                if ttl and not t.cancelled() and t.exception() is None:
+                    self._results.set(key, t.result(), ttl=ttl)
+            task.add_done_callback(done)
+
+        # A cancelled caller must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "in_flight": len(self._in_flight),
+            "coalescing_ratio": round(1 - self.upstream_calls / self.calls, 4) if self.calls else 0.0,
+        }
@@ -3,8 +3,9 @@ Supabase Client Configuration
 """
 
 import os
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
+from app.services.transport import build_http_client, READ_TIMEOUT
 
 load_dotenv()
 
@@ -15,11 +16,23 @@ SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env")
 
+
+
+def _client_options() -> ClientOptions:
+    """Each client keeps its own headers but shares the pooled upstream transport."""
+    return ClientOptions(
+        httpx_client=build_http_client(),
+        postgrest_client_timeout=READ_TIMEOUT,
+        storage_client_timeout=int(READ_TIMEOUT),
+        function_client_timeout=int(READ_TIMEOUT),
+    )
+
+
 # Regular client (uses anon key, respects RLS)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY, options=_client_options())
 
 # Admin client (uses service role key, bypasses RLS)
-supabase_admin: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY) if SUPABASE_SERVICE_KEY else None
+supabase_admin: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY, options=_client_options()) if SUPABASE_SERVICE_KEY else None
 
 
 def get_supabase() -> Client:
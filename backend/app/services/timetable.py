@@ -0,0 +1,328 @@
+"""
+Exam Timetable
+Interval index of upcoming exams by audience, for clash checks and whole-timetable validation
+"""
+
+import bisect
+import heapq
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from app.services.supabase import get_supabase_admin
+from app.services.exam_sessions import parse_timestamp
+from app.services.leases import try_acquire_lease, release_lease
+
+TIMETABLE_STATUSES = ("scheduled", "active")  # drafts never block (or are blocked by) other exams
+TIMETABLE_REFRESH = float(os.getenv("TIMETABLE_REFRESH", "300"))
+MAX_DURATION_MINUTES = 480
+CHUNK_SIZE = 200
+PAGE_SIZE = 1000
+EXAM_COLUMNS = "id, title, subject, department, course_id, scheduled_at, duration_minutes, status"
+
+# Clash check + exam write run under this lease, so two instances can't both pass the check
+WRITE_LEASE_NAME = "timetable-writes"
+WRITE_LEASE_TTL_SECONDS = 15
+WRITE_WAIT_SECONDS = float(os.getenv("TIMETABLE_WRITE_WAIT", "5"))
+
+EVERYONE = ("department", None)  # department-less exams are open to every student
+
+
+class TimetableBusy(Exception):
+    """Another exam write held the timetable for longer than WRITE_WAIT_SECONDS."""
+
+
+def _paged_exams(query_for_range) -> list:
+    exams, offset = [], 0
+    while True:
+        page = query_for_range(offset, offset + PAGE_SIZE - 1).execute().data or []
+        exams.extend(page)
+        offset += len(page)
+        if len(page) < PAGE_SIZE:
+            return exams
+
+
+def exam_interval(exam: dict) -> tuple:
+    """(start, end) epoch seconds of an exam."""
+    start = parse_timestamp(exam["scheduled_at"]).timestamp()
+    return start, start + exam["duration_minutes"] * 60
+
+
+class _Bucket:
+    """Intervals sorted by start. Overlap queries only scan starts within the longest duration."""
+
+    def __init__(self):
+        self.starts = []
+        self.entries = []
+        self.longest = 0.0
+
+    def add(self, entry: dict):
+        i = bisect.bisect_right(self.starts, entry["start"])
+        self.starts.insert(i, entry["start"])
+        self.entries.insert(i, entry)
+        self.longest = max(self.longest, entry["end"] - entry["start"])
+
+    def remove(self, entry: dict):
+        i = bisect.bisect_left(self.starts, entry["start"])
+        while i < len(self.entries) and self.entries[i] is not entry:
+            i += 1
+        if i < len(self.entries):
+            del self.starts[i]
+            del self.entries[i]
+
+    def overlapping(self, start: float, end: float) -> list:
+        lo = bisect.bisect_right(self.starts, start - self.longest)
+        hi = bisect.bisect_left(self.starts, end)
+        return [e for e in self.entries[lo:hi] if e["end"] > start]
+
+
+class ExamTimetable:
+    """
+    Every scheduled/active exam is filed under the audiences it reaches:
+    ("department", d) for department-wide exams, and ("course", c) plus
+    ("department", d) for each department with students in course c. Two
+    exams that overlap in time under a shared key clash, except two different
+    courses, which only clash when they actually share a student.
+
+    Built from the database every TIMETABLE_REFRESH seconds. A clash check
+    first re-reads the exams around the checked time and the enrollments of
+    their courses, so writes from other instances always count; writers hold
+    writing() from check to write. All methods hit the database: call them
+    from worker threads.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._entries = {}
+        self._course_students = {}  # course_id -> {student_id: department}
+        self._built_at = 0.0
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+
+    # ── loading ──
+
+    def _load_courses(self, course_ids, refresh: bool = False):
+        sb = get_supabase_admin()
+        missing = [c for c in dict.fromkeys(course_ids) if c and (refresh or c not in self._course_students)]
+        for course_id in missing:
+            self._course_students[course_id] = {}
+        for i in range(0, len(missing), CHUNK_SIZE):
+            offset = 0
+            while True:
+                page = sb.table("course_enrollments").select(
+                    "course_id, student_id, student:profiles(department)"
+                ).in_("course_id", missing[i:i + CHUNK_SIZE]).order("course_id").order("student_id").range(offset, offset + PAGE_SIZE - 1).execute().data or []
+                for row in page:
+                    self._course_students[row["course_id"]][row["student_id"]] = (row.get("student") or {}).get("department")
+                offset += len(page)
+                if len(page) < PAGE_SIZE:
+                    break
+
+    def _ensure_built(self, force: bool = False):
+        if not force and time.monotonic() - self._built_at < TIMETABLE_REFRESH:
+            return
+        sb = get_supabase_admin()
+        since = (datetime.now(timezone.utc) - timedelta(minutes=MAX_DURATION_MINUTES)).isoformat()
+        exams = _paged_exams(lambda lo, hi: sb.table("exams").select(EXAM_COLUMNS).in_(
+            "status", list(TIMETABLE_STATUSES)
+        ).gte("scheduled_at", since).order("id").range(lo, hi))
+        with self._lock:
+            self._buckets, self._entries, self._course_students = {}, {}, {}
+            self._load_courses([e.get("course_id") for e in exams])
+            for exam in exams:
+                self._add(self._entry(exam))
+            self._built_at = time.monotonic()
+
+    def _sync_window(self, start: float, end: float, course_id=None):
+        """
+        Re-read every exam that could overlap [start, end) and the students of
+        their courses (and of `course_id`), picking up other instances' writes.
+        """
+        sb = get_supabase_admin()
+        lo = start - MAX_DURATION_MINUTES * 60
+        exams = _paged_exams(lambda a, b: sb.table("exams").select(EXAM_COLUMNS).in_(
+            "status", list(TIMETABLE_STATUSES)
+        ).gte("scheduled_at", datetime.fromtimestamp(lo, timezone.utc).isoformat()).lt(
+            "scheduled_at", datetime.fromtimestamp(end, timezone.utc).isoformat()
+        ).order("id").range(a, b))
+        with self._lock:
+            self._load_courses([course_id] + [e.get("course_id") for e in exams], refresh=True)
+            fresh = {e["id"] for e in exams}
+            for entry in list(self._entries.values()):
+                if lo <= entry["start"] < end and entry["id"] not in fresh:
+                    self.remove(entry["id"])
+            for exam in exams:
+                self.upsert(exam)
+
+    @contextmanager
+    def writing(self):
+        """
+        Hold while checking clashes and writing the exam: one writer per
+        process, and one process at a time through a short database lease.
+        """
+        with self._write_lock:
+            deadline = time.monotonic() + WRITE_WAIT_SECONDS
+            while not try_acquire_lease(WRITE_LEASE_NAME, WRITE_LEASE_TTL_SECONDS):
+                if time.monotonic() > deadline:
+                    raise TimetableBusy()
+                time.sleep(0.1)
+            try:
+                yield
+            finally:
+                release_lease(WRITE_LEASE_NAME)
+
+    # ── entries ──
+
+    def _entry(self, exam: dict) -> dict:
+        start, end = exam_interval(exam)
+        course_id = exam.get("course_id")
+        if course_id:
+            self._load_courses([course_id])
+            departments = set(self._course_students[course_id].values())
+            keys = [("course", course_id)] + [("department", d) for d in departments]
+        else:
+            departments = set()
+            keys = [("department", exam.get("department"))]
+        return {
+            "id": exam.get("id"),
+            "title": exam.get("title"),
+            "scheduled_at": exam["scheduled_at"],
+            "duration_minutes": exam["duration_minutes"],
+            "course_id": course_id,
+            "department": exam.get("department"),
+            "start": start,
+            "end": end,
+            "keys": keys,
+            "departments": departments,  # of a course's students
+        }
+
+    def _add(self, entry: dict):
+        self._entries[entry["id"]] = entry
+        for key in entry["keys"]:
+            self._buckets.setdefault(key, _Bucket()).add(entry)
+
+    def _search_keys(self, entry: dict) -> list:
+        if not entry["course_id"] and entry["department"] is None:
+            return list(self._buckets)
+        return entry["keys"] + ([EVERYONE] if EVERYONE not in entry["keys"] else [])
+
+    def _shared_audience(self, a: dict, b: dict):
+        """Why two time-overlapping exams under a shared key clash, or None if they don't."""
+        if a["course_id"] and b["course_id"]:
+            if a["course_id"] == b["course_id"]:
+                return "same course"
+            students_a, students_b = self._course_students[a["course_id"]], self._course_students[b["course_id"]]
+            if len(students_a) > len(students_b):
+                students_a, students_b = students_b, students_a
+            shared = sum(1 for s in students_a if s in students_b)
+            return f"{shared} shared students" if shared else None
+        if not a["course_id"] and not b["course_id"]:
+            if a["department"] is None or b["department"] is None:
+                return "open to all students"
+            return f"department {a['department']}"
+        course, department = (a, b) if a["course_id"] else (b, a)
+        if department["department"] is None:
+            return "open to all students"
+        if department["department"] in course["departments"]:
+            return f"course students from department {department['department']}"
+        return None
+
+    @staticmethod
+    def _clash(a: dict, b: dict, reason: str) -> dict:
+        overlap = min(a["end"], b["end"]) - max(a["start"], b["start"])
+        return {
+            "exam": {k: a[k] for k in ("id", "title", "scheduled_at", "duration_minutes")},
+            "clashes_with": {k: b[k] for k in ("id", "title", "scheduled_at", "duration_minutes")},
+            "overlap_minutes": round(overlap / 60),
+            "reason": reason,
+        }
+
+    # ── public API ──
+
+    def clashes(self, exam: dict) -> list:
+        """Exams overlapping `exam` (a full or partial exam row) for some of the same students."""
+        self._ensure_built()
+        start, end = exam_interval(exam)
+        self._sync_window(start, end, exam.get("course_id"))
+        with self._lock:
+            entry = self._entry(exam)
+            found = {}
+            for key in self._search_keys(entry):
+                bucket = self._buckets.get(key)
+                if not bucket:
+                    continue
+                for other in bucket.overlapping(entry["start"], entry["end"]):
+                    if other["id"] == entry["id"] or other["id"] in found:
+                        continue
+                    reason = self._shared_audience(entry, other)
+                    if reason:
+                        found[other["id"]] = self._clash(entry, other, reason)
+            return sorted(found.values(), key=lambda c: c["clashes_with"]["scheduled_at"])
+
+    def upsert(self, exam: dict):
+        """Re-file an exam after it was created or changed here."""
+        with self._lock:
+            self.remove(exam["id"])
+            if exam.get("status") in TIMETABLE_STATUSES:
+                self._add(self._entry(exam))
+
+    def remove(self, exam_id: str):
+        with self._lock:
+            entry = self._entries.pop(exam_id, None)
+            if entry:
+                for key in entry["keys"]:
+                    self._buckets[key].remove(entry)
+
+    def invalidate(self):
+        """Rebuild on next use (e.g. after enrollments changed)."""
+        self._built_at = 0.0
+
+    def validate(self, proposed=()) -> list:
+        """
+        Every clash in the timetable, with `proposed` exams replacing (same id)
+        or joining the stored ones. One sweep per audience key: sort by start,
+        keep a min-heap of running exams' ends, pair each start with whatever
+        is still running. O(n log n) plus the clashes reported. Rebuilt
+        first, so every instance's exams are included.
+        """
+        self._ensure_built(force=True)
+        with self._lock:
+            entries = dict(self._entries)
+            for i, exam in enumerate(proposed):
+                entry = self._entry(exam)
+                entry["id"] = entry["id"] or f"proposed-{i + 1}"
+                entries[entry["id"]] = entry
+
+            buckets = {}
+            everyone = []
+            for entry in entries.values():
+                for key in entry["keys"]:
+                    buckets.setdefault(key, []).append(entry)
+                if entry["keys"] == [EVERYONE]:
+                    everyone.append(entry)
+            for key, members in buckets.items():
+                if key[0] == "department" and key != EVERYONE:
+                    members.extend(everyone)
+
+            found = {}
+            for members in buckets.values():
+                members.sort(key=lambda e: e["start"])
+                running = []
+                for entry in members:
+                    while running and running[0][0] <= entry["start"]:
+                        heapq.heappop(running)
+                    for _, _, other in running:
+                        pair = tuple(sorted((entry["id"], other["id"])))
+                        if pair[0] == pair[1] or pair in found:
+                            continue
+                        reason = self._shared_audience(other, entry)
+                        if reason:
+                            found[pair] = self._clash(other, entry, reason)
+                    heapq.heappush(running, (entry["end"], id(entry), entry))
+
+            return sorted(found.values(), key=lambda c: c["exam"]["scheduled_at"])
+
+
+exam_timetable = ExamTimetable()
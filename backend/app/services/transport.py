@@ -0,0 +1,215 @@
+"""
+Upstream HTTP Transport
+Shared connection pool, timeouts, retry budget and hedged reads for Supabase calls
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import httpx
+
+from app.services.circuit_breaker import CircuitBreaker
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+RETRYABLE_STATUS = (502, 503, 504)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+MAX_CONNECTIONS = _env_int("UPSTREAM_MAX_CONNECTIONS", 100)
+MAX_KEEPALIVE = _env_int("UPSTREAM_MAX_KEEPALIVE", 20)
+KEEPALIVE_EXPIRY = _env_float("UPSTREAM_KEEPALIVE_EXPIRY", 30.0)
+HTTP2 = os.getenv("UPSTREAM_HTTP2", "true").lower() == "true"
+CONNECT_TIMEOUT = _env_float("UPSTREAM_CONNECT_TIMEOUT", 3.0)
+READ_TIMEOUT = _env_float("UPSTREAM_READ_TIMEOUT", 10.0)
+POOL_TIMEOUT = _env_float("UPSTREAM_POOL_TIMEOUT", 5.0)
+RETRY_ATTEMPTS = _env_int("UPSTREAM_RETRY_ATTEMPTS", 2)
+RETRY_BASE_DELAY = _env_float("UPSTREAM_RETRY_BASE_DELAY", 0.05)
+RETRY_MAX_DELAY = _env_float("UPSTREAM_RETRY_MAX_DELAY", 1.0)
+RETRY_BUDGET_RATIO = _env_float("UPSTREAM_RETRY_BUDGET_RATIO", 0.1)
+HEDGE_AFTER_MS = _env_float("UPSTREAM_HEDGE_AFTER_MS", 0)  # 0 disables hedged reads
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class RetryBudget:
+    """
+    Token bucket that caps retries at a fraction of normal traffic, so a
+    struggling upstream doesn't get hit with a retry storm.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class UpstreamTransport(httpx.BaseTransport):
+    """
+    Wraps httpx's pooled transport with retry-with-jitter and optional hedging
+    for idempotent requests. Writes are sent exactly once. A circuit breaker
+    rejects requests up front while Supabase keeps failing.
+    """
+
+    def __init__(self):
+        http2 = HTTP2 and _http2_available()
+        if HTTP2 and not http2:
+            print("UPSTREAM_HTTP2 is set but the 'h2' package is missing; using HTTP/1.1")
+
+        self.limits = httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        self.http2 = http2
+        self._transport = httpx.HTTPTransport(http2=http2, limits=self.limits)
+        self._budget = RetryBudget(RETRY_BUDGET_RATIO)
+        self.breaker = CircuitBreaker("Supabase")
+        self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge") if HEDGE_AFTER_MS > 0 else None
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "errors": 0,
+        }
+        self._in_flight = 0
+        self._peak_in_flight = 0
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _send(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            response = self._transport.handle_request(request)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        if response.status_code in RETRYABLE_STATUS:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _send_hedged(self, request: httpx.Request) -> httpx.Response:
+        """Fire a second copy of a slow read and keep whichever answers first."""
+        first = self._hedge_pool.submit(self._send, request)
+        done, _ = wait([first], timeout=HEDGE_AFTER_MS / 1000)
+        if done:
+            return first.result()
+
+        self._count("hedges")
+        second = self._hedge_pool.submit(self._send, request)
+        done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = first if first in done and not first.exception() else second
+        loser = second if winner is first else first
+        if winner is second:
+            self._count("hedge_wins")
+        loser.add_done_callback(lambda f: f.exception() is None and f.result().close())
+        return winner.result()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._count("requests")
+        self.breaker.check()
+        self._budget.deposit()
+
+        if request.method not in IDEMPOTENT_METHODS:
+            return self._send(request)
+
+        send = self._send_hedged if self._hedge_pool else self._send
+        attempt = 0
+        while True:
+            error = None
+            try:
+                response = send(request)
+                if response.status_code not in RETRYABLE_STATUS or attempt >= RETRY_ATTEMPTS:
+                    return response
+            except httpx.TransportError as e:
+                self._count("errors")
+                if attempt >= RETRY_ATTEMPTS:
+                    raise
+                response, error = None, e
+
+            if not self._budget.withdraw():
+                # Out of retry budget: surface the failure we already have
+                self._count("retries_denied")
+                if error is not None:
+                    raise error
+                return response
+
+            if response is not None:
+                response.close()
+            attempt += 1
+            self._count("retries")
+            # Full jitter backoff
+            time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))))
+
+    def close(self):
+        self._transport.close()
+        if self._hedge_pool:
+            self._hedge_pool.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        """Pool utilization and retry/hedge counters."""
+        connections = list(getattr(getattr(self._transport, "_pool", None), "connections", []))
+        idle = sum(1 for c in connections if c.is_idle())
+        with self._lock:
+            return {
+                "http2": self.http2,
+                "max_connections": MAX_CONNECTIONS,
+                "max_keepalive_connections": MAX_KEEPALIVE,
+                "open_connections": len(connections),
+                "idle_connections": idle,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "utilization": round(self._in_flight / MAX_CONNECTIONS, 3),
+                **self._counters,
+            }
+
+
+# One pool shared by every Supabase client in the process
+upstream_transport = UpstreamTransport()
+
+
+def build_http_client() -> httpx.Client:
+    """A client with its own headers but the shared pooled transport."""
+    return httpx.Client(
+        transport=upstream_transport,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT),
+    )
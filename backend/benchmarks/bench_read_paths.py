@@ -0,0 +1,55 @@
+"""
+Benchmark: PostgREST vs direct Postgres for the hot read paths
+
+Usage (from backend/):
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_read_paths <exam_id> <student_id> [iterations]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from app.services.repository import PostgrestBackend, PostgresBackend, DATABASE_URL
+
+
+async def timed(fn, *args, iterations: int) -> list:
+    await fn(*args)  # warm-up (connections, statement cache)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summary(samples: list) -> str:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    return f"p50={statistics.median(samples):7.2f}ms  p95={p95:7.2f}ms  mean={statistics.mean(samples):7.2f}ms"
+
+
+async def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    exam_id, student_id = sys.argv[1], sys.argv[2]
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    backends = [PostgrestBackend()]
+    if DATABASE_URL:
+        backends.append(PostgresBackend(DATABASE_URL))
+    else:
+        print("DATABASE_URL not set; only benchmarking PostgREST")
+
+    for backend in backends:
+        print(f"── {backend.name} ──")
+        print(f"  exam_paper        {summary(await timed(backend.exam_paper, exam_id, iterations=iterations))}")
+        print(f"  student_results   {summary(await timed(backend.student_results, student_id, iterations=iterations))}")
+        print(f"  dashboard_counts  {summary(await timed(backend.dashboard_counts, student_id, iterations=iterations))}")
+        if isinstance(backend, PostgresBackend):
+            await backend.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
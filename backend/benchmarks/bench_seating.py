@@ -0,0 +1,59 @@
+"""
+Benchmark: seating allocation for a large exam slot (in memory, no database)
+
+Usage (from backend/):
+    python -m benchmarks.bench_seating [students] [exams]
+"""
+
+import random
+import sys
+import time
+
+from app.services.seating import allocate, quality
+
+DEPARTMENTS = ["CSE", "ECE", "EEE", "MECH", "CIVIL", "IT"]
+HALL_ROWS, HALL_COLS = 10, 8
+
+
+def synthetic_slot(students: int, exams: int, seed: int = 7):
+    rng = random.Random(seed)
+    # Skewed exam sizes, like a real slot: a few big papers and a long tail
+    weights = [1 / (i + 1) for i in range(exams)]
+    subjects = rng.choices([f"SUBJ{i:02d}" for i in range(exams)], weights=weights, k=students)
+    roster = [
+        {
+            "id": f"student-{i}",
+            "reg_number": f"REG{i:05d}",
+            "exam_id": subject,
+            "subject": subject,
+            "department": rng.choice(DEPARTMENTS),
+        }
+        for i, subject in enumerate(subjects)
+    ]
+    seats_needed = int(students * 1.1)
+    halls = [
+        {"id": f"hall-{h}", "name": f"Hall {h}", "rows": HALL_ROWS, "cols": HALL_COLS, "blocked_seats": [[1, 1]]}
+        for h in range(seats_needed // (HALL_ROWS * HALL_COLS - 1) + 1)
+    ]
+    return roster, halls
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    exams = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    roster, halls = synthetic_slot(students, exams)
+
+    start = time.perf_counter()
+    assignments = allocate(roster, halls)
+    allocated = time.perf_counter() - start
+    score = quality(assignments)
+    scored = time.perf_counter() - start - allocated
+
+    print(f"students={students}  exams={exams}  halls={len(halls)}  seated={score['seated']}")
+    print(f"  allocate      {allocated * 1000:8.1f} ms")
+    print(f"  quality       {scored * 1000:8.1f} ms")
+    print(f"  score         {score['score']:8.2f}  ({score['clashes']} clashes / {score['adjacent_pairs']} adjacent pairs)")
+
+
+if __name__ == "__main__":
+    main()
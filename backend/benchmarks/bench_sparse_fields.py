@@ -0,0 +1,54 @@
+"""
+Benchmark: full rows vs sparse fieldsets on the large list endpoints
+
+Usage (from backend/):
+    python -m benchmarks.bench_sparse_fields [iterations]
+"""
+
+import json
+import statistics
+import sys
+import time
+
+from app.services.fields import select_columns
+from app.services.supabase import get_supabase_admin
+
+# (table, fieldset a list screen actually needs)
+CASES = [
+    ("exams", ["id", "title", "subject", "scheduled_at", "status"]),
+    ("profiles", ["id", "full_name", "role", "department", "reg_number"]),
+]
+
+
+def timed(table: str, columns: str, iterations: int):
+    sb = get_supabase_admin()
+    sb.table(table).select(columns).execute()  # warm-up
+    samples, payload = [], 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        rows = sb.table(table).select(columns).execute().data or []
+        payload = len(json.dumps(rows))  # what the endpoint would serialize
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, payload
+
+
+def summary(samples: list) -> str:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    return f"p50={statistics.median(samples):7.2f}ms  p95={p95:7.2f}ms"
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for table, fields in CASES:
+        print(f"── {table} ──")
+        full, full_bytes = timed(table, "*", iterations)
+        sparse, sparse_bytes = timed(table, select_columns(fields), iterations)
+        print(f"  select(*)        {summary(full)}  payload={full_bytes / 1024:8.1f} KiB")
+        print(f"  sparse fields    {summary(sparse)}  payload={sparse_bytes / 1024:8.1f} KiB")
+        if full_bytes:
+            print(f"  payload saved: {100 * (1 - sparse_bytes / full_bytes):.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -70,6 +70,827 @@ CREATE TABLE IF NOT EXISTS results (
     evaluated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Question bank (reusable questions, attached to exams by reference)
+CREATE TABLE IF NOT EXISTS question_bank (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    subject TEXT NOT NULL,
+    difficulty TEXT NOT NULL DEFAULT 'medium' CHECK (difficulty IN ('easy', 'medium', 'hard')),
+    tags TEXT[] NOT NULL DEFAULT '{}',
+    question_text TEXT NOT NULL,
+    question_type TEXT DEFAULT 'text' CHECK (question_type IN ('mcq', 'text', 'file_upload')),
+    options JSONB,
+    correct_answer TEXT,
+    marks INT NOT NULL CHECK (marks > 0),
+    created_by UUID REFERENCES profiles(id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    deleted_at TIMESTAMPTZ  -- soft delete, so search indexes on other instances see removals
+);
+
+-- Per-student question/option shuffling (on by default)
+ALTER TABLE exams ADD COLUMN IF NOT EXISTS shuffle BOOLEAN NOT NULL DEFAULT TRUE;
+
+-- Set by bulk deactivation; rejects tokens issued before the Auth ban
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS deactivated_at TIMESTAMPTZ;
+
+-- Courses / sections within a department, and the students enrolled in them
+CREATE TABLE IF NOT EXISTS courses (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    code TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    department TEXT NOT NULL,
+    semester TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS course_enrollments (
+    course_id UUID NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    student_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    enrolled_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (course_id, student_id)
+);
+
+-- An exam is for one course's students; exams without a course are for their department
+ALTER TABLE exams ADD COLUMN IF NOT EXISTS course_id UUID REFERENCES courses(id) ON DELETE SET NULL;
+ALTER TABLE exams ADD COLUMN IF NOT EXISTS department TEXT;
+UPDATE exams e SET department = p.department FROM profiles p WHERE p.id = e.teacher_id AND e.department IS NULL;
+
+-- Grade bands: per exam (exams.grade_bands), else per department, else grade_for_percentage()
+-- Format: [{"min_percentage": 90, "grade": "A+"}, ..., {"min_percentage": 0, "grade": "F"}]
+CREATE TABLE IF NOT EXISTS grading_policies (
+    department TEXT PRIMARY KEY,
+    bands JSONB NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE exams ADD COLUMN IF NOT EXISTS grade_bands JSONB;
+
+-- Exam halls: a rows × cols grid of seats, minus blocked positions ([[row, col], ...])
+CREATE TABLE IF NOT EXISTS exam_halls (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    name TEXT UNIQUE NOT NULL,
+    building TEXT,
+    rows INTEGER NOT NULL CHECK (rows > 0),
+    cols INTEGER NOT NULL CHECK (cols > 0),
+    blocked_seats JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- One seating plan per exam slot: exams overlapping in time, from slot_start to slot_end
+CREATE TABLE IF NOT EXISTS seating_plans (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    slot_start TIMESTAMPTZ NOT NULL,
+    slot_end TIMESTAMPTZ,
+    exam_ids UUID[] NOT NULL,
+    hall_ids UUID[] NOT NULL,
+    quality JSONB,
+    created_by UUID REFERENCES profiles(id),
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE seating_plans ADD COLUMN IF NOT EXISTS slot_end TIMESTAMPTZ;
+
+CREATE TABLE IF NOT EXISTS seat_assignments (
+    plan_id UUID REFERENCES seating_plans(id) ON DELETE CASCADE NOT NULL,
+    hall_id UUID REFERENCES exam_halls(id) ON DELETE CASCADE NOT NULL,
+    seat_row INTEGER NOT NULL,
+    seat_col INTEGER NOT NULL,
+    student_id UUID REFERENCES profiles(id) ON DELETE CASCADE NOT NULL,
+    exam_id UUID REFERENCES exams(id) ON DELETE CASCADE NOT NULL,
+    PRIMARY KEY (plan_id, hall_id, seat_row, seat_col),
+    UNIQUE (plan_id, student_id)
+);
+
+-- Replaces every plan overlapping the slot (or holding one of its exams) with the
+-- new plan and its seats in one transaction, so a failed write keeps the old plan
+CREATE OR REPLACE FUNCTION replace_seating_plan(
+    p_slot_start TIMESTAMPTZ, p_slot_end TIMESTAMPTZ, p_exam_ids UUID[], p_hall_ids UUID[],
+    p_quality JSONB, p_created_by UUID, p_seats JSONB
+) RETURNS JSONB AS $$
+DECLARE
+    v_plan seating_plans%ROWTYPE;
+BEGIN
+    -- One replacement at a time, so two overlapping plans can't both survive
+    PERFORM pg_advisory_xact_lock(hashtextextended('seating_plans', 0));
+
+    -- Halls can't be shared by two plans at once, and an exam that moved slots loses its old seats
+    DELETE FROM seating_plans
+    WHERE (slot_start < p_slot_end AND slot_end > p_slot_start)
+       OR slot_start = p_slot_start
+       OR exam_ids && p_exam_ids;
+
+    INSERT INTO seating_plans (slot_start, slot_end, exam_ids, hall_ids, quality, created_by)
+    VALUES (p_slot_start, p_slot_end, p_exam_ids, p_hall_ids, p_quality, p_created_by)
+    RETURNING * INTO v_plan;
+
+    INSERT INTO seat_assignments (plan_id, hall_id, seat_row, seat_col, student_id, exam_id)
+    SELECT v_plan.id, s.hall_id, s.seat_row, s.seat_col, s.student_id, s.exam_id
+    FROM jsonb_to_recordset(p_seats) AS s(hall_id UUID, seat_row INT, seat_col INT, student_id UUID, exam_id UUID);
+
+    RETURN to_jsonb(v_plan);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Exam questions copied from the bank keep a reference to their source
+ALTER TABLE questions ADD COLUMN IF NOT EXISTS bank_question_id UUID REFERENCES question_bank(id) ON DELETE SET NULL;
+
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_question_bank_updated_at ON question_bank;
+CREATE TRIGGER trg_question_bank_updated_at
+    BEFORE UPDATE ON question_bank
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+-- Search indexes sync by writing transaction (see change_feed_watermark()): an
+-- updated_at cursor would skip rows whose transaction committed late
+ALTER TABLE question_bank ADD COLUMN IF NOT EXISTS txid BIGINT NOT NULL DEFAULT txid_current();
+
+CREATE OR REPLACE FUNCTION touch_txid() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.txid = txid_current();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_question_bank_txid ON question_bank;
+CREATE TRIGGER trg_question_bank_txid
+    BEFORE UPDATE ON question_bank
+    FOR EACH ROW EXECUTE FUNCTION touch_txid();
+
+-- Exam sessions (autosaved drafts, flushed in batches by the API)
+CREATE TABLE IF NOT EXISTS exam_sessions (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    exam_id UUID NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+    student_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    answers JSONB NOT NULL DEFAULT '{}'::jsonb,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    deadline_at TIMESTAMPTZ NOT NULL,
+    last_seen_at TIMESTAMPTZ DEFAULT NOW(),
+    remaining_seconds INT,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE(exam_id, student_id)
+);
+
+-- Serializes a submit with a draft flush for the same (exam, student)
+CREATE OR REPLACE FUNCTION lock_exam_session(p_exam_id UUID, p_student_id UUID) RETURNS VOID AS $$
+    SELECT pg_advisory_xact_lock(hashtextextended(p_exam_id::text || ':' || p_student_id::text, 0));
+$$ LANGUAGE sql;
+
+-- A final submission replaces the draft
+CREATE OR REPLACE FUNCTION clear_exam_session() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM lock_exam_session(NEW.exam_id, NEW.student_id);
+    DELETE FROM exam_sessions WHERE exam_id = NEW.exam_id AND student_id = NEW.student_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_submissions_clear_session ON submissions;
+CREATE TRIGGER trg_submissions_clear_session
+    AFTER INSERT ON submissions
+    FOR EACH ROW EXECUTE FUNCTION clear_exam_session();
+
+-- Batched draft flush. Takes the same lock as clear_exam_session(), so a draft
+-- is either written before a concurrent submit deletes it or skipped after.
+CREATE OR REPLACE FUNCTION save_exam_drafts(p_rows JSONB) RETURNS INT AS $$
+DECLARE
+    v_written INT;
+BEGIN
+    PERFORM lock_exam_session(r.exam_id, r.student_id)
+    FROM jsonb_to_recordset(p_rows) AS r(exam_id UUID, student_id UUID)
+    ORDER BY r.exam_id, r.student_id;
+
+    INSERT INTO exam_sessions (exam_id, student_id, answers, started_at, deadline_at, last_seen_at, remaining_seconds, updated_at)
+    SELECT r.exam_id, r.student_id, COALESCE(r.answers, '{}'::jsonb), r.started_at, r.deadline_at, r.last_seen_at, r.remaining_seconds, NOW()
+    FROM jsonb_to_recordset(p_rows) AS r(
+        exam_id UUID, student_id UUID, answers JSONB, started_at TIMESTAMPTZ,
+        deadline_at TIMESTAMPTZ, last_seen_at TIMESTAMPTZ, remaining_seconds INT
+    )
+    WHERE NOT EXISTS (
+        SELECT 1 FROM submissions s WHERE s.exam_id = r.exam_id AND s.student_id = r.student_id
+    )
+      AND can_take_exam(r.exam_id, r.student_id)
+    ON CONFLICT (exam_id, student_id) DO UPDATE SET
+        answers = EXCLUDED.answers,
+        last_seen_at = EXCLUDED.last_seen_at,
+        remaining_seconds = EXCLUDED.remaining_seconds,
+        updated_at = NOW();
+
+    GET DIAGNOSTICS v_written = ROW_COUNT;
+    RETURN v_written;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Cached MinHash signatures of text answers (for the similarity report)
+CREATE TABLE IF NOT EXISTS answer_signatures (
+    submission_id UUID NOT NULL REFERENCES submissions(id) ON DELETE CASCADE,
+    question_id UUID NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    exam_id UUID NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+    signature BIGINT[] NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (submission_id, question_id)
+);
+
+-- ====================================================
+-- Student performance index
+-- Running sums per (student, subject, semester), maintained incrementally by a trigger
+-- ====================================================
+
+-- Odd semester: Jul–Dec, even semester: Jan–Jun
+CREATE OR REPLACE FUNCTION semester_for(p_at TIMESTAMPTZ)
+RETURNS TEXT AS $$
+    SELECT EXTRACT(YEAR FROM p_at)::INT || '-' || CASE WHEN EXTRACT(MONTH FROM p_at) >= 7 THEN 'odd' ELSE 'even' END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS student_performance (
+    student_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    result_count INT NOT NULL DEFAULT 0,
+    percentage_sum NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (student_id, subject, semester)
+);
+
+CREATE OR REPLACE VIEW student_overall_performance AS
+SELECT sp.student_id, p.department,
+       SUM(sp.result_count) AS result_count,
+       ROUND(SUM(sp.percentage_sum) / NULLIF(SUM(sp.result_count), 0), 2) AS average
+FROM student_performance sp
+JOIN profiles p ON p.id = sp.student_id
+WHERE sp.result_count > 0
+GROUP BY sp.student_id, p.department;
+
+CREATE OR REPLACE FUNCTION apply_performance_delta(p_student_id UUID, p_exam_id UUID, p_count INT, p_percentage NUMERIC)
+RETURNS VOID AS $$
+    INSERT INTO student_performance AS sp (student_id, subject, semester, result_count, percentage_sum)
+    SELECT p_student_id, e.subject, semester_for(e.scheduled_at), p_count, p_count * p_percentage
+    FROM exams e
+    -- Cascaded deletes of a removed student or exam have nothing left to update
+    JOIN profiles p ON p.id = p_student_id
+    WHERE e.id = p_exam_id
+    ON CONFLICT (student_id, subject, semester) DO UPDATE SET
+        result_count = sp.result_count + EXCLUDED.result_count,
+        percentage_sum = sp.percentage_sum + EXCLUDED.percentage_sum,
+        updated_at = NOW();
+$$ LANGUAGE sql;
+
+-- Only published results count; re-evaluation un-publishes and so removes the old contribution.
+-- Archived results keep counting, so deletes made by delete_archived_exam() are ignored.
+CREATE OR REPLACE FUNCTION track_student_performance() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' AND current_setting('app.archiving', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.published AND OLD.percentage IS NOT NULL THEN
+        PERFORM apply_performance_delta(OLD.student_id, OLD.exam_id, -1, OLD.percentage);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.published AND NEW.percentage IS NOT NULL THEN
+        PERFORM apply_performance_delta(NEW.student_id, NEW.exam_id, 1, NEW.percentage);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_results_performance ON results;
+CREATE TRIGGER trg_results_performance
+    AFTER INSERT OR UPDATE OF published, percentage OR DELETE ON results
+    FOR EACH ROW EXECUTE FUNCTION track_student_performance();
+
+-- Results deleted by an exam's cascade no longer find the exam's subject/semester,
+-- so the exam's contributions are taken out before the exam row goes
+CREATE OR REPLACE FUNCTION untrack_exam_performance() RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('app.archiving', true) = 'on' THEN
+        RETURN OLD;
+    END IF;
+    UPDATE student_performance sp SET
+        result_count = sp.result_count - d.result_count,
+        percentage_sum = sp.percentage_sum - d.percentage_sum,
+        updated_at = NOW()
+    FROM (
+        SELECT student_id, COUNT(*) AS result_count, SUM(percentage) AS percentage_sum
+        FROM results
+        WHERE exam_id = OLD.id AND published AND percentage IS NOT NULL
+        GROUP BY student_id
+    ) d
+    WHERE sp.student_id = d.student_id
+      AND sp.subject = OLD.subject
+      AND sp.semester = semester_for(OLD.scheduled_at);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_exams_untrack_performance ON exams;
+CREATE TRIGGER trg_exams_untrack_performance
+    BEFORE DELETE ON exams
+    FOR EACH ROW EXECUTE FUNCTION untrack_exam_performance();
+
+-- Backfill from results published before the trigger existed. Only students with
+-- no rows yet are filled in, so re-running it is harmless and never drops the
+-- contributions of results that were archived since.
+INSERT INTO student_performance (student_id, subject, semester, result_count, percentage_sum)
+SELECT r.student_id, e.subject, semester_for(e.scheduled_at), COUNT(*), SUM(r.percentage)
+FROM results r
+JOIN exams e ON e.id = r.exam_id
+WHERE r.published AND r.percentage IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM student_performance sp WHERE sp.student_id = r.student_id)
+GROUP BY r.student_id, e.subject, semester_for(e.scheduled_at)
+ON CONFLICT (student_id, subject, semester) DO NOTHING;
+
+-- ====================================================
+-- Transactional write paths (called via sb.rpc)
+-- Client errors use SQLSTATE 'PT<http status>' so the API can map them 1:1
+-- ====================================================
+
+CREATE OR REPLACE FUNCTION grade_for_percentage(p_percentage NUMERIC)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN p_percentage >= 90 THEN 'A+'
+        WHEN p_percentage >= 80 THEN 'A'
+        WHEN p_percentage >= 70 THEN 'B+'
+        WHEN p_percentage >= 60 THEN 'B'
+        WHEN p_percentage >= 50 THEN 'C'
+        WHEN p_percentage >= 40 THEN 'D'
+        ELSE 'F'
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION exam_grade_bands(p_exam_id UUID)
+RETURNS JSONB AS $$
+    SELECT COALESCE(e.grade_bands, gp.bands)
+    FROM exams e LEFT JOIN grading_policies gp ON gp.department = e.department
+    WHERE e.id = p_exam_id;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION grade_from_bands(p_percentage NUMERIC, p_bands JSONB)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN p_bands IS NULL THEN grade_for_percentage(p_percentage)
+        ELSE (
+            SELECT b->>'grade' FROM jsonb_array_elements(p_bands) b
+            WHERE (b->>'min_percentage')::NUMERIC <= p_percentage
+            ORDER BY (b->>'min_percentage')::NUMERIC DESC
+            LIMIT 1
+        )
+    END;
+$$ LANGUAGE sql STABLE;
+
+-- Same rule as StudentExamIndex.can_take: a course exam needs an enrollment, any
+-- other exam the student's department (exams without one are open to everyone)
+CREATE OR REPLACE FUNCTION can_take_exam(p_exam_id UUID, p_student_id UUID) RETURNS BOOLEAN AS $$
+    SELECT COALESCE((
+        SELECT CASE
+            WHEN e.course_id IS NOT NULL THEN EXISTS (
+                SELECT 1 FROM course_enrollments ce WHERE ce.course_id = e.course_id AND ce.student_id = p_student_id
+            )
+            ELSE e.department IS NULL OR e.department = (SELECT p.department FROM profiles p WHERE p.id = p_student_id)
+        END
+        FROM exams e WHERE e.id = p_exam_id
+    ), FALSE);
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION submit_exam(p_exam_id UUID, p_student_id UUID, p_answers JSONB, p_file_url TEXT)
+RETURNS UUID AS $$
+DECLARE
+    v_status TEXT;
+    v_closes_at TIMESTAMPTZ;
+    v_submission_id UUID;
+BEGIN
+    SELECT status, scheduled_at + make_interval(mins => duration_minutes)
+    INTO v_status, v_closes_at FROM exams WHERE id = p_exam_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Exam not found' USING ERRCODE = 'PT404';
+    END IF;
+    IF v_status NOT IN ('scheduled', 'active') THEN
+        RAISE EXCEPTION 'This exam is not accepting submissions' USING ERRCODE = 'PT400';
+    END IF;
+    IF NOT can_take_exam(p_exam_id, p_student_id) THEN
+        RAISE EXCEPTION 'You are not enrolled for this exam' USING ERRCODE = 'PT403';
+    END IF;
+    -- Late if past the exam's end or the student's own session deadline
+    IF NOW() > v_closes_at OR EXISTS (
+        SELECT 1 FROM exam_sessions
+        WHERE exam_id = p_exam_id AND student_id = p_student_id AND NOW() > deadline_at
+    ) THEN
+        RAISE EXCEPTION 'The time for this exam is over' USING ERRCODE = 'PT403';
+    END IF;
+    IF EXISTS (SELECT 1 FROM submissions WHERE exam_id = p_exam_id AND student_id = p_student_id) THEN
+        RAISE EXCEPTION 'Already submitted this exam' USING ERRCODE = 'PT400';
+    END IF;
+    IF p_file_url IS NULL OR p_file_url NOT LIKE '%.pdf' THEN
+        RAISE EXCEPTION 'Submissions must be a PDF file.' USING ERRCODE = 'PT400';
+    END IF;
+
+    INSERT INTO submissions (exam_id, student_id, answers, file_url, status)
+    VALUES (p_exam_id, p_student_id, COALESCE(p_answers, '{}'::jsonb), p_file_url, 'submitted')
+    ON CONFLICT (exam_id, student_id) DO NOTHING
+    RETURNING id INTO v_submission_id;
+
+    IF v_submission_id IS NULL THEN
+        RAISE EXCEPTION 'Already submitted this exam' USING ERRCODE = 'PT400';
+    END IF;
+    RETURN v_submission_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION evaluate_submission(p_submission_id UUID, p_teacher_id UUID, p_marks INT, p_remarks TEXT)
+RETURNS JSONB AS $$
+DECLARE
+    v_sub submissions%ROWTYPE;
+    v_total INT;
+    v_percentage NUMERIC;
+    v_grade TEXT;
+BEGIN
+    -- Row lock serializes concurrent evaluations of the same submission
+    SELECT * INTO v_sub FROM submissions WHERE id = p_submission_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Submission not found' USING ERRCODE = 'PT404';
+    END IF;
+
+    SELECT total_marks INTO v_total FROM exams WHERE id = v_sub.exam_id AND teacher_id = p_teacher_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Not authorized to evaluate this submission' USING ERRCODE = 'PT403';
+    END IF;
+    IF p_marks > v_total THEN
+        RAISE EXCEPTION 'Marks cannot exceed total marks (%)', v_total USING ERRCODE = 'PT400';
+    END IF;
+
+    v_percentage := ROUND(p_marks::NUMERIC / v_total * 100, 2);
+    v_grade := grade_from_bands(v_percentage, exam_grade_bands(v_sub.exam_id));
+
+    INSERT INTO results (exam_id, student_id, submission_id, marks_obtained, total_marks,
+                         percentage, grade, remarks, evaluated_by, published)
+    VALUES (v_sub.exam_id, v_sub.student_id, p_submission_id, p_marks, v_total,
+            v_percentage, v_grade, p_remarks, p_teacher_id, FALSE)
+    ON CONFLICT (submission_id) DO UPDATE SET
+        marks_obtained = EXCLUDED.marks_obtained,
+        total_marks = EXCLUDED.total_marks,
+        percentage = EXCLUDED.percentage,
+        grade = EXCLUDED.grade,
+        remarks = EXCLUDED.remarks,
+        evaluated_by = EXCLUDED.evaluated_by,
+        published = FALSE,
+        evaluated_at = NOW();
+
+    UPDATE submissions SET status = 'evaluated' WHERE id = p_submission_id;
+
+    RETURN jsonb_build_object('grade', v_grade, 'percentage', v_percentage);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION publish_results(p_exam_id UUID, p_teacher_id UUID)
+RETURNS INT AS $$
+DECLARE
+    v_count INT;
+BEGIN
+    PERFORM 1 FROM exams WHERE id = p_exam_id AND teacher_id = p_teacher_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Exam not found' USING ERRCODE = 'PT404';
+    END IF;
+
+    UPDATE results SET published = TRUE WHERE exam_id = p_exam_id;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+
+    UPDATE exams SET status = 'results_published' WHERE id = p_exam_id;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recomputes total_marks, percentage and grade from each result's current
+-- marks_obtained in one statement. marks_obtained itself is never written, so
+-- an evaluation running at the same time is not overwritten.
+CREATE OR REPLACE FUNCTION regrade_exam(p_exam_id UUID)
+RETURNS JSONB AS $$
+DECLARE
+    v_total INT;
+    v_bands JSONB;
+    v_summary JSONB;
+BEGIN
+    SELECT total_marks INTO v_total FROM exams WHERE id = p_exam_id;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('exam_id', p_exam_id, 'regraded', 0);
+    END IF;
+    v_bands := exam_grade_bands(p_exam_id);
+
+    WITH regraded AS (
+        UPDATE results SET
+            total_marks = v_total,
+            percentage = ROUND(marks_obtained::NUMERIC / v_total * 100, 2),
+            grade = grade_from_bands(ROUND(marks_obtained::NUMERIC / v_total * 100, 2), v_bands)
+        WHERE exam_id = p_exam_id
+        RETURNING marks_obtained, grade
+    ), counts AS (
+        SELECT grade, COUNT(*) AS n FROM regraded WHERE grade IS NOT NULL GROUP BY grade
+    )
+    SELECT jsonb_build_object(
+        'exam_id', p_exam_id,
+        'regraded', (SELECT COUNT(*) FROM regraded),
+        'over_total', (SELECT COUNT(*) FROM regraded WHERE marks_obtained > v_total),
+        'grade_counts', COALESCE((SELECT jsonb_object_agg(grade, n) FROM counts), '{}'::jsonb)
+    ) INTO v_summary;
+    RETURN v_summary;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ====================================================
+-- Background Jobs
+-- ====================================================
+
+-- Leases: lets exactly one API instance run a background job
+CREATE TABLE IF NOT EXISTS service_leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION acquire_lease(p_name TEXT, p_holder TEXT, p_ttl_seconds INT)
+RETURNS BOOLEAN AS $$
+DECLARE
+    acquired BOOLEAN;
+BEGIN
+    INSERT INTO service_leases AS l (name, holder, expires_at)
+    VALUES (p_name, p_holder, NOW() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (name) DO UPDATE
+        SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+        WHERE l.holder = EXCLUDED.holder OR l.expires_at < NOW()
+    RETURNING TRUE INTO acquired;
+    RETURN COALESCE(acquired, FALSE);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Exam status transitions: re-checks times so callers may pass a stale list of ids
+CREATE OR REPLACE FUNCTION apply_exam_transitions(p_exam_ids UUID[])
+RETURNS TABLE (id UUID, status TEXT) AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE exams e
+    SET status = CASE
+        WHEN e.scheduled_at + make_interval(mins => e.duration_minutes) <= NOW() THEN 'completed'
+        ELSE 'active'
+    END
+    WHERE e.id = ANY(p_exam_ids)
+      AND e.status IN ('scheduled', 'active')
+      AND e.scheduled_at <= NOW()
+      AND e.status <> CASE
+        WHEN e.scheduled_at + make_interval(mins => e.duration_minutes) <= NOW() THEN 'completed'
+        ELSE 'active'
+      END
+    RETURNING e.id, e.status;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Notification outbox: written in the same transaction as the status change,
+-- one row per event (recipients are expanded by the dispatcher)
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    event_type TEXT NOT NULL CHECK (event_type IN ('exam_scheduled', 'results_published')),
+    exam_id UUID NOT NULL REFERENCES exams(id) ON DELETE CASCADE,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'processing', 'sent', 'failed')),
+    attempts INT NOT NULL DEFAULT 0,
+    progress INT NOT NULL DEFAULT 0,  -- recipients already delivered, so retries resume
+    recipient_count INT,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    sent_at TIMESTAMPTZ
+);
+
+CREATE OR REPLACE FUNCTION enqueue_exam_notifications() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.status IS DISTINCT FROM OLD.status AND NEW.status IN ('scheduled', 'results_published') THEN
+        INSERT INTO notification_outbox (event_type, exam_id, payload)
+        VALUES (
+            CASE NEW.status WHEN 'scheduled' THEN 'exam_scheduled' ELSE 'results_published' END,
+            NEW.id,
+            jsonb_build_object('title', NEW.title, 'scheduled_at', NEW.scheduled_at)
+        );
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_exams_notifications ON exams;
+CREATE TRIGGER trg_exams_notifications
+    AFTER UPDATE OF status ON exams
+    FOR EACH ROW EXECUTE FUNCTION enqueue_exam_notifications();
+
+-- Claims due events; 'processing' rows whose lease ran out (crashed worker) are reclaimed
+CREATE OR REPLACE FUNCTION claim_outbox_batch(p_limit INT, p_lease_seconds INT)
+RETURNS SETOF notification_outbox AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE notification_outbox o
+    SET status = 'processing', next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id FROM notification_outbox
+        WHERE status IN ('pending', 'processing') AND next_attempt_at <= NOW()
+        ORDER BY id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ====================================================
+-- Change feed: append-only log of row changes, written by triggers on every write path
+-- ====================================================
+
+CREATE TABLE IF NOT EXISTS change_log (
+    seq BIGSERIAL PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    row_id UUID NOT NULL,
+    op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+    exam_id UUID,
+    student_id UUID,
+    teacher_id UUID,
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+ALTER TABLE change_log ADD COLUMN IF NOT EXISTS txid BIGINT NOT NULL DEFAULT txid_current();
+
+-- Readers page by transaction id, not seq: seq and changed_at are taken when a row
+-- is written, but rows only become visible at commit, in any order. Every
+-- transaction below the oldest one still running has finished, so entries under
+-- that watermark are final and no later commit can land behind it.
+CREATE OR REPLACE FUNCTION change_feed_watermark() RETURNS BIGINT AS $$
+    SELECT txid_snapshot_xmin(txid_current_snapshot());
+$$ LANGUAGE sql STABLE;
+
+-- Cursors below pruned_before point at entries that no longer exist
+CREATE TABLE IF NOT EXISTS change_feed_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    pruned_before BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO change_feed_state (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION prune_change_log(p_before TIMESTAMPTZ) RETURNS BIGINT AS $$
+DECLARE
+    v_max BIGINT;
+BEGIN
+    WITH pruned AS (
+        DELETE FROM change_log WHERE changed_at < p_before RETURNING txid
+    )
+    SELECT MAX(txid) INTO v_max FROM pruned;
+
+    IF v_max IS NOT NULL THEN
+        UPDATE change_feed_state SET pruned_before = GREATEST(pruned_before, v_max + 1);
+    END IF;
+    RETURN (SELECT pruned_before FROM change_feed_state);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_change() RETURNS TRIGGER AS $$
+DECLARE
+    r RECORD;
+    v_row UUID;
+    v_exam UUID;
+    v_student UUID;
+    v_teacher UUID;
+BEGIN
+    IF TG_OP = 'DELETE' THEN r := OLD; ELSE r := NEW; END IF;
+
+    IF TG_TABLE_NAME = 'exams' THEN
+        v_row := r.id;
+        v_exam := r.id;
+        v_teacher := r.teacher_id;
+    ELSIF TG_TABLE_NAME = 'profiles' THEN
+        v_row := r.id;  -- only the id matters: instances drop their cached copy
+    ELSIF TG_TABLE_NAME = 'course_enrollments' THEN
+        v_row := r.course_id;
+        v_student := r.student_id;
+    ELSE
+        v_row := r.id;
+        v_exam := r.exam_id;
+        v_student := r.student_id;
+        SELECT teacher_id INTO v_teacher FROM exams WHERE id = r.exam_id;
+        IF NOT FOUND AND TG_OP = 'DELETE' THEN
+            -- Removed by the exam's cascade; already logged by log_cascaded_deletes()
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    INSERT INTO change_log (table_name, row_id, op, exam_id, student_id, teacher_id)
+    VALUES (TG_TABLE_NAME, v_row, LOWER(TG_OP), v_exam, v_student, v_teacher);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_exams_change_log ON exams;
+CREATE TRIGGER trg_exams_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON exams
+    FOR EACH ROW EXECUTE FUNCTION record_change();
+
+DROP TRIGGER IF EXISTS trg_submissions_change_log ON submissions;
+CREATE TRIGGER trg_submissions_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON submissions
+    FOR EACH ROW EXECUTE FUNCTION record_change();
+
+DROP TRIGGER IF EXISTS trg_results_change_log ON results;
+CREATE TRIGGER trg_results_change_log
+    AFTER INSERT OR UPDATE OR DELETE ON results
+    FOR EACH ROW EXECUTE FUNCTION record_change();
+
+-- Role changes, deactivation and deletion must reach every instance's profile cache
+DROP TRIGGER IF EXISTS trg_profiles_change_log ON profiles;
+CREATE TRIGGER trg_profiles_change_log
+    AFTER UPDATE OR DELETE ON profiles
+    FOR EACH ROW EXECUTE FUNCTION record_change();
+
+-- Enrollment changes must reach every instance's enrollment cache and timetable
+DROP TRIGGER IF EXISTS trg_course_enrollments_change_log ON course_enrollments;
+CREATE TRIGGER trg_course_enrollments_change_log
+    AFTER INSERT OR DELETE ON course_enrollments
+    FOR EACH ROW EXECUTE FUNCTION record_change();
+
+-- By the time a cascade deletes an exam's submissions and results the exam row is
+-- gone, so they are logged with its teacher while it still exists
+CREATE OR REPLACE FUNCTION log_cascaded_deletes() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO change_log (table_name, row_id, op, exam_id, student_id, teacher_id)
+    SELECT 'submissions', s.id, 'delete', s.exam_id, s.student_id, OLD.teacher_id
+    FROM submissions s WHERE s.exam_id = OLD.id
+    UNION ALL
+    SELECT 'results', r.id, 'delete', r.exam_id, r.student_id, OLD.teacher_id
+    FROM results r WHERE r.exam_id = OLD.id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_exams_log_cascaded_deletes ON exams;
+CREATE TRIGGER trg_exams_log_cascaded_deletes
+    BEFORE DELETE ON exams
+    FOR EACH ROW EXECUTE FUNCTION log_cascaded_deletes();
+
+-- ====================================================
+-- Cold archive: old exams live in Storage (bucket "archive"); these tables index them
+-- ====================================================
+
+CREATE TABLE IF NOT EXISTS archived_exams (
+    exam_id UUID PRIMARY KEY,
+    teacher_id UUID REFERENCES profiles(id) ON DELETE SET NULL,
+    title TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    total_marks INT NOT NULL,
+    scheduled_at TIMESTAMPTZ NOT NULL,
+    term TEXT NOT NULL,
+    department TEXT,
+    path TEXT NOT NULL,
+    question_count INT NOT NULL DEFAULT 0,
+    submission_count INT NOT NULL DEFAULT 0,
+    result_count INT NOT NULL DEFAULT 0,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Which archived exams hold a published result for a student
+CREATE TABLE IF NOT EXISTS archived_result_index (
+    student_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    exam_id UUID NOT NULL REFERENCES archived_exams(exam_id) ON DELETE CASCADE,
+    PRIMARY KEY (student_id, exam_id)
+);
+
+-- Removes an exam (and, by cascade, its questions, submissions and results) once its files are written
+CREATE OR REPLACE FUNCTION delete_archived_exam(p_exam_id UUID)
+RETURNS VOID AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM archived_exams WHERE exam_id = p_exam_id) THEN
+        RAISE EXCEPTION 'Exam is not archived' USING ERRCODE = 'PT409';
+    END IF;
+    PERFORM set_config('app.archiving', 'on', true);
+    DELETE FROM exams WHERE id = p_exam_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ====================================================
+-- Bulk user operations (admin), run as background jobs
+-- ====================================================
+
+CREATE TABLE IF NOT EXISTS bulk_user_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    action TEXT NOT NULL CHECK (action IN ('update', 'deactivate', 'delete')),
+    requested_by UUID REFERENCES profiles(id) ON DELETE SET NULL,
+    selector JSONB NOT NULL,
+    changes JSONB,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    total INT NOT NULL DEFAULT 0,
+    processed INT NOT NULL DEFAULT 0,
+    succeeded INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    errors JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+ALTER TABLE bulk_user_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
 -- ====================================================
 -- Realtime & Communication Tables
 -- ====================================================
@@ -105,6 +926,35 @@ CREATE INDEX IF NOT EXISTS idx_submissions_student ON submissions(student_id);
 CREATE INDEX IF NOT EXISTS idx_results_exam ON results(exam_id);
 CREATE INDEX IF NOT EXISTS idx_results_student ON results(student_id);
 CREATE INDEX IF NOT EXISTS idx_results_published ON results(published);
+-- One result per submission (required by evaluate_submission's upsert)
+-- Before results were upserted per submission, re-evaluation could leave duplicates; keep the latest
+DELETE FROM results r
+USING results newer
+WHERE r.submission_id = newer.submission_id
+  AND (COALESCE(newer.evaluated_at, '-infinity'), newer.id) > (COALESCE(r.evaluated_at, '-infinity'), r.id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_results_submission ON results(submission_id);
+CREATE INDEX IF NOT EXISTS idx_exam_sessions_student ON exam_sessions(student_id);
+CREATE INDEX IF NOT EXISTS idx_question_bank_txid ON question_bank(txid, id);
+CREATE INDEX IF NOT EXISTS idx_questions_bank_question ON questions(bank_question_id);
+CREATE INDEX IF NOT EXISTS idx_answer_signatures_exam ON answer_signatures(exam_id);
+DROP INDEX IF EXISTS idx_change_log_teacher;
+DROP INDEX IF EXISTS idx_change_log_student;
+CREATE INDEX IF NOT EXISTS idx_change_log_txid ON change_log(txid, seq);
+CREATE INDEX IF NOT EXISTS idx_change_log_teacher_txid ON change_log(teacher_id, txid, seq);
+CREATE INDEX IF NOT EXISTS idx_change_log_student_txid ON change_log(student_id, txid, seq);
+CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log(changed_at);
+CREATE INDEX IF NOT EXISTS idx_bulk_user_jobs_unfinished ON bulk_user_jobs(heartbeat_at) WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON notification_outbox(next_attempt_at) WHERE status IN ('pending', 'processing');
+CREATE INDEX IF NOT EXISTS idx_exams_scheduled_at ON exams(scheduled_at) WHERE status IN ('scheduled', 'active');
+CREATE INDEX IF NOT EXISTS idx_exams_archivable ON exams(scheduled_at) WHERE status IN ('completed', 'results_published');
+CREATE INDEX IF NOT EXISTS idx_archived_exams_teacher ON archived_exams(teacher_id);
+CREATE INDEX IF NOT EXISTS idx_profiles_reg_number ON profiles(reg_number text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_profiles_department_role ON profiles(department, role);
+CREATE INDEX IF NOT EXISTS idx_course_enrollments_student ON course_enrollments(student_id);
+CREATE INDEX IF NOT EXISTS idx_courses_department ON courses(department);
+CREATE INDEX IF NOT EXISTS idx_exams_course ON exams(course_id) WHERE status IN ('scheduled', 'active');
+CREATE INDEX IF NOT EXISTS idx_seating_plans_slot ON seating_plans(slot_start DESC);
+CREATE INDEX IF NOT EXISTS idx_seat_assignments_student ON seat_assignments(student_id, plan_id);
 
 -- ====================================================
 -- Row Level Security (RLS) Policies
@@ -114,6 +964,23 @@ ALTER TABLE exams ENABLE ROW LEVEL SECURITY;
 ALTER TABLE questions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE submissions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE results ENABLE ROW LEVEL SECURITY;
+ALTER TABLE exam_sessions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE service_leases ENABLE ROW LEVEL SECURITY;
+ALTER TABLE student_performance ENABLE ROW LEVEL SECURITY;
+ALTER TABLE question_bank ENABLE ROW LEVEL SECURITY;
+ALTER TABLE answer_signatures ENABLE ROW LEVEL SECURITY;
+ALTER TABLE notification_outbox ENABLE ROW LEVEL SECURITY;
+ALTER TABLE change_log ENABLE ROW LEVEL SECURITY;
+ALTER TABLE change_feed_state ENABLE ROW LEVEL SECURITY;
+ALTER TABLE archived_exams ENABLE ROW LEVEL SECURITY;
+ALTER TABLE archived_result_index ENABLE ROW LEVEL SECURITY;
+ALTER TABLE bulk_user_jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE courses ENABLE ROW LEVEL SECURITY;
+ALTER TABLE course_enrollments ENABLE ROW LEVEL SECURITY;
+ALTER TABLE grading_policies ENABLE ROW LEVEL SECURITY;
+ALTER TABLE exam_halls ENABLE ROW LEVEL SECURITY;
+ALTER TABLE seating_plans ENABLE ROW LEVEL SECURITY;
+ALTER TABLE seat_assignments ENABLE ROW LEVEL SECURITY;
 
 -- Profiles: users can read their own profile
 CREATE POLICY "Users can view own profile" ON profiles FOR SELECT USING (auth.uid() = id);
@@ -147,6 +1014,40 @@ CREATE POLICY "Teachers manage results for their exams" ON results FOR ALL USING
 );
 CREATE POLICY "Service role full access to results" ON results FOR ALL USING (auth.role() = 'service_role');
 
+-- Exam sessions: students read own drafts, writes go through the API
+CREATE POLICY "Students view own exam sessions" ON exam_sessions FOR SELECT USING (student_id = auth.uid());
+CREATE POLICY "Service role full access to exam sessions" ON exam_sessions FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service role full access to leases" ON service_leases FOR ALL USING (auth.role() = 'service_role');
+
+-- Student performance: students read their own index
+CREATE POLICY "Students view own performance" ON student_performance FOR SELECT USING (student_id = auth.uid());
+CREATE POLICY "Service role full access to performance" ON student_performance FOR ALL USING (auth.role() = 'service_role');
+
+-- Question bank: shared between teachers, edited by its author (through the API)
+CREATE POLICY "Teachers view question bank" ON question_bank FOR SELECT USING (
+    EXISTS (SELECT 1 FROM profiles WHERE id = auth.uid() AND role IN ('teacher', 'admin'))
+);
+CREATE POLICY "Teachers manage own bank questions" ON question_bank FOR ALL USING (created_by = auth.uid());
+CREATE POLICY "Service role full access to question bank" ON question_bank FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service role full access to answer signatures" ON answer_signatures FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service role full access to notification outbox" ON notification_outbox FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service role full access to change log" ON change_log FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service role full access to change feed state" ON change_feed_state FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service role full access to archived exams" ON archived_exams FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service role full access to archived result index" ON archived_result_index FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service role full access to bulk user jobs" ON bulk_user_jobs FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Authenticated users view courses" ON courses FOR SELECT USING (auth.role() = 'authenticated');
+CREATE POLICY "Service role full access to courses" ON courses FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Students view own enrollments" ON course_enrollments FOR SELECT USING (student_id = auth.uid());
+CREATE POLICY "Service role full access to course enrollments" ON course_enrollments FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Authenticated users view grading policies" ON grading_policies FOR SELECT USING (auth.role() = 'authenticated');
+CREATE POLICY "Service role full access to grading policies" ON grading_policies FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Authenticated users view exam halls" ON exam_halls FOR SELECT USING (auth.role() = 'authenticated');
+CREATE POLICY "Service role full access to exam halls" ON exam_halls FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service role full access to seating plans" ON seating_plans FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Students view own seat" ON seat_assignments FOR SELECT USING (student_id = auth.uid());
+CREATE POLICY "Service role full access to seat assignments" ON seat_assignments FOR ALL USING (auth.role() = 'service_role');
+
 -- Group Messages: Everyone can read and write
 ALTER TABLE group_messages ENABLE ROW LEVEL SECURITY;
 CREATE POLICY "Users can read all group messages" ON group_messages FOR SELECT USING (true);
@@ -0,0 +1,48 @@
+"""
+Answer ZIP: only objects in this project's answers bucket are fetched
+"""
+
+import pytest
+
+from app.services import answer_zip
+from app.services.answer_zip import answer_object_path, entry_names
+
+PROJECT = "https://proj.supabase.co"
+
+
+@pytest.fixture(autouse=True)
+def project(monkeypatch):
+    monkeypatch.setattr(answer_zip, "SUPABASE_URL", PROJECT)
+
+
+@pytest.mark.parametrize("url,path", [
+    (f"{PROJECT}/storage/v1/object/public/answers/exam-1/s1.pdf", "exam-1/s1.pdf"),
+    (f"{PROJECT}/storage/v1/object/sign/answers/exam-1/s1.pdf?token=abc", "exam-1/s1.pdf"),
+    (f"{PROJECT}/storage/v1/object/answers/exam%201/s1.pdf", "exam 1/s1.pdf"),
+    ("https://PROJ.supabase.co/storage/v1/object/public/answers/a.pdf", "a.pdf"),
+])
+def test_answers_bucket_urls_are_accepted(url, path):
+    assert answer_object_path(url) == path
+
+
+@pytest.mark.parametrize("url", [
+    "http://169.254.169.254/latest/meta-data/",
+    "https://evil.test/storage/v1/object/public/answers/a.pdf",
+    "http://proj.supabase.co/storage/v1/object/public/answers/a.pdf",
+    f"{PROJECT}.evil.test/storage/v1/object/public/answers/a.pdf",
+    f"{PROJECT}/storage/v1/object/public/archive/a.pdf",
+    f"{PROJECT}/storage/v1/object/public/answers/../archive/a.pdf",
+    f"{PROJECT}/storage/v1/object/public/answers/%2e%2e/archive/a.pdf",
+    f"{PROJECT}/storage/v1/object/public/answers/",
+    f"{PROJECT}/rest/v1/profiles",
+])
+def test_anything_else_is_rejected(url):
+    assert answer_object_path(url) is None
+
+
+def test_rejected_urls_become_missing_entries():
+    subs = [
+        {"student_id": "s1", "student": {"reg_number": "21CS01"}, "file_url": f"{PROJECT}/storage/v1/object/public/answers/a.pdf"},
+        {"student_id": "s2", "student": {"reg_number": "21CS02"}, "file_url": "http://10.0.0.1/admin"},
+    ]
+    assert entry_names(subs) == [("21CS01.pdf", "a.pdf"), ("21CS02.pdf", None)]
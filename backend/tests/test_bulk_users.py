@@ -0,0 +1,22 @@
+"""
+Bulk user selection: reg_number prefixes match literally
+"""
+
+import pytest
+
+from app.services.bulk_users import like_prefix
+
+
+@pytest.mark.parametrize("prefix,pattern", [
+    ("21CS", "21CS%"),
+    ("21_CS", "21\\_CS%"),
+    ("100%", "100\\%%"),
+    ("A\\B", "A\\\\B%"),
+])
+def test_like_prefix_escapes_wildcards(prefix, pattern):
+    assert like_prefix(prefix) == pattern
+
+
+def test_like_prefix_rejects_postgrest_wildcard():
+    with pytest.raises(ValueError):
+        like_prefix("21*")
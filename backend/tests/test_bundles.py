@@ -0,0 +1,47 @@
+"""
+Exam bundles: a dedicated secret, and no re-encryption when a refetched paper is unchanged
+"""
+
+import pytest
+
+from app.services import bundles
+from app.services.bundles import BundleCache, bundle_key, open_bundle
+from tests.conftest import run
+
+EXAM = {"id": "exam-1", "title": "Maths", "status": "scheduled", "duration_minutes": 60, "scheduled_at": "2026-01-01T09:00:00+00:00"}
+QUESTIONS = [{"id": "q1", "question_text": "1 + 1?", "marks": 2}]
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(bundles, "BUNDLE_SECRET", b"test-bundle-secret")
+    monkeypatch.setattr(bundles, "BUNDLES_ENABLED", True)
+
+
+def _serve(monkeypatch, questions):
+    async def student_paper(_exam_id):
+        return (dict(EXAM), [dict(q) for q in questions])  # a fresh object, like a paper cache refill
+    monkeypatch.setattr(bundles, "student_paper", student_paper)
+
+
+def test_refetched_paper_with_same_content_keeps_the_bundle(monkeypatch, secret):
+    cache, builds = BundleCache(), []
+    real_build = bundles.build_bundle
+    monkeypatch.setattr(bundles, "build_bundle", lambda *args: builds.append(1) or real_build(*args))
+
+    _serve(monkeypatch, QUESTIONS)
+    _, first = run(cache.get("exam-1"))
+    _, again = run(cache.get("exam-1"))
+    assert again is first and len(builds) == 1
+
+    _serve(monkeypatch, [dict(QUESTIONS[0], marks=3)])
+    _, changed = run(cache.get("exam-1"))
+    assert changed.version != first.version and len(builds) == 2
+    assert open_bundle(changed.payload, "exam-1", bundle_key("exam-1", changed.version))["questions"][0]["marks"] == 3
+
+
+def test_keys_need_a_bundle_secret(monkeypatch):
+    monkeypatch.setattr(bundles, "BUNDLE_SECRET", b"")
+    monkeypatch.setattr(bundles, "BUNDLES_ENABLED", False)
+    with pytest.raises(RuntimeError):
+        bundle_key("exam-1", "v1")
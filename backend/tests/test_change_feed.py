@@ -0,0 +1,202 @@
+"""
+Change feed: cursors follow commit order, pages end on transaction boundaries, pruning expires old cursors
+"""
+
+import uuid
+
+import pytest
+
+from app.services import change_feed
+from app.services.change_feed import CursorExpired, changes_since
+from tests.conftest import _connect, integration, run
+
+TEACHER = {"id": "teacher-1", "role": "teacher"}
+STUDENT = {"id": "student-1", "role": "student", "department": "CSE"}
+
+
+class _FakeQuery:
+    """Enough of the PostgREST builder for change_log reads: filters, ordering, limit."""
+
+    def __init__(self, client, table):
+        self.client, self.table = client, table
+        self.filters, self.limit_to, self.window = [], None, None
+
+    def select(self, *_):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda r: r[column] >= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda r: r[column] < value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda r: r[column] in values)
+        return self
+
+    def or_(self, clauses):
+        tests = [clause.split(".eq.") for clause in clauses.split(",")]
+        self.filters.append(lambda r: any(str(r.get(column)) == value for column, value in tests))
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, count):
+        self.limit_to = count
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end + 1)
+        return self
+
+    def execute(self):
+        rows = [r for r in self.client.tables.get(self.table, []) if all(f(r) for f in self.filters)]
+        if self.table == "change_log":
+            rows.sort(key=lambda r: (r["txid"], r["seq"]))
+        rows = rows[:self.limit_to] if self.limit_to else rows
+        rows = rows[slice(*self.window)] if self.window else rows
+        return type("Response", (), {"data": rows})()
+
+
+class _FakeClient:
+    def __init__(self, log, watermark, pruned_before=0):
+        self.watermark = watermark
+        self.tables = {
+            "change_log": log,
+            "change_feed_state": [{"pruned_before": pruned_before}],
+            "exams": [{"id": e["row_id"]} for e in log if e["table_name"] == "exams"],
+        }
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+    def rpc(self, function, _params):
+        assert function == "change_feed_watermark"
+        return type("Call", (), {"execute": lambda _self: type("Response", (), {"data": self.watermark})()})()
+
+
+def _entry(seq, txid, row_id):
+    return {"seq": seq, "txid": txid, "table_name": "exams", "row_id": row_id, "op": "update", "teacher_id": TEACHER["id"]}
+
+
+def _upserted(page):
+    return [row["id"] for row in page["changes"]["exams"]["upserted"]]
+
+
+def test_uncommitted_transactions_hold_the_cursor_back(monkeypatch):
+    # txid 12 took seq 1 but is still running; txid 11 committed with a higher seq
+    log = [_entry(2, 11, "a"), _entry(3, 13, "c")]
+    monkeypatch.setattr(change_feed, "get_supabase_admin", lambda: _FakeClient(log, watermark=12))
+    page = changes_since(TEACHER, 0)
+    assert _upserted(page) == ["a"]
+    assert page["cursor"] == 12
+
+    log.append(_entry(1, 12, "b"))
+    monkeypatch.setattr(change_feed, "get_supabase_admin", lambda: _FakeClient(log, watermark=14))
+    page = changes_since(TEACHER, page["cursor"])
+    assert sorted(_upserted(page)) == ["b", "c"]
+    assert page["cursor"] == 14
+
+
+def test_pages_never_split_a_transaction(monkeypatch):
+    log = [_entry(1, 10, "a"), _entry(2, 11, "b"), _entry(3, 11, "c"), _entry(4, 12, "d")]
+    monkeypatch.setattr(change_feed, "get_supabase_admin", lambda: _FakeClient(log, watermark=20))
+    page = changes_since(TEACHER, 0, limit=2)
+    assert (_upserted(page), page["cursor"], page["has_more"]) == (["a"], 11, True)
+
+    page = changes_since(TEACHER, page["cursor"], limit=1)
+    assert (sorted(_upserted(page)), page["cursor"], page["has_more"]) == (["b", "c"], 12, True)
+
+
+def test_any_cursor_below_the_pruned_mark_is_expired(monkeypatch):
+    monkeypatch.setattr(change_feed, "get_supabase_admin", lambda: _FakeClient([], watermark=50, pruned_before=30))
+    with pytest.raises(CursorExpired):
+        changes_since(TEACHER, 0)
+    assert changes_since(TEACHER, 30)["cursor"] == 50
+
+
+def test_students_only_see_exams_they_can_sit(monkeypatch):
+    client = _FakeClient([_entry(1, 10, "mine"), _entry(2, 10, "other")], watermark=20)
+    client.tables["exams"] = [
+        {"id": "mine", "status": "scheduled", "department": "CSE", "course_id": None},
+        {"id": "other", "status": "scheduled", "department": "ECE", "course_id": None},
+    ]
+    monkeypatch.setattr(change_feed, "get_supabase_admin", lambda: client)
+    page = changes_since(STUDENT, 0)
+    assert _upserted(page) == ["mine"]
+    assert page["changes"]["exams"]["deleted"] == ["other"]
+
+
+def test_invalidations_read_every_page_before_advancing(monkeypatch):
+    log = [
+        {"seq": n, "txid": 5 + n // 3, "table_name": "course_enrollments", "row_id": f"e{n}", "student_id": f"s{n}"}
+        for n in range(7)
+    ]
+    invalidated = set()
+    monkeypatch.setattr(change_feed, "PAGE_SIZE", 3)
+    monkeypatch.setattr(change_feed, "get_supabase_admin", lambda: _FakeClient(log, watermark=40))
+    monkeypatch.setattr(change_feed, "forget_profiles", lambda _ids: None)
+    monkeypatch.setattr(change_feed.student_exam_index, "invalidate", invalidated.update)
+    monkeypatch.setattr(change_feed.exam_timetable, "invalidate", lambda: None)
+    assert change_feed._apply_invalidations(0) == 40
+    assert invalidated == {f"s{n}" for n in range(7)}
+
+
+# ──── Against the database triggers ────
+
+def _log(seed, table, row_id, column):
+    return seed.sql(
+        f"SELECT {column} FROM change_log WHERE table_name = $1 AND row_id = $2 AND op = 'delete'",
+        table, uuid.UUID(row_id),
+    )
+
+
+@integration
+def test_cascaded_deletes_are_logged_for_the_teacher(seed):
+    teacher, student = seed.user("teacher"), seed.user("student")
+    exam = seed.exam(teacher)
+    submission = seed.submission(exam, student)
+    result = seed.result(submission, marks=30)
+
+    seed.sql("DELETE FROM exams WHERE id = $1", uuid.UUID(exam))
+    assert str(_log(seed, "submissions", submission, "teacher_id")) == teacher
+    assert str(_log(seed, "results", result, "teacher_id")) == teacher
+    assert str(_log(seed, "results", result, "student_id")) == student
+
+
+@integration
+def test_watermark_waits_for_open_transactions(seed):
+    teacher = seed.user("teacher")
+
+    async def scenario():
+        writer, other = await _connect(), await _connect()
+        try:
+            async with writer.transaction():
+                txid = await writer.fetchval("SELECT txid_current()")
+                await writer.execute(
+                    "INSERT INTO exams (teacher_id, status, total_marks, title, subject, scheduled_at, duration_minutes)"
+                    " VALUES ($1, 'draft', 50, 'Open', 'Testing', NOW(), 60)",
+                    uuid.UUID(teacher),
+                )
+                # Commits while the writer is still open
+                await other.execute(
+                    "INSERT INTO exams (teacher_id, status, total_marks, title, subject, scheduled_at, duration_minutes)"
+                    " VALUES ($1, 'draft', 50, 'Closed', 'Testing', NOW(), 60)",
+                    uuid.UUID(teacher),
+                )
+                held = await other.fetchval("SELECT change_feed_watermark()")
+            released = await other.fetchval("SELECT change_feed_watermark()")
+        finally:
+            await writer.close()
+            await other.close()
+        return txid, held, released
+
+    txid, held, released = run(scenario())
+    assert held <= txid < released
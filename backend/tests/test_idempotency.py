@@ -0,0 +1,116 @@
+"""
+Idempotency-Key middleware: replay, retry after failures, concurrent duplicates
+"""
+
+import asyncio
+
+from app.middleware import idempotency
+from app.middleware.idempotency import IdempotencyMiddleware
+
+
+def _app(statuses: list, calls: list):
+    async def app(scope, receive, send):
+        await receive()
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        await send({"type": "http.response.start", "status": statuses[min(len(calls), len(statuses)) - 1], "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+    return app
+
+
+async def _request(middleware, body=b"{}", key=b"key-1"):
+    scope = {
+        "type": "http", "method": "POST", "path": "/api/student/exams/x/submit",
+        "headers": [(b"idempotency-key", key), (b"authorization", b"Bearer token")],
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]).get(b"idempotent-replayed") == b"true"
+
+
+def test_success_is_replayed_once_stored():
+    calls = []
+    middleware = IdempotencyMiddleware(_app([201], calls))
+    assert asyncio.run(_request(middleware)) == (201, False)
+    assert asyncio.run(_request(middleware)) == (201, True)
+    assert len(calls) == 1
+
+
+def test_reused_key_with_other_body_is_rejected():
+    middleware = IdempotencyMiddleware(_app([201], []))
+    asyncio.run(_request(middleware))
+    assert asyncio.run(_request(middleware, body=b'{"other": 1}')) == (422, False)
+
+
+def test_possibly_transient_errors_are_not_stored():
+    for status in (400, 500, 503):
+        calls = []
+        middleware = IdempotencyMiddleware(_app([status, 201], calls))
+        assert asyncio.run(_request(middleware)) == (status, False)
+        assert asyncio.run(_request(middleware)) == (201, False)
+        assert len(calls) == 2
+
+
+def test_conflicts_are_stored():
+    calls = []
+    middleware = IdempotencyMiddleware(_app([409, 201], calls))
+    asyncio.run(_request(middleware))
+    assert asyncio.run(_request(middleware)) == (409, True)
+    assert len(calls) == 1
+
+
+def test_waiters_after_a_failed_attempt_run_the_handler_once():
+    calls = []
+    middleware = IdempotencyMiddleware(_app([503, 201], calls))
+
+    async def burst():
+        return await asyncio.gather(*(_request(middleware) for _ in range(5)))
+
+    outcomes = asyncio.run(burst())
+    assert outcomes[0] == (503, False)
+    assert sorted(outcomes[1:]) == [(201, False)] + [(201, True)] * 3
+    assert len(calls) == 2
+    assert middleware._in_flight == {}
+
+
+def test_large_bodies_pass_through_unbuffered(monkeypatch):
+    monkeypatch.setattr(idempotency, "MAX_REQUEST_BODY_BYTES", 8)
+    received = []
+
+    async def app(scope, receive, send):
+        body, more = b"", True
+        while more:
+            message = await receive()
+            body, more = body + message["body"], message["more_body"]
+        received.append(body)
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def upload(headers):
+        parts = [b"0123", b"4567", b"89ab", b"cdef"]
+        scope = {"type": "http", "method": "POST", "path": "/api/student/upload", "headers": headers}
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": parts.pop(0), "more_body": bool(parts)}
+
+        async def send(message):
+            sent.append(message)
+
+        await middleware(scope, receive, send)
+        return sent[0]["status"], dict(sent[0]["headers"]).get(b"idempotent-replayed")
+
+    middleware = IdempotencyMiddleware(app)
+    streamed = [(b"idempotency-key", b"key-1")]
+    declared = streamed + [(b"content-length", b"16")]
+    for headers in (streamed, streamed, declared):
+        assert asyncio.run(upload(headers)) == (201, None)
+    assert received == [b"0123456789abcdef"] * 3
+    assert len(middleware.store) == 0
@@ -0,0 +1,41 @@
+"""
+Incremental student_performance index stays consistent under cascaded deletes
+"""
+
+import uuid
+
+from tests.conftest import integration
+
+
+def _performance(seed, student):
+    return seed.sql(
+        "SELECT COALESCE(SUM(result_count), 0) FROM student_performance WHERE student_id = $1",
+        uuid.UUID(student),
+    )
+
+
+@integration
+def test_deleting_an_exam_removes_its_published_results(seed):
+    teacher, student = seed.user("teacher"), seed.user("student")
+    kept = seed.exam(teacher, status="results_published", subject="Maths")
+    removed = seed.exam(teacher, status="results_published", subject="Maths")
+    seed.result(seed.submission(kept, student), marks=40)
+    seed.result(seed.submission(removed, student), marks=10)
+    assert _performance(seed, student) == 2
+
+    seed.sql("DELETE FROM exams WHERE id = $1", uuid.UUID(removed))
+    assert _performance(seed, student) == 1
+    assert seed.sql(
+        "SELECT percentage_sum FROM student_performance WHERE student_id = $1 AND subject = 'Maths'",
+        uuid.UUID(student),
+    ) == 80
+
+
+@integration
+def test_deleting_a_student_cascades_cleanly(seed):
+    teacher, student = seed.user("teacher"), seed.user("student")
+    exam = seed.exam(teacher, status="results_published")
+    seed.result(seed.submission(exam, student), marks=25)
+
+    seed.sql("DELETE FROM auth.users WHERE id = $1", uuid.UUID(student))
+    assert _performance(seed, student) == 0
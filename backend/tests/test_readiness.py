@@ -0,0 +1,68 @@
+"""
+Readiness and metrics endpoints: public callers get the verdict only; detail, warming and metrics need the token
+"""
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.services.prewarm import prewarmer
+
+REPORT = {
+    "ready": False,
+    "auth_keys_loaded": True,
+    "connections_warm": True,
+    "exams": [
+        {"exam_id": "e1", "title": "Finals", "scheduled_at": "2026-01-01T09:00:00+00:00", "status": "cold"},
+        {"exam_id": "e2", "title": "Quiz", "scheduled_at": "2026-01-01T10:00:00+00:00", "status": "warm"},
+    ],
+}
+
+
+def _client(monkeypatch, token="s3cret"):
+    warmed = []
+
+    async def readiness():
+        return {**REPORT, "exams": list(REPORT["exams"])}
+
+    async def warm_once():
+        warmed.append(True)
+        return []
+
+    monkeypatch.setattr(main, "READINESS_TOKEN", token)
+    monkeypatch.setattr(prewarmer, "readiness", readiness)
+    monkeypatch.setattr(prewarmer, "warm_once", warm_once)
+    return TestClient(main.app), warmed
+
+
+def test_public_readiness_hides_exam_details(monkeypatch):
+    client, _ = _client(monkeypatch)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert "exams" not in response.json()
+    assert response.json()["cold_exams"] == 1
+
+
+def test_warm_needs_the_token(monkeypatch):
+    client, warmed = _client(monkeypatch)
+    assert client.get("/ready?warm=true").status_code == 403
+    assert client.get("/ready?warm=true", headers={"X-Readiness-Token": "wrong"}).status_code == 403
+    assert not warmed
+
+    response = client.get("/ready?warm=true", headers={"X-Readiness-Token": "s3cret"})
+    assert warmed and [e["title"] for e in response.json()["exams"]] == ["Finals", "Quiz"]
+
+
+def test_no_token_configured_means_public_only(monkeypatch):
+    client, warmed = _client(monkeypatch, token="")
+    assert client.get("/ready?warm=true", headers={"X-Readiness-Token": ""}).status_code == 403
+    assert not warmed
+
+
+def test_metrics_need_the_token(monkeypatch):
+    client, _ = _client(monkeypatch)
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"X-Readiness-Token": "wrong"}).status_code == 403
+
+    response = client.get("/metrics", headers={"X-Readiness-Token": "s3cret"})
+    assert response.status_code == 200
+    assert set(response.json()) == {"upstream", "coalescing", "breakers", "stale_reads"}
@@ -0,0 +1,120 @@
+"""
+Read repository: both backends must return the same rows for every query family
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.services.repository import PostgresBackend, PostgrestBackend, ReadRepository, _parse_backend_map, valid_uuid
+from tests.conftest import TEST_DATABASE_URL, integration, run
+
+
+def normalized(value):
+    """Make PostgREST JSON and asyncpg rows comparable (timestamp formats, numeric types)."""
+    if isinstance(value, dict):
+        return {k: normalized(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalized(v) for v in value]
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def test_valid_uuid():
+    assert valid_uuid("9b2f6a52-2a1e-4a57-9a35-0d8c1b7c3f10")
+    assert not valid_uuid("not-a-uuid")
+    assert not valid_uuid("1 OR 1=1")
+    assert not valid_uuid("")
+
+
+def test_malformed_exam_id_is_not_found_without_querying():
+    repository = ReadRepository("")
+
+    class Exploding:
+        async def exam_paper(self, exam_id):
+            raise AssertionError("backend must not be called for a malformed id")
+
+    repository.postgrest = Exploding()
+    assert run(repository.exam_paper("abc")) == (None, [])
+
+
+def test_backend_map_ignores_unknown_families():
+    assert _parse_backend_map("exam_paper=postgres, bogus=postgres,student_results = PostgREST") == {
+        "exam_paper": "postgres",
+        "student_results": "postgrest",
+    }
+
+
+def test_postgres_backend_unavailable_falls_back_to_postgrest(monkeypatch):
+    monkeypatch.setattr("app.services.repository.DATABASE_URL", None)
+    repository = ReadRepository("exam_paper=postgres")
+    assert repository.routes == {}
+    assert repository.backend_for("exam_paper").name == "postgrest"
+
+
+@pytest.fixture
+def dataset(seed):
+    teacher = seed.user("teacher")
+    student = seed.user("student")
+    exam = seed.exam(teacher, status="active")
+    seed.question(exam, 2, marks=10)
+    seed.question(exam, 1, marks=5, question_type="mcq", options=["a", "b", "c"], correct_answer="b")
+    published = seed.exam(teacher, status="results_published", title="Published")
+    seed.result(seed.submission(published, student), marks=40)
+    seed.submission(exam, student)
+    return {"teacher": teacher, "student": student, "exam": exam, "published": published}
+
+
+def both(call):
+    """Run the same query family on both backends (fresh asyncpg pool per event loop)."""
+    async def go():
+        postgres = PostgresBackend(TEST_DATABASE_URL)
+        try:
+            return await call(PostgrestBackend()), await call(postgres)
+        finally:
+            await postgres.close()
+    return asyncio.run(go())
+
+
+@integration
+def test_exam_paper_matches(dataset):
+    via_rest, via_pg = both(lambda b: b.exam_paper(dataset["exam"]))
+    assert via_rest[0]["id"] == dataset["exam"]
+    assert [q["order_num"] for q in via_pg[1]] == [1, 2]
+    assert normalized(via_rest) == normalized(via_pg)
+
+
+@integration
+def test_missing_exam_matches(dataset):
+    missing = "00000000-0000-0000-0000-000000000000"
+    assert both(lambda b: b.exam_paper(missing)) == ((None, []), (None, []))
+
+
+@integration
+def test_student_results_match(dataset):
+    via_rest, via_pg = both(lambda b: b.student_results(dataset["student"]))
+    assert len(via_rest) == 1 and via_rest[0]["exam"]["title"] == "Published"
+    assert normalized(via_rest) == normalized(via_pg)
+
+
+@integration
+def test_dashboard_counts_match(dataset):
+    via_rest, via_pg = both(lambda b: b.dashboard_counts(dataset["student"]))
+    assert via_rest == {"total_submissions": 2, "completed_exams": 2}
+    assert normalized(via_rest) == normalized(via_pg)
+
+
+@integration
+def test_open_exams_match(dataset):
+    via_rest, via_pg = both(lambda b: b.open_exams())
+    ours = lambda rows: [r for r in rows if r["teacher_id"] == dataset["teacher"]]  # noqa: E731
+    assert [r["id"] for r in ours(via_rest)] == [dataset["exam"]]
+    assert ours(via_rest)[0]["teacher_name"] == "Test teacher"
+    assert normalized(ours(via_rest)) == normalized(ours(via_pg))
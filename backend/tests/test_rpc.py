@@ -0,0 +1,178 @@
+"""
+Transactional RPCs: PTxxx error codes surface as the same HTTP errors the routers used to raise
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from postgrest.exceptions import APIError
+
+from app.services import rpc
+from app.services.rpc import call_rpc
+from tests.conftest import integration
+
+
+class _FakeClient:
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.calls = []
+
+    def rpc(self, function, params):
+        self.calls.append((function, params))
+        return self
+
+    def execute(self):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return type("Response", (), {"data": self.outcome})()
+
+
+def _api_error(code: str, message: str) -> APIError:
+    return APIError({"code": code, "message": message, "details": None, "hint": None})
+
+
+@pytest.mark.parametrize("code,status", [("PT400", 400), ("PT403", 403), ("PT404", 404), ("PT409", 409)])
+def test_pt_codes_map_to_http_status(monkeypatch, code, status):
+    monkeypatch.setattr(rpc, "get_supabase_admin", lambda: _FakeClient(_api_error(code, "Nope")))
+    with pytest.raises(HTTPException) as raised:
+        call_rpc("submit_exam", {})
+    assert raised.value.status_code == status
+    assert raised.value.detail == "Nope"
+
+
+@pytest.mark.parametrize("code", ["23505", "P0001", "PTABC", ""])
+def test_other_database_errors_are_not_mapped(monkeypatch, code):
+    monkeypatch.setattr(rpc, "get_supabase_admin", lambda: _FakeClient(_api_error(code, "boom")))
+    with pytest.raises(APIError):
+        call_rpc("submit_exam", {})
+
+
+def test_success_returns_data_and_passes_params(monkeypatch):
+    client = _FakeClient({"grade": "A", "percentage": 85.0})
+    monkeypatch.setattr(rpc, "get_supabase_admin", lambda: client)
+    assert call_rpc("evaluate_submission", {"p_marks": 17}) == {"grade": "A", "percentage": 85.0}
+    assert client.calls == [("evaluate_submission", {"p_marks": 17})]
+
+
+# ──── Against the database functions ────
+
+def _status(function: str, params: dict) -> int:
+    with pytest.raises(HTTPException) as raised:
+        call_rpc(function, params)
+    return raised.value.status_code
+
+
+def _submit(exam_id, student_id, file_url="https://example.test/answers/a.pdf"):
+    return {"p_exam_id": exam_id, "p_student_id": student_id, "p_answers": {"q": "a"}, "p_file_url": file_url}
+
+
+def _started(minutes_ago=5):
+    return (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat()
+
+
+@integration
+def test_submit_exam_paths(seed):
+    teacher, student = seed.user("teacher"), seed.user("student")
+    exam = seed.exam(teacher, status="active", scheduled_at=_started())
+    closed = seed.exam(teacher, status="completed", scheduled_at=_started())
+
+    assert _status("submit_exam", _submit(str(uuid.uuid4()), student)) == 404
+    assert _status("submit_exam", _submit(closed, student)) == 400
+    assert _status("submit_exam", _submit(exam, student, file_url="https://example.test/a.docx")) == 400
+
+    seed.sql(
+        "INSERT INTO exam_sessions (exam_id, student_id, deadline_at) VALUES ($1, $2, NOW() + interval '1 hour')",
+        uuid.UUID(exam), uuid.UUID(student),
+    )
+    submission_id = call_rpc("submit_exam", _submit(exam, student))
+    assert uuid.UUID(submission_id)
+    assert seed.sql("SELECT count(*) FROM exam_sessions WHERE exam_id = $1", uuid.UUID(exam)) == 0
+
+    assert _status("submit_exam", _submit(exam, student)) == 400
+
+
+@integration
+def test_submit_exam_rejects_late_submissions(seed):
+    teacher, early, late = seed.user("teacher"), seed.user("student"), seed.user("student")
+    ended = seed.exam(teacher, status="active", scheduled_at=_started(minutes_ago=61))
+    assert _status("submit_exam", _submit(ended, early)) == 403
+
+    running = seed.exam(teacher, status="active", scheduled_at=_started())
+    seed.sql(
+        "INSERT INTO exam_sessions (exam_id, student_id, deadline_at) VALUES ($1, $2, NOW() - interval '1 second')",
+        uuid.UUID(running), uuid.UUID(late),
+    )
+    assert _status("submit_exam", _submit(running, late)) == 403
+    assert uuid.UUID(call_rpc("submit_exam", _submit(running, early)))
+
+
+@integration
+def test_submit_exam_requires_enrollment(seed):
+    teacher, student, outsider = seed.user("teacher"), seed.user("student"), seed.user("student", department="ECE")
+    course = seed.sql(
+        "INSERT INTO courses (code, name, department) VALUES ($1, 'Test course', 'CSE') RETURNING id",
+        f"T-{uuid.uuid4().hex[:8]}",
+    )
+    try:
+        department_exam = seed.exam(teacher, status="active", scheduled_at=_started())
+        course_exam = seed.exam(teacher, status="active", scheduled_at=_started())
+        seed.sql("UPDATE exams SET course_id = $1 WHERE id = $2", course, uuid.UUID(course_exam))
+
+        assert _status("submit_exam", _submit(department_exam, outsider)) == 403
+        assert _status("submit_exam", _submit(course_exam, student)) == 403
+
+        seed.sql("INSERT INTO course_enrollments (course_id, student_id) VALUES ($1, $2)", course, uuid.UUID(student))
+        assert uuid.UUID(call_rpc("submit_exam", _submit(course_exam, student)))
+    finally:
+        seed.sql("DELETE FROM courses WHERE id = $1", course)
+
+
+@integration
+def test_evaluate_submission_paths(seed):
+    teacher, other_teacher, student = seed.user("teacher"), seed.user("teacher"), seed.user("student")
+    exam = seed.exam(teacher, status="completed", total_marks=20)
+    submission = seed.submission(exam, student)
+
+    def params(submission_id=submission, teacher_id=teacher, marks=17):
+        return {"p_submission_id": submission_id, "p_teacher_id": teacher_id, "p_marks": marks, "p_remarks": None}
+
+    assert _status("evaluate_submission", params(submission_id=str(uuid.uuid4()))) == 404
+    assert _status("evaluate_submission", params(teacher_id=other_teacher)) == 403
+    assert _status("evaluate_submission", params(marks=21)) == 400
+
+    outcome = call_rpc("evaluate_submission", params())
+    assert float(outcome["percentage"]) == 85.0 and outcome["grade"] == "A"
+
+    # Re-evaluating replaces the result instead of adding a second one
+    call_rpc("evaluate_submission", params(marks=10))
+    assert seed.sql("SELECT count(*) FROM results WHERE submission_id = $1", uuid.UUID(submission)) == 1
+    assert seed.sql("SELECT status FROM submissions WHERE id = $1", uuid.UUID(submission)) == "evaluated"
+
+
+@integration
+def test_publish_results_paths(seed):
+    teacher, other_teacher, student = seed.user("teacher"), seed.user("teacher"), seed.user("student")
+    exam = seed.exam(teacher, status="completed")
+    seed.result(seed.submission(exam, student), marks=30, published=False)
+
+    assert _status("publish_results", {"p_exam_id": str(uuid.uuid4()), "p_teacher_id": teacher}) == 404
+    assert _status("publish_results", {"p_exam_id": exam, "p_teacher_id": other_teacher}) == 404
+
+    assert call_rpc("publish_results", {"p_exam_id": exam, "p_teacher_id": teacher}) == 1
+    assert seed.sql("SELECT status FROM exams WHERE id = $1", uuid.UUID(exam)) == "results_published"
+    assert seed.sql("SELECT bool_and(published) FROM results WHERE exam_id = $1", uuid.UUID(exam)) is True
+
+
+@integration
+def test_regrade_exam_keeps_marks(seed):
+    teacher, student = seed.user("teacher"), seed.user("student")
+    exam = seed.exam(teacher, status="completed", total_marks=50)
+    result = seed.result(seed.submission(exam, student), marks=45)
+    seed.sql("UPDATE exams SET total_marks = 90 WHERE id = $1", uuid.UUID(exam))
+
+    summary = call_rpc("regrade_exam", {"p_exam_id": exam})
+    assert (summary["regraded"], summary["over_total"]) == (1, 0)
+    row = seed.sql("SELECT row(marks_obtained, total_marks, percentage::float) FROM results WHERE id = $1", uuid.UUID(result))
+    assert tuple(row) == (45, 90, 50.0)
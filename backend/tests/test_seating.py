@@ -0,0 +1,73 @@
+"""
+Seating: overlapping exams share one plan, and neighbours never sit the same paper when it can be avoided
+"""
+
+import pytest
+
+from app.services import seating
+from app.services.seating import SeatingError, allocate, quality, slot_exams
+from tests.conftest import FakeExams
+
+
+def _exam(exam_id, start, minutes, status="scheduled"):
+    return {"id": exam_id, "subject": exam_id, "department": "CSE", "course_id": None,
+            "scheduled_at": f"2026-03-02T{start}:00+00:00", "duration_minutes": minutes, "status": status}
+
+
+def _ids(monkeypatch, rows, at):
+    monkeypatch.setattr(seating, "get_supabase_admin", lambda: FakeExams(rows))
+    exams, start, end = slot_exams(f"2026-03-02T{at}:00+00:00")
+    return sorted(e["id"] for e in exams), start and start.strftime("%H:%M"), end and end.strftime("%H:%M")
+
+
+def test_overlapping_exams_with_different_starts_share_a_slot(monkeypatch):
+    rows = [
+        _exam("maths", "09:00", 180),    # 09:00-12:00
+        _exam("physics", "10:00", 60),   # inside maths
+        _exam("lab", "11:30", 120),      # overlaps maths only: 11:30-13:30
+        _exam("late", "13:30", 60),      # starts as lab ends: separate slot
+        _exam("draft", "10:00", 60, status="draft"),
+    ]
+    assert _ids(monkeypatch, rows, "10:00") == (["lab", "maths", "physics"], "09:00", "13:30")
+    assert _ids(monkeypatch, rows, "13:45") == (["late"], "13:30", "14:30")
+
+
+def test_nothing_running_is_an_empty_slot(monkeypatch):
+    assert _ids(monkeypatch, [_exam("maths", "09:00", 60)], "10:00") == ([], None, None)
+
+
+def _roster(subject, count):
+    return [{"id": f"{subject}-{i}", "reg_number": f"{subject}{i:03d}", "exam_id": subject, "subject": subject, "department": "CSE"}
+            for i in range(count)]
+
+
+def _hall(rows, cols, blocked=()):
+    return {"id": "hall-1", "name": "Hall 1", "rows": rows, "cols": cols, "blocked_seats": [list(s) for s in blocked]}
+
+
+def test_neighbours_sit_different_papers():
+    assignments = allocate(_roster("maths", 8) + _roster("physics", 8), [_hall(4, 4)])
+    seats = {(row, col): student["subject"] for _, row, col, student in assignments}
+    assert len(seats) == 16
+    for (row, col), subject in seats.items():
+        assert seats.get((row, col + 1)) != subject and seats.get((row + 1, col)) != subject
+
+    score = quality(assignments)
+    assert (score["score"], score["clashes"], score["adjacent_pairs"], score["seated"]) == (100.0, 0, 24, 16)
+
+
+def test_spare_seats_are_left_empty_rather_than_seat_a_clash():
+    assignments = allocate(_roster("maths", 3), [_hall(1, 5)])
+    assert [col for _, _, col, _ in assignments] == [1, 3, 5]
+    assert quality(assignments)["clashes"] == 0
+
+    # No spare seats: the clash is unavoidable, and counted
+    packed = allocate(_roster("maths", 3), [_hall(1, 3)])
+    assert quality(packed)["clashes"] == 2
+
+
+def test_more_students_than_seats_is_an_error():
+    with pytest.raises(SeatingError):
+        allocate(_roster("maths", 5), [_hall(2, 2)])
+    with pytest.raises(SeatingError):
+        allocate(_roster("maths", 4), [_hall(2, 2, blocked=[(1, 1)])])
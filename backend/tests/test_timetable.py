@@ -0,0 +1,51 @@
+"""
+Exam timetable: clash checks see other instances' exams, and writers are serialized
+"""
+
+import pytest
+
+from app.services import timetable
+from app.services.timetable import ExamTimetable, TimetableBusy
+from tests.conftest import FakeExams
+
+
+def _exam(exam_id, start, minutes=60, department="CSE"):
+    return {"id": exam_id, "title": exam_id, "subject": exam_id, "department": department, "course_id": None,
+            "scheduled_at": f"2099-03-02T{start}:00+00:00", "duration_minutes": minutes, "status": "scheduled"}
+
+
+def test_clash_check_sees_exams_written_elsewhere(monkeypatch):
+    rows = [_exam("maths", "09:00")]
+    monkeypatch.setattr(timetable, "get_supabase_admin", lambda: FakeExams(rows))
+    index = ExamTimetable()
+    assert index.clashes(_exam("new", "09:30")) and not index.clashes(_exam("new", "11:00"))
+
+    # Another instance adds one exam and deletes the other, well within TIMETABLE_REFRESH
+    rows[:] = [_exam("physics", "11:30")]
+    assert not index.clashes(_exam("new", "09:30"))
+    assert [c["clashes_with"]["id"] for c in index.clashes(_exam("new", "11:00"))] == ["physics"]
+
+
+def test_writers_wait_for_the_lease(monkeypatch):
+    monkeypatch.setattr(timetable, "WRITE_WAIT_SECONDS", 0.2)
+    monkeypatch.setattr(timetable, "try_acquire_lease", lambda *_: False)
+    with pytest.raises(TimetableBusy):
+        with ExamTimetable().writing():
+            pass
+
+    released = []
+    monkeypatch.setattr(timetable, "try_acquire_lease", lambda *_: True)
+    monkeypatch.setattr(timetable, "release_lease", released.append)
+    with ExamTimetable().writing():
+        assert not released
+    assert released == [timetable.WRITE_LEASE_NAME]
+
+
+def test_drafts_do_not_block_the_timetable(monkeypatch):
+    rows = [dict(_exam("maths", "09:00"), status="draft")]
+    monkeypatch.setattr(timetable, "get_supabase_admin", lambda: FakeExams(rows))
+    index = ExamTimetable()
+    assert not index.clashes(_exam("new", "09:30"))
+
+    rows[0]["status"] = "scheduled"
+    assert [c["clashes_with"]["id"] for c in index.clashes(_exam("new", "09:30"))] == ["maths"]